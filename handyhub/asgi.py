@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+Production runs this app (gunicorn with uvicorn workers, see Procfile) so the
+chat stream (messaging.views.stream_messages) can keep a connection open per
+chat tab without tying up a thread; handyhub.wsgi still works, and the chat
+then falls back to polling.
 """
 
 import os
@@ -17,6 +17,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 
 MIDDLEWARE = [
@@ -43,6 +44,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "messaging.context_processors.unread_messages",  # ✅ header unread badge
             ],
         },
     },
@@ -72,8 +74,33 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_ROOT = BASE_DIR / "pictures"
 MEDIA_URL = "/profile_picture/"
 
+# ✅ Hash uploads while they stream in: media is stored once per content (users.blobs)
+FILE_UPLOAD_HANDLERS = [
+    "users.blobs.HashingMemoryFileUploadHandler",
+    "users.blobs.HashingTemporaryFileUploadHandler",
+]
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Auth redirects
 LOGIN_REDIRECT_URL = "users:index"
 LOGIN_URL = "users:login"
+
+# Cache
+# Search results, generation counters, fragment versions and unread totals live
+# here. Invalidations only reach other workers through a shared cache, so prod
+# requires REDIS_URL (see prod.py); LocMemCache is for single-process dev/tests.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "handyhub",
+        }
+    }
@@ -0,0 +1,132 @@
+"""
+Pub/sub for the live chat stream.
+
+When a message is committed its id is published on the conversation's
+channel; every open stream (messaging.views.stream_messages) subscribed to
+that channel wakes up and sends the new bubbles. Payloads are only
+notifications: streams always read the messages themselves (id > last sent),
+so a dropped or duplicated notification costs nothing but latency.
+
+CHAT_BROKER picks the implementation (dotted path):
+
+* InProcessBroker (default): subscribers in this process only. With several
+  worker processes a stream still catches messages sent through another
+  worker on its next heartbeat check.
+* RedisBroker: Redis pub/sub (CHAT_BROKER_URL, or REDIS_URL), for
+  multi-worker deployments. Needs the `redis` package.
+
+A broker implements publish(channel, payload) (sync, called after commit)
+and subscribe(channel), an async context manager yielding an object whose
+`await get()` returns the next payload.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROKER = "messaging.broker.InProcessBroker"
+
+
+class Broker:
+    def publish(self, channel, payload):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    """Per-process fan-out to asyncio queues (one per open stream)."""
+
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # channel -> {(loop, queue)}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(channel), ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, payload)
+            except RuntimeError:
+                pass  # that stream's loop is gone
+
+    @staticmethod
+    def _put(queue, payload):
+        if not queue.full():  # a slow stream catches up from the DB anyway
+            queue.put_nowait(payload)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        channel = str(channel)
+        with self._lock:
+            self._subscribers[channel].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(entry)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker(Broker):
+    """Redis pub/sub; one connection per open stream."""
+
+    prefix = "chat:"
+
+    def __init__(self):
+        import redis
+
+        self.url = getattr(settings, "CHAT_BROKER_URL", None) or os.environ["REDIS_URL"]
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, channel, payload):
+        try:
+            self._client.publish(f"{self.prefix}{channel}", json.dumps(payload))
+        except Exception:
+            logger.warning("Could not publish to chat channel %s", channel, exc_info=True)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(f"{self.prefix}{channel}")
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self):
+        async for message in self.pubsub.listen():
+            if message["type"] == "message":
+                return json.loads(message["data"])
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, "CHAT_BROKER", DEFAULT_BROKER))()
+
+
+def publish_message(conversation_id, message_id):
+    get_broker().publish(conversation_id, {"id": message_id})
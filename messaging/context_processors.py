@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .inbox import unread_total
+
+
+def unread_messages(request):
+    """`unread_message_count` for the header badge; evaluated (and cached) only if a template uses it."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {"unread_message_count": SimpleLazyObject(lambda: unread_total(user))}
@@ -0,0 +1,180 @@
+"""
+Inbox snapshot: the latest message of each conversation, denormalized onto
+Conversation (last_message, last_message_sender, last_message_preview,
+last_message_has_attachment) so the inbox is one query over Conversation.
+
+api_send_message writes it in the same transaction as the message
+(record_last_message). Code that inserts messages in bulk calls
+refresh_last_messages() afterwards.
+
+Unread counts work the same way: visitor_unread / tradesman_unread go up
+by one (F()) for the recipient of each message and back to zero when the
+participant reads the conversation. unread_total() sums them for the site
+header badge without touching Message, and is cached per user until the
+next send/read involving them (UNREAD_CACHE_TIMEOUT as a backstop). The
+deletes only reach other workers through a shared cache (REDIS_URL, which
+production requires).
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.text import Truncator
+
+from .models import Attachment, Conversation, Message
+
+PREVIEW_LENGTH = 120
+UNREAD_CACHE_TIMEOUT = 60 * 5
+
+
+def snapshot_values(message, has_attachment):
+    return {
+        "last_message_id": message.id,
+        "last_message_sender_id": message.sender_id,
+        "last_message_preview": Truncator(" ".join(message.content.split())).chars(PREVIEW_LENGTH),
+        "last_message_has_attachment": has_attachment,
+    }
+
+
+def record_last_message(message, has_attachment, at):
+    """Point the conversation at `message` unless a newer one is already recorded."""
+    return (
+        Conversation.objects
+        .filter(id=message.conversation_id)
+        .filter(Q(last_message__isnull=True) | Q(last_message_id__lt=message.id))
+        .update(last_message_at=at, **snapshot_values(message, has_attachment))
+    )
+
+
+def refresh_last_messages(conversation_ids=None, batch_size=1000):
+    """Recompute the snapshot from Message; returns the number of conversations updated."""
+    latest = Message.objects.filter(conversation=OuterRef("pk")).order_by("-id").values("id")[:1]
+    conversations = Conversation.objects.annotate(latest_id=Subquery(latest)).exclude(latest_id=None)
+    if conversation_ids is not None:
+        conversations = conversations.filter(id__in=conversation_ids)
+
+    updated = 0
+    batch = []
+    for convo in conversations.only("id").iterator(chunk_size=batch_size):
+        batch.append(convo)
+        if len(batch) >= batch_size:
+            updated += _refresh_batch(batch)
+            batch = []
+    if batch:
+        updated += _refresh_batch(batch)
+    return updated
+
+
+def _refresh_batch(conversations):
+    messages = (
+        Message.objects
+        .filter(id__in=[c.latest_id for c in conversations])
+        .annotate(has_attachment_row=Exists(Attachment.objects.filter(message=OuterRef("pk"))))
+        .only("id", "sender_id", "content")
+        .in_bulk()
+    )
+    for convo in conversations:
+        message = messages[convo.latest_id]
+        for field, value in snapshot_values(message, message.has_attachment_row).items():
+            setattr(convo, field, value)
+    Conversation.objects.bulk_update(
+        conversations,
+        ["last_message", "last_message_sender", "last_message_preview", "last_message_has_attachment"],
+    )
+    return len(conversations)
+
+
+# ---------- unread counters ----------
+
+def _unread_cache_key(user_id):
+    return f"messaging:unread:{user_id}"
+
+
+def _forget_unread(user_id):
+    transaction.on_commit(lambda: cache.delete(_unread_cache_key(user_id)))
+
+
+def add_unread(convo, recipient):
+    field = convo.unread_field_for(recipient)
+    if field:
+        Conversation.objects.filter(id=convo.id).update(**{field: F(field) + 1})
+        _forget_unread(recipient.pk)
+
+
+def _remaining_unread(user):
+    """Expression: the other party's unread messages in each conversation."""
+    return Coalesce(
+        Subquery(
+            Message.objects.order_by()
+            .filter(conversation=OuterRef("pk"), is_read=False)
+            .exclude(sender=user)
+            .values("conversation")
+            .annotate(n=Count("*"))
+            .values("n")
+        ),
+        0,
+    )
+
+
+def mark_read(convo, user, up_to_id=None):
+    """
+    Mark the other party's messages read (up to `up_to_id`) and bring the
+    user's counter down. It is written even when nothing was marked, so a
+    counter that drifted heals while the conversation is open.
+    """
+    unread = convo.messages.exclude(sender=user).filter(is_read=False)
+    if up_to_id is not None:
+        unread = unread.filter(id__lte=up_to_id)
+    marked = unread.update(is_read=True)
+
+    field = convo.unread_field_for(user)
+    if not field:
+        return
+    if up_to_id is None:
+        value = 0
+    elif marked:
+        # newer messages may have arrived meanwhile, so only subtract
+        value = Greatest(F(field) - marked, 0)
+    else:
+        value = _remaining_unread(user)  # nothing to subtract: recount
+    if Conversation.objects.filter(id=convo.id, **{f"{field}__gt": 0}).update(**{field: value}):
+        _forget_unread(user.pk)
+
+
+def unread_for(user):
+    """Expression: the user's own unread counter on each conversation."""
+    return Case(When(visitor=user, then=F("visitor_unread")), default=F("tradesman_unread"))
+
+
+def unread_total(user):
+    """Unread messages across the user's conversations (cached)."""
+    key = _unread_cache_key(user.pk)
+    total = cache.get(key)
+    if total is None:
+        total = (
+            Conversation.objects
+            .filter(Q(visitor=user) | Q(tradesman=user))
+            .aggregate(n=Coalesce(Sum(unread_for(user)), 0))["n"]
+        )
+        cache.set(key, total, UNREAD_CACHE_TIMEOUT)
+    return total
+
+
+def refresh_unread_counts(conversation_ids=None):
+    """Recount both counters from Message (after bulk inserts)."""
+    def unread_from(other_party):
+        return Coalesce(
+            Subquery(
+                Message.objects.order_by()
+                .filter(conversation=OuterRef("pk"), is_read=False, sender=OuterRef(other_party))
+                .values("conversation")
+                .annotate(n=Count("*"))
+                .values("n")
+            ),
+            0,
+        )
+
+    conversations = Conversation.objects.all()
+    if conversation_ids is not None:
+        conversations = conversations.filter(id__in=conversation_ids)
+    return conversations.update(visitor_unread=unread_from("tradesman"), tradesman_unread=unread_from("visitor"))
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-17 18:10
+
+import messaging.models
+import users.blobs
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_conversation_tradesman_last_email_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attachment',
+            name='image',
+            field=models.ImageField(storage=users.blobs.get_blob_storage, upload_to=messaging.models.chat_upload_path),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-17 18:24
+
+from django.db import migrations
+
+
+def backfill_last_message(apps, schema_editor):
+    # the send view's code path, so backfilled previews read the same
+    # (collapsed whitespace, truncated with an ellipsis); it touches only
+    # the snapshot fields, which exist as of 0004
+    from messaging.inbox import refresh_last_messages
+
+    refresh_last_messages(batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_conversation_last_message'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
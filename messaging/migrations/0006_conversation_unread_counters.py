@@ -0,0 +1,48 @@
+# Generated by Django 5.1.5 on 2026-10-17 18:22
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread(apps, schema_editor):
+    Conversation = apps.get_model("messaging", "Conversation")
+    Message = apps.get_model("messaging", "Message")
+
+    def unread_from(other_party):
+        # unread = not read and sent by the other participant
+        return Coalesce(
+            models.Subquery(
+                Message.objects.order_by()
+                .filter(conversation=models.OuterRef("pk"), is_read=False, sender=models.OuterRef(other_party))
+                .values("conversation")
+                .annotate(n=models.Count("*"))
+                .values("n")
+            ),
+            0,
+        )
+
+    Conversation.objects.update(
+        visitor_unread=unread_from("tradesman"),
+        tradesman_unread=unread_from("visitor"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_backfill_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='tradesman_unread',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='visitor_unread',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread, migrations.RunPython.noop),
+    ]
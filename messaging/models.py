@@ -3,6 +3,7 @@ from django.conf import settings
 from django.db import models
 from django.db.models import Q
 from django.utils import timezone
+from users.blobs import get_blob_storage
 
 
 User = settings.AUTH_USER_MODEL
@@ -37,6 +38,29 @@ class Conversation(models.Model):
     visitor_last_email_at = models.DateTimeField(null=True, blank=True)
     tradesman_last_email_at = models.DateTimeField(null=True, blank=True)
 
+    # 📨 snapshot of the latest message, written with it (see messaging.inbox)
+    # so the inbox renders from this table alone
+    last_message = models.ForeignKey(
+        "Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_preview = models.CharField(max_length=120, blank=True)
+    last_message_has_attachment = models.BooleanField(default=False)
+
+    # 🔔 unread messages per participant: +1 (F()) on send, 0 when they open it
+    visitor_unread = models.PositiveIntegerField(default=0)
+    tradesman_unread = models.PositiveIntegerField(default=0)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -71,6 +95,14 @@ class Conversation(models.Model):
             return "tradesman_last_email_at"
         return None
 
+    def unread_field_for(self, user):
+        """Which unread counter belongs to this user (compares ids: no user fetch)."""
+        if user.pk == self.visitor_id:
+            return "visitor_unread"
+        if user.pk == self.tradesman_id:
+            return "tradesman_unread"
+        return None
+
 class Message(models.Model):
     id = models.BigAutoField(primary_key=True)
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
@@ -93,7 +125,7 @@ class Message(models.Model):
 
 class Attachment(models.Model):
     message = models.OneToOneField(Message, on_delete=models.CASCADE, related_name="attachment")
-    image = models.ImageField(upload_to=chat_upload_path)
+    image = models.ImageField(upload_to=chat_upload_path, storage=get_blob_storage)
 
     mime_type = models.CharField(max_length=100, blank=True)
     size_bytes = models.PositiveIntegerField(default=0)
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from users.blobs import track_blob_field
+from users.optimization import needs_optimizing, schedule as schedule_optimization
+
+from .broker import publish_message
+from .models import Attachment, Message
+
+# chat images are shared media blobs too (see users.blobs)
+track_blob_field(Attachment, "image")
+
+
+@receiver(post_save, sender=Attachment)
+def optimize_attachment_image(sender, instance, created, **kwargs):
+    # strip EXIF / shrink after the message is sent (see users.optimization)
+    if created and needs_optimizing(instance.image):
+        pk = instance.pk
+        transaction.on_commit(lambda: schedule_optimization("chat", pk))
+
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, **kwargs):
+    # wake the open chat streams once the message is visible to them
+    if created:
+        conversation_id, message_id = instance.conversation_id, instance.pk
+        transaction.on_commit(lambda: publish_message(conversation_id, message_id))
@@ -14,6 +14,9 @@ class ChatApp {
     // Endpoints + settings
     this.sendUrl = config.sendUrl;
     this.pollUrl = config.pollUrl;
+    this.streamUrl = config.streamUrl || "";      // SSE (optional)
+    this.signUrl = config.signUrl || "";          // direct uploads (optional)
+    this.conversationId = config.conversationId || "";
     this.lastId = parseInt(config.lastId || "0", 10) || 0;
     this.pollInterval = config.pollInterval || 6000;
 
@@ -42,7 +45,7 @@ class ChatApp {
   init() {
     this.scrollToBottom();
     this.bindEvents();
-    this.startPolling();
+    this.startLiveUpdates();
   }
 
   bindEvents() {
@@ -121,6 +124,19 @@ class ChatApp {
     this.sendBtn.textContent = "Sending...";
 
     try {
+      // ✅ send the image straight to storage, post only its token
+      if (hasImage && this.signUrl && window.directUpload) {
+        try {
+          const token = await window.directUpload(
+            this.imageInput.files[0], "chat", this.signUrl, { conversation: this.conversationId }
+          );
+          formData.delete("image");
+          formData.append("upload_token", token);
+        } catch (_) {
+          // fall back to sending the file with the message
+        }
+      }
+
       const res = await fetch(this.sendUrl, {
         method: "POST",
         credentials: "same-origin", // ✅ IMPORTANT
@@ -155,12 +171,10 @@ class ChatApp {
         return;
       }
 
-      // Success
-      this.appendHtml(data.html);
-      this.lastId = data.message_id;
+      // Success (the stream may have delivered it already)
+      this.receive(data.message_id, data.html);
 
       this.resetForm();
-      this.scrollToBottom();
     } catch (err) {
       this.showError("Network error. Please try again.");
     } finally {
@@ -176,34 +190,66 @@ class ChatApp {
         headers: { "X-Requested-With": "XMLHttpRequest" }
       });
 
-      if (!res.ok) return;
+      if (res.status === 204 || !res.ok) return; // 204 = nothing new
 
       const data = await this.safeJson(res);
       if (!data || !data.ok) return;
 
-      const chunks = data.html_chunks || [];
-      if (!chunks.length) return;
-
-      chunks.forEach((html) => this.appendHtml(html));
-      this.lastId = data.last_id ?? this.lastId;
-      this.scrollToBottom();
+      this.receive(data.last_id, data.html);
+      if (data.has_more) this.pollMessages();
     } catch (_) {
       // silent MVP
     }
   }
 
   startPolling() {
+    if (this._pollTimer) return;
     this._pollTimer = setInterval(() => this.pollMessages(), this.pollInterval);
   }
 
+  // ✅ Server-Sent Events when available, polling otherwise
+  startLiveUpdates() {
+    if (!this.streamUrl || !window.EventSource) return this.startPolling();
+
+    let failures = 0;
+    const stream = new EventSource(`${this.streamUrl}?after_id=${this.lastId}`);
+
+    stream.onopen = () => { failures = 0; };
+    stream.onmessage = (e) => {
+      let data = null;
+      try { data = JSON.parse(e.data); } catch (_) { return; }
+      this.receive(data.id, data.html);
+    };
+    stream.onerror = () => {
+      // reconnects on its own (Last-Event-ID); give up if refused or flaky
+      failures += 1;
+      if (stream.readyState === EventSource.CLOSED || failures >= 3) {
+        stream.close();
+        this.startPolling();
+      }
+    };
+    this._stream = stream;
+  }
+
+  receive(id, html) {
+    if (!id || id <= this.lastId) return; // already shown
+    this.appendHtml(html);
+    this.lastId = id;
+    this.scrollToBottom();
+  }
+
   appendHtml(html) {
     const container = this.chatBox.querySelector(".space-y-3");
     if (!container) return;
 
     const temp = document.createElement("div");
     temp.innerHTML = html;
-    const node = temp.firstElementChild;
-    if (node) container.appendChild(node);
+    // one bubble (send/stream) or several (poll); skip any already on the page
+    Array.from(temp.children).forEach((node) => {
+      const id = node.dataset.messageId;
+      if (id && container.querySelector(`[data-message-id="${id}"]`)) return;
+      container.appendChild(node);
+    });
   }
 
   scrollToBottom() {
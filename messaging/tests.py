@@ -1,3 +1,151 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from .inbox import add_unread, mark_read, record_last_message, refresh_last_messages, unread_total
+from .models import Conversation, Message
+
+User = get_user_model()
+
+
+class PollMessagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.visitor = User.objects.create_user("visitor", "visitor@example.com", "pw12345!")
+        cls.tradesman = User.objects.create_user("tradesman", "tradesman@example.com", "pw12345!")
+        cls.convo = Conversation.objects.create(visitor=cls.visitor, tradesman=cls.tradesman)
+        cls.messages = [
+            Message.objects.create(conversation=cls.convo, sender=cls.visitor, content=f"message {i}")
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.tradesman)
+
+    def poll(self, **params):
+        return self.client.get(reverse("messaging:api_poll", args=[self.convo.id]), params)
+
+    def test_nothing_new_is_204(self):
+        response = self.poll(after_id=self.messages[-1].id)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b"")
+
+    def test_returns_only_newer_messages(self):
+        response = self.poll(after_id=self.messages[0].id)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["count"], data["last_id"], data["has_more"]), (2, self.messages[-1].id, False))
+        self.assertIn("message 2", data["html"])
+        self.assertNotIn("message 0", data["html"])
+
+    def test_limit_reports_more(self):
+        data = self.poll(after_id=0, limit=2).json()
+        self.assertEqual((data["count"], data["last_id"], data["has_more"]), (2, self.messages[1].id, True))
+
+    def test_read_up_to_the_last_polled_message(self):
+        self.poll(after_id=0, limit=2)
+        self.assertEqual(
+            list(Message.objects.filter(is_read=False).values_list("id", flat=True)),
+            [self.messages[-1].id],
+        )
+
+    def test_bad_after_id_is_400(self):
+        response = self.poll(after_id="abc")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()["ok"])
+
+    def test_outsiders_get_404(self):
+        outsider = User.objects.create_user("outsider", "outsider@example.com", "pw12345!")
+        self.client.force_login(outsider)
+        self.assertEqual(self.poll(after_id=0).status_code, 404)
+
+
+class LastMessageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.visitor = User.objects.create_user("visitor", "visitor@example.com", "pw12345!")
+        cls.tradesman = User.objects.create_user("tradesman", "tradesman@example.com", "pw12345!")
+        cls.convo = Conversation.objects.create(visitor=cls.visitor, tradesman=cls.tradesman)
+
+    def send(self, content, sender=None):
+        return Message.objects.create(conversation=self.convo, sender=sender or self.visitor, content=content)
+
+    def snapshot(self):
+        self.convo.refresh_from_db()
+        return self.convo.last_message_id, self.convo.last_message_preview
+
+    def test_older_message_never_overwrites_a_newer_one(self):
+        older, newer = self.send("older"), self.send("newer")
+        self.assertEqual(record_last_message(newer, False, timezone.now()), 1)
+        # a slower request that committed the older message records last
+        self.assertEqual(record_last_message(older, False, timezone.now()), 0)
+        self.assertEqual(self.snapshot(), (newer.id, "newer"))
+
+    def test_preview_is_collapsed_and_truncated(self):
+        message = self.send("line one\n\n  line two " + "x" * 200)
+        record_last_message(message, False, timezone.now())
+        _, preview = self.snapshot()
+        self.assertTrue(preview.startswith("line one line two x"))
+        self.assertTrue(preview.endswith("…"))
+        self.assertEqual(len(preview), 120)
+
+    def test_refresh_matches_the_send_path(self):
+        message = self.send("hello\nthere", sender=self.tradesman)
+        record_last_message(message, False, timezone.now())
+        recorded = self.snapshot()
+
+        Conversation.objects.filter(id=self.convo.id).update(last_message=None, last_message_preview="")
+        self.assertEqual(refresh_last_messages(), 1)
+        self.assertEqual(self.snapshot(), recorded)
+        self.assertEqual(self.convo.last_message_sender_id, self.tradesman.id)
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.visitor = User.objects.create_user("visitor", "visitor@example.com", "pw12345!")
+        cls.tradesman = User.objects.create_user("tradesman", "tradesman@example.com", "pw12345!")
+        cls.convo = Conversation.objects.create(visitor=cls.visitor, tradesman=cls.tradesman)
+
+    def send(self, sender, recipient, content="hi"):
+        message = Message.objects.create(conversation=self.convo, sender=sender, content=content)
+        add_unread(self.convo, recipient)
+        return message
+
+    def counters(self):
+        self.convo.refresh_from_db()
+        return self.convo.visitor_unread, self.convo.tradesman_unread
+
+    def test_add_unread_counts_for_the_recipient(self):
+        self.send(self.visitor, self.tradesman)
+        self.send(self.visitor, self.tradesman)
+        self.send(self.tradesman, self.visitor)
+        self.assertEqual(self.counters(), (1, 2))
+        self.assertEqual(unread_total(self.tradesman), 2)
+
+    def test_mark_read_resets_only_the_reader(self):
+        self.send(self.visitor, self.tradesman)
+        self.send(self.tradesman, self.visitor)
+        mark_read(self.convo, self.tradesman)
+        self.assertEqual(self.counters(), (1, 0))
+        self.assertFalse(self.convo.messages.filter(sender=self.visitor, is_read=False).exists())
+        self.assertTrue(self.convo.messages.filter(sender=self.tradesman, is_read=False).exists())
+
+    def test_mark_read_up_to_id_keeps_newer_messages_unread(self):
+        first = self.send(self.visitor, self.tradesman)
+        self.send(self.visitor, self.tradesman)
+        mark_read(self.convo, self.tradesman, up_to_id=first.id)
+        self.assertEqual(self.counters(), (0, 1))
+
+    def test_mark_read_heals_a_drifted_counter(self):
+        self.send(self.visitor, self.tradesman)
+        mark_read(self.convo, self.tradesman)
+        Conversation.objects.filter(id=self.convo.id).update(tradesman_unread=5)
+
+        mark_read(self.convo, self.tradesman, up_to_id=0)  # nothing left to mark
+        self.assertEqual(self.counters(), (0, 0))
+
+        Conversation.objects.filter(id=self.convo.id).update(tradesman_unread=5)
+        mark_read(self.convo, self.tradesman)
+        self.assertEqual(self.counters(), (0, 0))
@@ -14,6 +14,8 @@ urlpatterns = [
     # APIs (AJAX)
     path("api/c/<uuid:conversation_id>/send/", views.api_send_message, name="api_send"),
     path("api/c/<uuid:conversation_id>/poll/", views.api_poll_messages, name="api_poll"),
+    path("api/c/<uuid:conversation_id>/stream/", views.stream_messages, name="api_stream"),
+    path("api/unread/", views.api_unread_count, name="api_unread"),
     path("inbox/", views.inbox, name="inbox"),
 
 
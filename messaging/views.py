@@ -1,25 +1,50 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import Max, Q, Count
-from django.http import JsonResponse, Http404
+from django.db.models import Exists, Max, OuterRef, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from datetime import timedelta
 from django.conf import settings
 from django.core.mail import send_mail
+from django.db import close_old_connections, transaction
+from .broker import get_broker
 from .forms import MessageSendForm
+from .inbox import add_unread, mark_read, record_last_message, unread_for, unread_total
 from .models import Conversation, Message, Attachment
+from users.uploads import UploadError, confirm_upload
 
 User = get_user_model()
 
+STREAM_HEARTBEAT = 15     # seconds between keep-alives (and DB checks when idle)
+STREAM_LIFETIME = 5 * 60  # then the browser reconnects with Last-Event-ID
+STREAM_BATCH = 50
+POLL_LIMIT = 50
+POLL_MAX_LIMIT = 200
+
 
 def _require_participant(conversation, user):
     if not conversation.is_participant(user):
         raise Http404("Conversation not found.")
 
 
+def _messages_after(conversation_id, after_id, limit):
+    """Messages with id > after_id, oldest first; sender and attachment in the same query."""
+    return list(
+        Message.objects
+        .filter(conversation_id=conversation_id, id__gt=after_id)
+        .select_related("sender", "attachment")
+        .order_by("id")[:limit]
+    )
+
+
 @login_required
 def start_conversation(request, tradesman_id):
     tradesman = get_object_or_404(User, id=tradesman_id)
@@ -40,7 +65,7 @@ def conversation_detail(request, conversation_id):
     convo = get_object_or_404(Conversation, id=conversation_id)
     _require_participant(convo, request.user)
 
-    convo.messages.exclude(sender=request.user).filter(is_read=False).update(is_read=True)
+    mark_read(convo, request.user)
 
     messages_qs = (
         convo.messages
@@ -75,34 +100,52 @@ def api_send_message(request, conversation_id):
     content = (form.cleaned_data.get("content") or "").strip()
     image = form.cleaned_data.get("image")
 
-    if not content and not image:
+    # the image was uploaded straight to storage: check it before creating anything
+    upload = None
+    upload_token = form.cleaned_data.get("upload_token")
+    if upload_token and not image:
+        try:
+            upload = confirm_upload(request.user, upload_token, "chat", context=convo.id)
+        except UploadError as exc:
+            return JsonResponse({"ok": False, "errors": {"image": [str(exc)]}}, status=400)
+
+    if not content and not image and not upload:
         return JsonResponse({"ok": False, "errors": {"content": ["Type a message or attach an image."]}}, status=400)
 
     now = timezone.now()
+    recipient = convo.other_party(request.user)
 
-    # 1) Save message
-    msg = Message.objects.create(
-        conversation=convo,
-        sender=request.user,
-        content=content,
-        created_at=now,
-        is_read=False,  # recipient hasn't read it yet
-    )
-
-    # 2) Save attachment (optional)
-    if image:
-        Attachment.objects.create(
-            message=msg,
-            image=image,
-            mime_type=getattr(image, "content_type", "") or "",
-            size_bytes=getattr(image, "size", 0) or 0,
+    with transaction.atomic():
+        # 1) Save message
+        msg = Message.objects.create(
+            conversation=convo,
+            sender=request.user,
+            content=content,
+            created_at=now,
+            is_read=False,  # recipient hasn't read it yet
         )
 
-    # 3) Bump last_message_at for inbox sorting
-    Conversation.objects.filter(id=convo.id).update(last_message_at=now)
+        # 2) Save attachment (optional)
+        if image:
+            Attachment.objects.create(
+                message=msg,
+                image=image,
+                mime_type=getattr(image, "content_type", "") or "",
+                size_bytes=getattr(image, "size", 0) or 0,
+            )
+        elif upload:
+            Attachment.objects.create(
+                message=msg,
+                image=upload.name,
+                mime_type=upload.content_type,
+                size_bytes=upload.size,
+            )
+
+        # 3) Bump last_message_at + the inbox snapshot, count it unread for the recipient
+        record_last_message(msg, has_attachment=bool(image or upload), at=now)
+        add_unread(convo, recipient)
 
     # 4) Email notify recipient if inactive + throttled
-    recipient = convo.other_party(request.user)
     if recipient and recipient.email:
         # Try to access profile last_seen_at safely
         recipient_profile = getattr(recipient, "userprofile", None) or getattr(recipient, "profile", None)
@@ -156,42 +199,140 @@ def api_send_message(request, conversation_id):
 
 
 @login_required
-@require_POST
+@require_GET
 def api_poll_messages(request, conversation_id):
-    convo = get_object_or_404(Conversation, id=conversation_id)
-    _require_participant(convo, request.user)
-
-    form = MessageSendForm(request.POST, request.FILES)
-    if not form.is_valid():
-        return JsonResponse({"ok": False, "errors": form.errors}, status=400)
-
-    content = (form.cleaned_data.get("content") or "").strip()
-    image = form.cleaned_data.get("image")
-
-    chat_msg = Message.objects.create(
-        conversation=convo,
-        sender=request.user,
-        content=content,
-        created_at=timezone.now(),
+    """
+    Messages after ?after_id= (at most ?limit=), rendered in one template
+    pass. 204 with no body when there is nothing new: that case costs the
+    single participant query.
+    """
+    try:
+        after_id = int(request.GET.get("after_id") or 0)
+        limit = min(max(int(request.GET.get("limit") or POLL_LIMIT), 1), POLL_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({"ok": False, "errors": {"after_id": ["Expected a number."]}}, status=400)
+
+    convo = (
+        Conversation.objects
+        .filter(Q(visitor=request.user) | Q(tradesman=request.user), id=conversation_id)
+        .annotate(has_new=Exists(Message.objects.filter(conversation=OuterRef("pk"), id__gt=after_id)))
+        .only("id", "visitor_id", "tradesman_id")
+        .first()
     )
+    if convo is None:
+        raise Http404("Conversation not found.")
+    if not convo.has_new:
+        return HttpResponse(status=204)
 
-    if image:
-        Attachment.objects.create(
-            message=chat_msg,
-            image=image,
-            mime_type=getattr(image, "content_type", "") or "",
-            size_bytes=getattr(image, "size", 0) or 0,
-        )
+    chat_messages = _messages_after(convo.id, after_id, limit + 1)
+    has_more = len(chat_messages) > limit
+    chat_messages = chat_messages[:limit]
 
-    Conversation.objects.filter(id=convo.id).update(last_message_at=timezone.now())
+    # the chat is open: what it shows has been read
+    if any(m.sender_id != request.user.id for m in chat_messages):
+        mark_read(convo, request.user, up_to_id=chat_messages[-1].id)
 
     html = render_to_string(
-        "messaging/partials/message_bubble.html",
-        {"m": chat_msg, "me": request.user},
+        "messaging/partials/message_list.html",
+        {"chat_messages": chat_messages, "me": request.user},
         request=request,
     )
+    return JsonResponse({
+        "ok": True,
+        "html": html,
+        "count": len(chat_messages),
+        "last_id": chat_messages[-1].id,
+        "has_more": has_more,
+    })
+
+
+# ---------- live stream (SSE) ----------
+# One long-lived GET per open conversation, served by the ASGI app
+# (handyhub/asgi.py); new messages are pushed as they are committed (see
+# messaging.broker). Under WSGI it answers 204, which tells EventSource to
+# stop, and chat.js falls back to polling.
+
+@sync_to_async
+def _stream_user_and_conversation(request, conversation_id):
+    if not request.user.is_authenticated:
+        return None, None
+    convo = get_object_or_404(Conversation, id=conversation_id)
+    _require_participant(convo, request.user)
+    return request.user, convo
+
+
+# ✅ the shared pool, not the one sync thread: open streams must not queue behind each other
+@sync_to_async(thread_sensitive=False)
+def _stream_events(request, convo, user, last_id):
+    """SSE events for the messages after last_id; returns (events, new last_id)."""
+    try:
+        # ✅ an idle heartbeat is one EXISTS, nothing rendered
+        if not Message.objects.filter(conversation_id=convo.id, id__gt=last_id).exists():
+            return [], last_id
+        events = []
+        unread_seen = False
+        for m in _messages_after(convo.id, last_id, STREAM_BATCH):
+            html = render_to_string("messaging/partials/message_bubble.html", {"m": m, "me": user}, request=request)
+            events.append(f"id: {m.id}\ndata: {json.dumps({'id': m.id, 'html': html})}\n\n")
+            if m.sender_id != user.id:
+                unread_seen = True
+            last_id = m.id
+        if unread_seen:
+            mark_read(convo, user, up_to_id=last_id)
+        return events, last_id
+    finally:
+        # pool threads outlive the request, so drop stale connections as request_finished would
+        close_old_connections()
+
+
+def _stream_start_id(request):
+    ids = [request.GET.get("after_id"), request.headers.get("Last-Event-ID")]
+    return max([int(i) for i in ids if i and i.isdigit()] or [0])
+
+
+async def _event_stream(request, convo, user, last_id):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_LIFETIME
+
+    async with get_broker().subscribe(convo.id) as subscription:
+        yield "retry: 3000\n\n"
+        while True:
+            # also on heartbeats: catches messages published in another process
+            events, last_id = await _stream_events(request, convo, user, last_id)
+            for event in events:
+                yield event
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(subscription.get(), timeout=min(STREAM_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+
+
+async def stream_messages(request, conversation_id):
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)  # no streaming under WSGI: client polls
+
+    user, convo = await _stream_user_and_conversation(request, conversation_id)
+    if user is None:
+        return HttpResponse(status=403)
+
+    response = StreamingHttpResponse(
+        _event_stream(request, convo, user, _stream_start_id(request)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return response
 
-    return JsonResponse({"ok": True, "message_id": chat_msg.id, "html": html})
+
+@login_required
+@require_GET
+def api_unread_count(request):
+    """Total unread messages for the header badge (cached, no Message query)."""
+    return JsonResponse({"ok": True, "unread": unread_total(request.user)})
 
 
 @login_required
@@ -199,24 +340,10 @@ def inbox(request):
     qs = (
         Conversation.objects
         .filter(Q(visitor=request.user) | Q(tradesman=request.user))
-        .annotate(
-            unread_count=Count(
-                "messages",
-                filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user)
-            )
-        )
+        .annotate(unread_count=unread_for(request.user))  # ✅ counter on Conversation, no Message scan
+        .select_related("visitor", "tradesman")
         .order_by("-last_message_at")
     )
 
-    inbox_items = []
-    for convo in qs:
-        last_msg = (
-            convo.messages
-            .select_related("sender")
-            .prefetch_related("attachment")
-            .order_by("-created_at")
-            .first()
-        )
-        inbox_items.append({"convo": convo, "last_msg": last_msg})
-
-    return render(request, "messaging/inbox.html", {"inbox_items": inbox_items})
\ No newline at end of file
+    # ✅ the last message comes from the snapshot on Conversation (messaging.inbox)
+    return render(request, "messaging/inbox.html", {"conversations": qs})
\ No newline at end of file
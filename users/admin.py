@@ -9,6 +9,7 @@ admin.site.register(Province)
 admin.site.register(City)
 admin.site.register(ServiceArea)
 admin.site.register(License)
+admin.site.register(PostalCodeCentroid)
 
 @admin.register(CallOutFeeSettings)
 class CallOutFeeSettingsAdmin(admin.ModelAdmin):
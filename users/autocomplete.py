@@ -0,0 +1,104 @@
+"""
+Autocomplete for cities and services.
+
+Names are kept in a sorted in-memory list of (key, entry) pairs, one key per
+word start ("calgary nw" and "nw" for "Calgary NW"), so a prefix lookup is a
+bisect plus a short scan. The index is a Snapshot: built on first use in
+each worker and rebuilt after City, ServiceArea or taxonomy changes.
+"""
+from bisect import bisect_left
+
+from services.models import SubCategory
+
+from .models import City, ServiceArea
+from .search import normalize_city
+from .snapshots import Snapshot
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+TYPE_CITY = "city"
+TYPE_SUBCATEGORY = "subcategory"
+
+
+def _keys(label):
+    words = normalize_city(label).split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    def __init__(self, entries):
+        pairs = []
+        for entry in entries:
+            for key in _keys(entry["label"]):
+                pairs.append((key, entry))
+        pairs.sort(key=lambda pair: (pair[0], pair[1]["label"]))
+
+        self._keys = [key for key, _ in pairs]
+        self._entries = [entry for _, entry in pairs]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def search(self, prefix, limit=DEFAULT_LIMIT, type=None):
+        prefix = normalize_city(prefix)
+        if not prefix:
+            return []
+
+        results, seen = [], set()
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix) and len(results) < limit:
+            entry = self._entries[i]
+            i += 1
+            if type and entry["type"] != type:
+                continue
+            if id(entry) in seen:
+                continue
+            seen.add(id(entry))
+            results.append(entry)
+        return results
+
+
+def _city_entries():
+    """City and active ServiceArea names, one entry per normalized city."""
+    entries = {}
+
+    areas = ServiceArea.objects.filter(is_active=True).values_list("city", "name", "province")
+    for city, name, province in areas:
+        for label in (city, name):
+            key = normalize_city(label)
+            if key and key not in entries:
+                entries[key] = {"type": TYPE_CITY, "label": label, "value": label, "province": province}
+
+    for name, province in City.objects.values_list("name", "province__code"):
+        key = normalize_city(name)
+        if key and key not in entries:
+            entries[key] = {"type": TYPE_CITY, "label": name, "value": name, "province": province}
+
+    return list(entries.values())
+
+
+def _subcategory_entries():
+    return [
+        {
+            "type": TYPE_SUBCATEGORY,
+            "label": name,
+            "id": sub_id,
+            "category_id": category_id,
+            "category": category_name,
+        }
+        for sub_id, name, category_id, category_name in (
+            SubCategory.objects.values_list("id", "name", "category_id", "category__name")
+        )
+    ]
+
+
+def build_index():
+    return PrefixIndex(_city_entries() + _subcategory_entries())
+
+
+autocomplete_index = Snapshot("autocomplete", build_index)
+
+
+def autocomplete(prefix, limit=None, type=None):
+    limit = min(max(limit or DEFAULT_LIMIT, 1), MAX_LIMIT)
+    return autocomplete_index.get().search(prefix, limit=limit, type=type)
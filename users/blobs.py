@@ -0,0 +1,290 @@
+"""
+Content-addressed media storage.
+
+Profile pictures, gallery photos, license documents and chat images are
+stored once per content: BlobStorage names a saved file after the SHA-256
+of its bytes (blobs/ab/cd/<digest>.<ext>), and a second upload of the same
+bytes reuses the stored object instead of writing it again. The digest is
+computed while the request body streams in (the Hashing*UploadHandler
+classes in FILE_UPLOAD_HANDLERS), or by reading the file in chunks when it
+didn't come from a request.
+
+MediaBlob rows count the model rows pointing at each blob. Signals set up by
+track_blob_field() keep the count in the same transaction as the row:
++1 when a row starts using a name, -1 when it stops or is deleted. When the
+count reaches zero the blob is collected after commit. Blobs written or
+reused within BLOB_GRACE_PERIOD are skipped, because a request may have
+saved the file and not yet committed its row. `manage.py purge_media_blobs`
+picks those up later.
+
+Files that aren't in the table (older uploads, the default profile picture,
+image derivatives) are left alone, as before.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import Storage, default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+DEFAULT_GRACE_PERIOD = timedelta(minutes=10)
+
+BLOB_DIR = "blobs/"
+
+# (model, field name) pairs registered with track_blob_field()
+TRACKED_FIELDS = []
+
+
+def _blobs():
+    return apps.get_model("users", "MediaBlob")
+
+
+def grace_period():
+    return getattr(settings, "BLOB_GRACE_PERIOD", DEFAULT_GRACE_PERIOD)
+
+
+def blob_path(digest, ext):
+    return f"{BLOB_DIR}{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def is_blob_path(name):
+    return bool(name) and name.startswith(BLOB_DIR)
+
+
+def hash_file(content):
+    """SHA-256 of a File, read in chunks; uses the digest taken during upload if there is one."""
+    digest = getattr(content, "sha256", None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    for chunk in content.chunks():  # from the start
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()
+
+
+# ---------- upload handlers ----------
+
+class HashingUploadMixin:
+    """Hash each uploaded file as its chunks arrive; sets `.sha256` on the result."""
+
+    def new_file(self, *args, **kwargs):
+        self._sha256 = hashlib.sha256()  # before super(): it may raise StopFutureHandlers
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self._sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+# ---------- storage ----------
+
+@deconstructible
+class BlobStorage(Storage):
+    """
+    Stores new files under their digest, on top of the default storage
+    (which does the actual I/O). Everything else is delegated.
+    """
+
+    @property
+    def backend(self):
+        return default_storage
+
+    def __getattr__(self, name):
+        # bucket_name, location, ... of the real storage (media URL cache, signed uploads)
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def _save(self, name, content):
+        digest = hash_file(content)
+        with transaction.atomic():
+            blob, created = _blobs().objects.select_for_update().get_or_create(
+                digest=digest,
+                defaults={"name": blob_path(digest, os.path.splitext(name)[1]), "size": content.size},
+            )
+            if created or not self.backend.exists(blob.name):
+                content.seek(0)
+                blob.name = self.backend.save(blob.name, content)
+            # within the grace period a zero count doesn't get the blob collected
+            blob.last_stored_at = timezone.now()
+            blob.save()
+        return blob.name
+
+    def get_available_name(self, name, max_length=None):
+        return name  # the digest decides the final name
+
+    def _open(self, name, mode="rb"):
+        return self.backend.open(name, mode)
+
+    def delete(self, name):
+        self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def generate_filename(self, filename):
+        return self.backend.generate_filename(filename)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+blob_storage = BlobStorage()
+
+
+def get_blob_storage():
+    """`storage=` callable for the model fields (keeps the instance out of migrations)."""
+    return blob_storage
+
+
+def base_storage(storage):
+    """The storage doing the I/O (BlobStorage unwrapped)."""
+    return storage.backend if isinstance(storage, BlobStorage) else storage
+
+
+# ---------- references ----------
+
+def acquire(name):
+    if name:
+        _blobs().objects.filter(name=name).update(ref_count=F("ref_count") + 1)
+
+
+def release(name):
+    if name and _blobs().objects.filter(name=name, ref_count__gt=0).update(ref_count=F("ref_count") - 1):
+        transaction.on_commit(lambda: collect(name))
+
+
+def adopt(storage, name):
+    """
+    Register a file that was written straight to storage (signed uploads).
+    If the same content is already a blob, the new copy is deleted and the
+    blob's name is returned instead. The caller's row takes the reference.
+    """
+    backend = base_storage(storage)
+    with backend.open(name, "rb") as fh:
+        digest = hash_file(fh)
+
+    with transaction.atomic():
+        blob, created = _blobs().objects.select_for_update().get_or_create(
+            digest=digest, defaults={"name": name, "size": backend.size(name)},
+        )
+        if not created and blob.name != name and backend.exists(blob.name):
+            backend.delete(name)
+        elif not created and blob.name != name:
+            blob.name = name  # the stored blob went missing: use the new copy
+        blob.last_stored_at = timezone.now()
+        blob.save()
+    return blob.name
+
+
+def collect(name=None, older_than=None):
+    """
+    Delete unreferenced blobs (just `name`, or all) that weren't stored
+    within the grace period. Returns the number deleted.
+    """
+    cutoff = timezone.now() - (older_than if older_than is not None else grace_period())
+    candidates = _blobs().objects.filter(ref_count=0, last_stored_at__lt=cutoff)
+    if name is not None:
+        candidates = candidates.filter(name=name)
+
+    deleted = 0
+    for pk in candidates.values_list("pk", flat=True):
+        with transaction.atomic():
+            # re-checked under the row lock: a concurrent save may have revived it
+            blob = (
+                _blobs().objects.select_for_update(skip_locked=True)
+                .filter(pk=pk, ref_count=0, last_stored_at__lt=cutoff)
+                .first()
+            )
+            if blob is None:
+                continue
+            blob_storage.backend.delete(blob.name)
+            blob.delete()
+            deleted += 1
+    return deleted
+
+
+def recount():
+    """Recompute every ref_count from the tracked fields; returns the number fixed."""
+    counts = {}
+    for model, field_name in TRACKED_FIELDS:
+        rows = (
+            model._default_manager.filter(**{f"{field_name}__in": _blobs().objects.values("name")})
+            .values(field_name).annotate(n=Count("pk")).values_list(field_name, "n")
+        )
+        for name, n in rows:
+            counts[name] = counts.get(name, 0) + n
+
+    fixed = 0
+    for blob in _blobs().objects.only("pk", "name", "ref_count").iterator():
+        actual = counts.get(blob.name, 0)
+        if blob.ref_count != actual:
+            _blobs().objects.filter(pk=blob.pk).update(ref_count=actual)
+            fixed += 1
+    return fixed
+
+
+# ---------- model fields ----------
+
+def track_blob_field(model, field_name):
+    """Count references from `model.field_name` (call from an app's ready())."""
+    uid = f"blob-refs:{model._meta.label}.{field_name}"
+    if (model, field_name) not in TRACKED_FIELDS:
+        TRACKED_FIELDS.append((model, field_name))
+
+    def remember_previous(sender, instance, update_fields=None, **kwargs):
+        previous = None
+        if not instance._state.adding and (update_fields is None or field_name in update_fields):
+            previous = sender._default_manager.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+        instance.__dict__[f"_blob_previous_{field_name}"] = previous
+
+    def update_references(sender, instance, created, update_fields=None, **kwargs):
+        if update_fields is not None and field_name not in update_fields:
+            return
+        name = getattr(instance, field_name).name or None
+        previous = instance.__dict__.pop(f"_blob_previous_{field_name}", None)
+        if created or name != previous:
+            acquire(name)
+            if not created:
+                release(previous)
+
+    def drop_reference(sender, instance, **kwargs):
+        release(getattr(instance, field_name).name or None)
+
+    pre_save.connect(remember_previous, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(update_references, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(drop_reference, sender=model, weak=False, dispatch_uid=uid)
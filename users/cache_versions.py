@@ -0,0 +1,55 @@
+"""
+Generation counters kept in the Django cache.
+
+A cached value embeds the generations it was built from in its key; bumping a
+generation makes every key built from it unreachable without flushing anything
+else. Missing counters start from the current time in ms, so an evicted
+counter never comes back with a number that was already used.
+"""
+import time
+from urllib.parse import quote
+
+from django.core.cache import cache
+
+KEY_PREFIX = "gen:"
+
+
+def _key(name):
+    # names can carry user input (city names with spaces); keep keys memcached-safe
+    return f"{KEY_PREFIX}{quote(name, safe=':')}"
+
+
+def _seed():
+    return int(time.time() * 1000)
+
+
+def get_versions(names):
+    """{name: generation} for every name, creating missing counters."""
+    keys = {_key(name): name for name in names}
+    found = cache.get_many(list(keys))
+
+    missing = {key: _seed() for key in keys if key not in found}
+    for key, value in missing.items():
+        # add() keeps a value another worker may have just written
+        if not cache.add(key, value, timeout=None):
+            value = cache.get(key, value)
+        found[key] = value
+
+    return {name: found[key] for key, name in keys.items()}
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_versions(names):
+    for name in set(names):
+        key = _key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _seed(), timeout=None)
+
+
+def bump_version(name):
+    bump_versions([name])
@@ -0,0 +1,141 @@
+"""
+Validators (ETag / Last-Modified) for conditional GETs.
+
+They are computed before any rendering or serialization so an unchanged
+resource can answer 304 straight away:
+
+* profile pages: the newest timestamp and row count of each related table
+  (counts catch deletes, which leave no timestamp behind), loaded in the
+  same query as the user and profile, plus the viewer, since the page
+  differs per user;
+* the search API: the result cache key, which already embeds the filters and
+  the search-index generations.
+
+Both also include the current media URL window (media.url_epoch): the bodies
+embed media URLs that may be signed and expire, so a copy from an earlier
+window is sent again instead of revalidated.
+
+Last-Modified is the newest of those timestamps (and the window's start), so
+it can't see a delete; If-None-Match wins when both are sent (browsers send
+both).
+"""
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import (
+    CallOutFeeSettings,
+    License,
+    TradeWorkPhoto,
+    UserService,
+    UserServiceArea,
+)
+from .media import url_epoch, url_epoch_start
+from .taxonomy import taxonomy_snapshot
+
+
+def _latest(queryset, fk, field, outer):
+    return Subquery(
+        queryset.filter(**{fk: OuterRef(outer)})
+        .order_by()
+        .values(fk)
+        .annotate(latest=Max(field))
+        .values("latest")[:1]
+    )
+
+
+def _count(queryset, fk, outer):
+    return Subquery(
+        queryset.filter(**{fk: OuterRef(outer)})
+        .order_by()
+        .values(fk)
+        .annotate(n=Count("*"))
+        .values("n")[:1],
+        output_field=IntegerField(),
+    )
+
+
+STATE_FIELDS = (
+    "services_latest", "services_count",
+    "areas_latest", "areas_count",
+    "photos_latest", "photos_count",
+    "callout_latest",
+    "licenses_latest", "licenses_count",
+)
+
+
+def with_profile_state(users):
+    """
+    Annotate a User queryset with the newest timestamp and row count of
+    everything the public profile page is built from, so loading the user
+    and computing the validators is one query.
+    """
+    return users.annotate(
+        services_latest=_latest(UserService.objects.all(), "user_id", "created_at", outer="pk"),
+        services_count=_count(UserService.objects.all(), "user_id", outer="pk"),
+        areas_latest=_latest(UserServiceArea.objects.all(), "user_id", "created_at", outer="pk"),
+        areas_count=_count(UserServiceArea.objects.all(), "user_id", outer="pk"),
+        photos_latest=_latest(TradeWorkPhoto.objects.all(), "user_id", "updated_at", outer="pk"),
+        photos_count=_count(TradeWorkPhoto.objects.all(), "user_id", outer="pk"),
+        callout_latest=_latest(CallOutFeeSettings.objects.all(), "user_id", "updated_at", outer="pk"),
+        # licenses hang off the profile, not the user
+        licenses_latest=_latest(License.objects.all(), "profile_id", "updated_at", outer="profile__pk"),
+        licenses_count=_count(License.objects.all(), "profile_id", outer="profile__pk"),
+    )
+
+
+def profile_validators(request, user):
+    """(etag, last_modified timestamp) for a user loaded via with_profile_state()."""
+    state = {field: getattr(user, field) for field in STATE_FIELDS}
+    state["user_updated_at"] = user.profile.user_updated_at
+
+    epoch = url_epoch()
+    last_modified = max(
+        max(value for key, value in state.items() if key.endswith(("_at", "_latest")) and value).timestamp(),
+        url_epoch_start(epoch),
+    )
+
+    parts = [
+        *(state[key] for key in sorted(state)),
+        # the page shows the viewer's own nav/actions; area names come from the taxonomy
+        request.user.pk if request.user.is_authenticated else "anon",
+        taxonomy_snapshot.version,
+        epoch,
+    ]
+    return _etag(parts), int(last_modified)
+
+
+def _etag(parts):
+    raw = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def not_modified(request, etag=None, last_modified=None, pages=False):
+    """
+    The 304/412 response if the request's validators match, else None.
+    For HTML `pages`, requests with flash messages waiting are always
+    rendered so the messages get shown (and consumed).
+    """
+    if etag is None:
+        return None
+    if pages and len(messages.get_messages(request)):
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag=None, last_modified=None, private=False):
+    if etag is None:
+        return response
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    # keep a copy, but revalidate before reusing it
+    patch_cache_control(response, no_cache=True, **({"private": True} if private else {"public": True}))
+    return response
+
+
+def search_etag(cache_key):
+    return _etag([cache_key])
@@ -0,0 +1,109 @@
+"""
+Per-user counters (UserCounters).
+
+Signals call adjust() inside the transaction that inserts or deletes the
+counted row, so a counter never commits without its row. Quota checks lock
+the counters row (counters_for_update) so two concurrent adds can't both pass.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (
+    License,
+    TradeWorkPhoto,
+    UserCounters,
+    UserService,
+    UserServiceArea,
+)
+
+COUNTER_FIELDS = ("services", "service_areas", "gallery_photos", "licenses")
+
+
+def adjust(user_id, **deltas):
+    """services=+1, licenses=-1, ... as a single F() UPDATE."""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    # A missing row (e.g. mid cascade-delete of the user) is left alone:
+    # get_counters() creates it from real counts when it's next needed.
+    UserCounters.objects.filter(user_id=user_id).update(**changes)
+
+
+def get_counters(user):
+    counters = UserCounters.objects.filter(user=user).first()
+    if counters is None:
+        reconcile(user_ids=[user.pk])
+        counters = UserCounters.objects.get(user=user)
+    return counters
+
+
+def counters_for_update(user):
+    """The user's counters row, locked until the end of the transaction."""
+    get_counters(user)
+    return UserCounters.objects.select_for_update().get(user=user)
+
+
+def _count(model, fk, outer):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk: OuterRef(outer)})
+            .order_by()
+            .values(fk)
+            .annotate(n=Count("*"))
+            .values("n")[:1],
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def actual_counts(users):
+    """User queryset annotated with the real count of each counted table."""
+    return users.annotate(
+        actual_services=_count(UserService, "user_id", "pk"),
+        actual_service_areas=_count(UserServiceArea, "user_id", "pk"),
+        actual_gallery_photos=_count(TradeWorkPhoto, "user_id", "pk"),
+        actual_licenses=_count(License, "profile__user_id", "pk"),
+    )
+
+
+def reconcile(user_ids=None, batch_size=1000):
+    """
+    Recount and repair counters (creating missing rows).
+    Returns the number of users whose counters were wrong or missing.
+    """
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.order_by("pk")
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    repaired = 0
+    batch = []
+    for user in actual_counts(users).only("pk").iterator(chunk_size=batch_size):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            repaired += _reconcile_batch(batch)
+            batch = []
+    if batch:
+        repaired += _reconcile_batch(batch)
+    return repaired
+
+
+def _reconcile_batch(users):
+    existing = UserCounters.objects.in_bulk([u.pk for u in users])
+    to_create, to_update = [], []
+
+    for user in users:
+        actual = {field: getattr(user, f"actual_{field}") for field in COUNTER_FIELDS}
+        counters = existing.get(user.pk)
+        if counters is None:
+            to_create.append(UserCounters(user_id=user.pk, **actual))
+        elif any(getattr(counters, field) != value for field, value in actual.items()):
+            for field, value in actual.items():
+                setattr(counters, field, value)
+            to_update.append(counters)
+
+    UserCounters.objects.bulk_create(to_create, ignore_conflicts=True)
+    UserCounters.objects.bulk_update(to_update, list(COUNTER_FIELDS))
+    return len(to_create) + len(to_update)
@@ -0,0 +1,253 @@
+"""
+Resized WebP/JPEG derivatives of gallery photos and profile pictures.
+
+Templates show these images as cards and avatars, so after an upload the
+original is re-encoded at a few fixed widths. The copies belong to the row,
+not to the stored original (a media blob may be shared by several rows):
+they go in the field's upload directory under the row's key and the
+source's name (`work_gallery/user_5/tradeworkphoto_42_<source>_w320.webp`),
+and are deleted with the row. Generation is scheduled on
+commit and runs in a small in-process thread pool (Pillow releases the GIL
+while resizing and encoding), off the request path. The result is recorded
+in the model's `*_variants` JSON field:
+
+    {"source": "<original name>", "width": 1600, "height": 1200,
+     "webp": [[160, "<name>"], ...], "jpeg": [[160, "<name>"], ...]}
+
+`source` ties a set to one upload: after the image is replaced the old set
+is ignored until the new one has been written. Sets written next to a
+shared blob (`blobs/...`, the first content-addressed layout) are treated
+as stale and never deleted, since other rows may still serve them. Images
+are never upscaled.
+"""
+import io
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .blobs import base_storage, is_blob_path
+from .fragments import bump_profile_version
+from .media import media_url, url_cache
+from .models import TradeWorkPhoto, UserProfile
+from .search import sync_search_index
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640, 1024)
+
+# variant format: (Pillow format, file extension, save options)
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+Target = namedtuple("Target", "model field variants_field touched_field")
+
+TARGETS = {
+    "gallery": Target(TradeWorkPhoto, "image", "image_variants", "updated_at"),
+    "profile": Target(UserProfile, "user_profile_image", "user_profile_image_variants", "user_updated_at"),
+}
+
+
+def derivative_name(fieldfile, width, fmt):
+    """Name of one derivative of the row holding `fieldfile`."""
+    obj = fieldfile.instance
+    directory = os.path.dirname(fieldfile.field.upload_to(obj, fieldfile.name))
+    source = os.path.splitext(os.path.basename(fieldfile.name))[0][:16]
+    name = f"{obj._meta.model_name}_{obj.pk}_{source}_w{width}.{FORMATS[fmt][1]}"
+    return os.path.join(directory, name)
+
+
+def _variant_names(variants):
+    return [name for fmt in FORMATS for _, name in (variants or {}).get(fmt, ())]
+
+
+def target_widths(width):
+    return [w for w in WIDTHS if w < width] or [width]
+
+
+def current_variants(fieldfile, variants):
+    """`variants` if they were made from the file stored now, else None."""
+    if not fieldfile or not variants or variants.get("source") != fieldfile.name:
+        return None
+    if any(is_blob_path(name) for name in _variant_names(variants)):
+        return None  # shared with other rows: rebuilt per row
+    return variants
+
+
+def needs_variants(kind, fieldfile, variants):
+    if not fieldfile:
+        return False
+    target = TARGETS[kind]
+    # the shared placeholder picture isn't worth a copy per user
+    if fieldfile.name == target.model._meta.get_field(target.field).default:
+        return False
+    return current_variants(fieldfile, variants) is None
+
+
+# ---------- rendering ----------
+
+def _normalized(image):
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def _flatten(image):
+    if image.mode == "RGB":
+        return image
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def render_variants(fieldfile):
+    """Write the derivatives of one image and return its variants dict."""
+    storage = base_storage(fieldfile.storage)  # derivatives belong to the row, not to a blob
+    with storage.open(fieldfile.name, "rb") as fh, Image.open(fh) as original:
+        image = _normalized(original)
+
+    variants = {"source": fieldfile.name, "width": image.width, "height": image.height}
+    variants.update({fmt: [] for fmt in FORMATS})
+
+    try:
+        frame = image
+        # largest first, each step resized from the previous one
+        for width in sorted(target_widths(image.width), reverse=True):
+            if frame.width != width:
+                height = max(round(image.height * width / image.width), 1)
+                frame = frame.resize((width, height), Image.Resampling.LANCZOS)
+
+            for fmt, (pil_format, _, options) in FORMATS.items():
+                buffer = io.BytesIO()
+                (_flatten(frame) if fmt == "jpeg" else frame).save(buffer, pil_format, **options)
+                name = storage.save(derivative_name(fieldfile, width, fmt), ContentFile(buffer.getvalue()))
+                variants[fmt].append([width, name])
+    except Exception:
+        delete_variant_files(storage, variants)
+        raise
+
+    for fmt in FORMATS:
+        variants[fmt].sort()
+    return variants
+
+
+def delete_variant_files(storage, variants):
+    storage = base_storage(storage)
+    for name in _variant_names(variants):
+        if is_blob_path(name):
+            continue  # old shared layout: other rows may still serve it
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning("Could not delete image derivative %s", name, exc_info=True)
+
+
+def generate(kind, pk):
+    """
+    Build and record the derivatives of one row's image if they're missing
+    or stale. Returns the new variants, or None if nothing was done.
+    """
+    target = TARGETS[kind]
+    obj = (
+        target.model.objects
+        .filter(pk=pk)
+        .only("pk", "user_id", target.field, target.variants_field)
+        .first()
+    )
+    if obj is None:
+        return None
+
+    fieldfile = getattr(obj, target.field)
+    old = getattr(obj, target.variants_field)
+    if not needs_variants(kind, fieldfile, old):
+        return None
+
+    variants = render_variants(fieldfile)
+
+    # only if the image is still the one we rendered (no signals: queryset update)
+    updated = target.model.objects.filter(pk=pk, **{target.field: fieldfile.name}).update(
+        **{target.variants_field: variants, target.touched_field: timezone.now()}
+    )
+    if not updated:
+        delete_variant_files(fieldfile.storage, variants)
+        return None
+
+    delete_variant_files(fieldfile.storage, old)
+
+    # cached profile fragments and search results hold the old <img> markup/URLs
+    bump_profile_version(obj.user_id)
+    if kind == "profile":
+        sync_search_index(obj.user_id, touch=True)
+    return variants
+
+
+# ---------- worker pool ----------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+                thread_name_prefix="image-derivatives",
+            )
+        return _executor
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Image derivative job %s%r failed", func.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def _submit(func, *args):
+    # IMAGE_DERIVATIVES_SYNC runs jobs inline (management commands, debugging)
+    if getattr(settings, "IMAGE_DERIVATIVES_SYNC", False):
+        _run(func, *args)
+    else:
+        _get_executor().submit(_run, func, *args)
+
+
+def schedule(kind, pk):
+    _submit(generate, kind, pk)
+
+
+def schedule_cleanup(storage, variants):
+    _submit(delete_variant_files, storage, variants)
+
+
+# ---------- URLs for templates / the API ----------
+
+def srcset(fieldfile, variants, fmt):
+    variants = current_variants(fieldfile, variants)
+    if variants is None:
+        return ""
+    return ", ".join(
+        f"{url_cache.url(fieldfile.storage, name)} {width}w" for width, name in variants[fmt]
+    )
+
+
+def thumbnail_url(fieldfile, variants, min_width, fmt="webp"):
+    """Smallest derivative at least `min_width` wide (or the original)."""
+    variants = current_variants(fieldfile, variants)
+    if variants is None:
+        return media_url(fieldfile)
+    sizes = variants[fmt]
+    _, name = next(((w, n) for w, n in sizes if w >= min_width), sizes[-1])
+    return url_cache.url(fieldfile.storage, name)
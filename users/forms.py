@@ -5,7 +5,7 @@ from .models import *
 import re
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from .utils import get_gallery_max_upload_bytes
-from django.core.exceptions import ValidationError
+from .upload_validation import DocumentUploadField, ImageUploadField
 
 
 
@@ -108,6 +108,7 @@ class UserProfileForm(forms.ModelForm):
             "user_postal_code",
             "user_website",
         ]
+        field_classes = {"user_profile_image": ImageUploadField}
 
         # CLEAN LABELS
         labels = {
@@ -232,6 +233,7 @@ class ProfilePictureForm(forms.ModelForm):
     class Meta:
         model = UserProfile
         fields = ["user_profile_image"]
+        field_classes = {"user_profile_image": ImageUploadField}
         widgets = {
             "user_profile_image": forms.ClearableFileInput(
                 attrs={
@@ -297,6 +299,7 @@ class TradeWorkPhotoForm(forms.ModelForm):
     class Meta:
         model = TradeWorkPhoto
         fields = ["image", "description"]
+        field_classes = {"image": ImageUploadField}
         widgets = {
             "description": forms.Textarea(attrs={
                 "rows": 4,
@@ -304,16 +307,10 @@ class TradeWorkPhotoForm(forms.ModelForm):
             })
         }
 
-    def clean_image(self):
-        img = self.cleaned_data.get("image")
-        if not img:
-            return img
-
-        max_bytes = get_gallery_max_upload_bytes()
-        if img.size > max_bytes:
-            raise ValidationError("Image must be 1MB or less.")
-
-        return img
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # ✅ size, type and pixel limits checked on the stream (users.upload_validation)
+        self.fields["image"].max_bytes = get_gallery_max_upload_bytes()
     
 
 
@@ -332,6 +329,7 @@ class LicenseForm(forms.ModelForm):
             "document",
             "notes",
         ]
+        field_classes = {"document": DocumentUploadField}
         widgets = {
             "license_name": forms.TextInput(attrs={"placeholder": "e.g., Red Seal Electrician"}),
             "issuing_authority": forms.TextInput(attrs={"placeholder": "e.g., Alberta Apprenticeship"}),
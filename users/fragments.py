@@ -0,0 +1,29 @@
+"""
+Per-profile fragment cache versions.
+
+The services, service-area and gallery sections of the public profile page
+are cached with `{% cache %}`, keyed by the profile's version. Signals bump
+it when one of those tables changes for the user; the taxonomy snapshot's
+version is part of the key too, since area names come from ServiceArea.
+"""
+from .cache_versions import bump_version, get_version
+from .media import url_epoch, url_ttl
+from .taxonomy import taxonomy_snapshot
+
+
+def profile_generation(user_id):
+    return f"profile:{user_id}"
+
+
+def bump_profile_version(user_id):
+    bump_version(profile_generation(user_id))
+
+
+def profile_fragment_version(user_id):
+    # url_epoch: the gallery embeds media URLs, rebuilt before signed ones expire
+    return f"{get_version(profile_generation(user_id))}.{taxonomy_snapshot.version}.{url_epoch()}"
+
+
+def profile_fragment_timeout():
+    # gallery fragments embed media URLs, which may be signed and expire
+    return url_ttl()
@@ -0,0 +1,212 @@
+import json
+import random
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from messaging.models import Conversation
+from users.models import PostalCodeCentroid, SearchIndexEntry, UserProfile
+from users.search import bump_all_search_generations
+
+User = get_user_model()
+
+ENDPOINTS = ("api_find_service", "profile_detail", "inbox")
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples):
+    timings = sorted(ms for ms, _, _ in samples)
+    queries = sorted(n for _, n, _ in samples)
+    errors = sum(1 for _, _, status in samples if status >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "latency_ms": {
+            "p50": round(percentile(timings, 50), 2),
+            "p95": round(percentile(timings, 95), 2),
+            "p99": round(percentile(timings, 99), 2),
+            "mean": round(sum(timings) / len(timings), 2),
+            "max": round(timings[-1], 2),
+        },
+        "queries": {
+            "p50": percentile(queries, 50),
+            "p95": percentile(queries, 95),
+            "max": queries[-1],
+            "mean": round(sum(queries) / len(queries), 2),
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive api_find_service, profile_detail and inbox through the test "
+        "client and print p50/p95/p99 latency and query counts per endpoint "
+        "as JSON (compare runs across commits). Generate data first with "
+        "`manage.py generate_marketplace_data`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per endpoint (default: 200).")
+        parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per endpoint (default: 20).")
+        parser.add_argument(
+            "--endpoint", action="append", choices=ENDPOINTS,
+            help="Only benchmark this endpoint (repeatable; default: all).",
+        )
+        parser.add_argument(
+            "--cold", action="store_true",
+            help="Invalidate the search result cache before every find-service request.",
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for request mixes (default: 1).")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.cold = options["cold"]
+        endpoints = options["endpoint"] or list(ENDPOINTS)
+
+        report = {
+            "revision": git_revision(),
+            "started_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "cold_cache": self.cold,
+            "endpoints": {},
+        }
+
+        # the test client talks to "testserver"
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            for name in endpoints:
+                make_request = getattr(self, f"plan_{name}")()
+                for _ in range(options["warmup"]):
+                    make_request()
+                samples = [self.measure(make_request) for _ in range(options["requests"])]
+                report["endpoints"][name] = summarize(samples)
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(output + "\n")
+
+    def measure(self, make_request):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = make_request()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        return elapsed_ms, len(ctx.captured_queries), response.status_code
+
+    # ---------- request mixes ----------
+    # each plan_* returns a zero-argument callable that issues one request
+
+    def plan_api_find_service(self):
+        rng = self.rng
+        url = reverse("users:api_find_service")
+        client = Client()
+
+        combos = list(
+            SearchIndexEntry.objects.values_list("category_id", "subcategory_id", "city").distinct()[:500]
+        )
+        postal_codes = list(PostalCodeCentroid.objects.values_list("fsa", flat=True)[:200])
+        words = ["repair", "install", "emergency", "licensed", "renovation", "plumbing", "electrical"]
+        if not combos:
+            raise CommandError("The search index is empty; run generate_marketplace_data first.")
+
+        def params():
+            category_id, subcategory_id, city = rng.choice(combos)
+            roll = rng.random()
+            if roll < 0.35:
+                return {"category": category_id, "city": city}
+            if roll < 0.6:
+                return {"category": category_id, "subcategory": subcategory_id, "city": city}
+            if roll < 0.75:
+                return {"category": category_id}
+            if roll < 0.9:
+                return {"q": rng.choice(words), "city": city}
+            if postal_codes:
+                return {"postal_code": rng.choice(postal_codes), "radius_km": rng.choice([10, 25, 50])}
+            return {}
+
+        def request():
+            if self.cold:
+                bump_all_search_generations()
+            query = params()
+            response = client.get(url, query)
+            # a share of visitors scroll to the next page
+            if response.status_code == 200 and rng.random() < 0.2:
+                cursor = response.json().get("next_cursor")
+                if cursor:
+                    response = client.get(url, {**query, "cursor": cursor})
+            return response
+
+        return request
+
+    def plan_profile_detail(self):
+        rng = self.rng
+        client = Client()
+        user_ids = list(
+            UserProfile.objects
+            .filter(account_type=UserProfile.TYPE_TRADESPERSON)
+            .order_by("-rank_score")
+            .values_list("user_id", flat=True)[:2000]
+        )
+        if not user_ids:
+            raise CommandError("No tradesperson profiles; run generate_marketplace_data first.")
+
+        # well-ranked profiles get most of the views
+        weights = [1 / (rank ** 0.8) for rank in range(1, len(user_ids) + 1)]
+
+        def request():
+            user_id = rng.choices(user_ids, weights=weights)[0]
+            return client.get(reverse("users:profile_detail", args=[user_id]))
+
+        return request
+
+    def plan_inbox(self):
+        rng = self.rng
+        url = reverse("messaging:inbox")
+
+        # the busiest inboxes first: those are the slow ones
+        user_ids = set()
+        for visitor_id, tradesman_id in (
+            Conversation.objects.order_by("-last_message_at").values_list("visitor_id", "tradesman_id")[:200]
+        ):
+            user_ids.update((visitor_id, tradesman_id))
+        users = list(User.objects.filter(pk__in=user_ids)[:20])
+        if not users:
+            raise CommandError("No conversations; run generate_marketplace_data first.")
+
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        def request():
+            return rng.choice(clients).get(url)
+
+        return request
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.derivatives import TARGETS, generate, needs_variants
+
+
+def _generate(kind, pk):
+    try:
+        return generate(kind, pk) is not None
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Create missing or stale WebP/JPEG derivatives of gallery photos and "
+        "profile pictures (uploads get them automatically; run this once for "
+        "existing images)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind", action="append", choices=sorted(TARGETS),
+            help="Only this kind of image (repeatable; default: all).",
+        )
+        parser.add_argument("--workers", type=int, default=4, help="Images processed in parallel (default: 4).")
+
+    def handle(self, *args, **options):
+        jobs = []
+        for kind in options["kind"] or sorted(TARGETS):
+            target = TARGETS[kind]
+            for obj in target.model.objects.only("pk", target.field, target.variants_field).iterator():
+                if needs_variants(kind, getattr(obj, target.field), getattr(obj, target.variants_field)):
+                    jobs.append((kind, obj.pk))
+
+        self.stdout.write(f"{len(jobs)} image(s) need derivatives")
+
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=max(options["workers"], 1)) as pool:
+            futures = [pool.submit(_generate, kind, pk) for kind, pk in jobs]
+            for future, (kind, pk) in zip(futures, jobs):
+                try:
+                    done += future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{kind} {pk}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Image derivatives generated ({done} images, {failed} failed)"))
@@ -0,0 +1,351 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from messaging.inbox import refresh_last_messages, refresh_unread_counts
+from messaging.models import Conversation, Message
+from services.models import SubCategory
+from users.models import (
+    CallOutFeeSettings,
+    License,
+    PostalCodeCentroid,
+    Province,
+    ServiceArea,
+    TradeWorkPhoto,
+    UserProfile,
+    UserService,
+    UserServiceArea,
+)
+from users.counters import reconcile
+from users.ranking import refresh_all_rank_scores
+from users.search import rebuild_search_index
+
+User = get_user_model()
+
+FIRST_NAMES = [
+    "Liam", "Olivia", "Noah", "Emma", "Ethan", "Ava", "Lucas", "Mia", "Mason", "Chloe",
+    "Logan", "Sophie", "Owen", "Zoe", "Jacob", "Amelia", "Ravi", "Priya", "Wei", "Mei",
+    "Kwame", "Ama", "Mateo", "Lucia", "Omar", "Layla", "Jean", "Camille", "Aiden", "Nora",
+]
+LAST_NAMES = [
+    "Smith", "Brown", "Tremblay", "Martin", "Roy", "Wilson", "MacDonald", "Gagnon", "Lee",
+    "Taylor", "Campbell", "Anderson", "Singh", "Patel", "Chen", "Wong", "Nguyen", "Okafor",
+    "Mensah", "Garcia", "Lopez", "Khan", "Ali", "Dubois", "Leblanc", "Johnson", "White",
+]
+BUSINESS_WORDS = [
+    "Pro", "Reliable", "Northern", "Prairie", "Maple", "True North", "Summit", "Precision",
+    "Trusted", "Express", "Family", "Elite", "Urban", "Coastal", "Rocky Mountain",
+]
+BUSINESS_SUFFIXES = ["Services", "Solutions", "Contracting", "& Sons", "Home Services", "Trades Co."]
+SUMMARY_SENTENCES = [
+    "Licensed and insured with over {years} years of experience.",
+    "Free estimates and upfront pricing on every job.",
+    "We specialize in residential repairs, renovations and emergency calls.",
+    "Serving homeowners and property managers across the region.",
+    "Clean, on-time and fully guaranteed workmanship.",
+    "Evening and weekend appointments available.",
+    "Small jobs welcome — no job too small.",
+]
+MESSAGE_LINES = [
+    "Hi, are you available this week?",
+    "Can you send me a quote for the job?",
+    "Yes, I can come by on Thursday morning.",
+    "What is your call-out fee?",
+    "Thanks, that works for me.",
+    "I've attached a photo of the problem.",
+    "Could you do it before the weekend?",
+    "Sure — see you then.",
+]
+
+TIER_WEIGHTS = [
+    (UserProfile.TIER_FREE, 80),
+    (UserProfile.TIER_PRO, 15),
+    (UserProfile.TIER_PREMIUM, 5),
+]
+
+
+def zipf_weights(n, s=1.1):
+    """Weights for ranks 1..n: a few hot items and a long tail."""
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def weighted_sample(rng, items, weights, k):
+    """k distinct items drawn by weight (k is small, so retrying is cheap)."""
+    k = min(k, len(items))
+    picked = {}
+    while len(picked) < k:
+        item = rng.choices(items, weights=weights)[0]
+        picked[id(item)] = item
+    return list(picked.values())
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate synthetic tradespeople, visitors, services, service "
+        "areas, gallery photos, licenses and conversations with a realistic "
+        "skew (hot cities, popular subcategories), then rebuild the search "
+        "index and rank scores. For local benchmarking only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="Tradespeople to create (default: 1000).")
+        parser.add_argument("--visitors", type=int, default=None, help="Visitors to create (default: users / 2).")
+        parser.add_argument(
+            "--conversations", type=int, default=None, help="Conversations to create (default: users * 2)."
+        )
+        parser.add_argument(
+            "--messages", type=int, default=8, help="Average messages per conversation (default: 8)."
+        )
+        parser.add_argument("--prefix", default="synthetic_", help="Username prefix (default: synthetic_).")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk insert (default: 1000).")
+        parser.add_argument(
+            "--purge", action="store_true", help="Delete users with the prefix (and their data) first."
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.prefix = options["prefix"]
+        n_users = options["users"]
+        n_visitors = options["visitors"] if options["visitors"] is not None else n_users // 2
+        n_conversations = options["conversations"] if options["conversations"] is not None else n_users * 2
+
+        if not self.prefix:
+            raise CommandError("--prefix must not be empty.")
+
+        if options["purge"]:
+            deleted, _ = User.objects.filter(username__startswith=self.prefix).delete()
+            self.stdout.write(f"Purged {deleted} rows.")
+        elif User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f"Users starting with {self.prefix!r} already exist; use --purge or another --prefix.")
+
+        self.load_reference_data()
+
+        started = timezone.now()
+        tradespeople = self.create_users(n_users, UserProfile.TYPE_TRADESPERSON, start=0)
+        visitors = self.create_users(n_visitors, UserProfile.TYPE_VISITOR, start=n_users)
+        self.stdout.write(f"Users: {len(tradespeople)} tradespeople, {len(visitors)} visitors")
+
+        self.create_trade_data(tradespeople)
+        self.create_conversations(tradespeople, visitors, n_conversations, options["messages"])
+
+        indexed = rebuild_search_index(batch_size=self.batch_size)
+        ranked = refresh_all_rank_scores(batch_size=self.batch_size)
+        # bulk_create skips the counter signals
+        reconcile(batch_size=self.batch_size)
+
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Synthetic data generated in {elapsed:.1f}s "
+            f"({indexed} index rows, {ranked} rank scores updated)"
+        ))
+
+    # ---------- reference data ----------
+
+    def load_reference_data(self):
+        self.areas = list(ServiceArea.objects.filter(is_active=True).order_by("id"))
+        self.subcategories = list(SubCategory.objects.order_by("id"))
+        if not self.areas or not self.subcategories:
+            raise CommandError("Seed service areas and services first (migrate + services/seed_services.py).")
+
+        # the popularity order is random but fixed by --seed
+        self.rng.shuffle(self.areas)
+        self.rng.shuffle(self.subcategories)
+        self.area_weights = zipf_weights(len(self.areas))
+        self.subcategory_weights = zipf_weights(len(self.subcategories))
+
+        self.areas_by_metro = {}
+        for area in self.areas:
+            self.areas_by_metro.setdefault(area.metro_city, []).append(area)
+
+        self.centroids_by_province = {}
+        for centroid in PostalCodeCentroid.objects.all():
+            self.centroids_by_province.setdefault(centroid.province, []).append(centroid)
+
+        self.provinces = {p.code: p for p in Province.objects.all()}
+        self.home_areas = {}
+        self.password = make_password("synthetic-password")
+
+    # ---------- users ----------
+
+    def create_users(self, count, account_type, start):
+        rng = self.rng
+        created = []
+
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            users = [
+                User(
+                    username=f"{self.prefix}{start + offset + i}",
+                    email=f"{self.prefix}{start + offset + i}@example.com",
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES),
+                    password=self.password,
+                    is_active=True,
+                )
+                for i in range(size)
+            ]
+
+            with transaction.atomic():
+                # bulk_create skips the post_save signals, so profiles and
+                # call-out settings are created here
+                users = User.objects.bulk_create(users)
+                UserProfile.objects.bulk_create([self.build_profile(u, account_type) for u in users])
+                CallOutFeeSettings.objects.bulk_create([self.build_callout(u, account_type) for u in users])
+
+            created.extend(users)
+        return created
+
+    def build_profile(self, user, account_type):
+        rng = self.rng
+        area = rng.choices(self.areas, weights=self.area_weights)[0]
+        self.home_areas[user.pk] = area
+        centroids = self.centroids_by_province.get(area.province[:2].upper()) or []
+        centroid = rng.choice(centroids) if centroids else None
+
+        is_trade = account_type == UserProfile.TYPE_TRADESPERSON
+        business = f"{rng.choice(BUSINESS_WORDS)} {rng.choice(BUSINESS_SUFFIXES)}" if is_trade else None
+        summary = " ".join(
+            s.format(years=rng.randint(2, 30)) for s in rng.sample(SUMMARY_SENTENCES, rng.randint(1, 4))
+        ) if is_trade else None
+
+        return UserProfile(
+            user=user,
+            account_type=account_type,
+            tier=rng.choices([t for t, _ in TIER_WEIGHTS], weights=[w for _, w in TIER_WEIGHTS])[0]
+            if is_trade else UserProfile.TIER_FREE,
+            user_firstname=user.first_name,
+            user_last_name=user.last_name,
+            user_preferred_name=user.username,
+            user_business_name=business,
+            profile_summary=summary,
+            user_address_line1=f"{rng.randint(1, 9999)} Main Street",
+            user_city=area.city,
+            user_province=area.province[:2].upper(),
+            user_postal_code=f"{centroid.fsa} 1A1" if centroid else "",
+            latitude=centroid.latitude if centroid else None,
+            longitude=centroid.longitude if centroid else None,
+            last_seen_at=timezone.now() - timedelta(days=rng.expovariate(1 / 10)),
+        )
+
+    def build_callout(self, user, account_type):
+        enabled = account_type == UserProfile.TYPE_TRADESPERSON and self.rng.random() < 0.3
+        return CallOutFeeSettings(
+            user=user,
+            enabled=enabled,
+            amount=Decimal(self.rng.choice([49, 79, 99, 129])) if enabled else None,
+        )
+
+    # ---------- services, areas, gallery, licenses ----------
+
+    def create_trade_data(self, tradespeople):
+        rng = self.rng
+        today = timezone.localdate()
+        profiles = dict(
+            UserProfile.objects.filter(user__in=tradespeople).values_list("user_id", "id")
+        )
+        totals = {"services": 0, "areas": 0, "photos": 0, "licenses": 0}
+
+        for offset in range(0, len(tradespeople), self.batch_size):
+            batch = tradespeople[offset:offset + self.batch_size]
+            services, links, photos, licenses = [], [], [], []
+
+            for user in batch:
+                n_services = rng.choices([1, 2, 3, 4, 5], weights=[30, 30, 20, 12, 8])[0]
+                for sub in weighted_sample(rng, self.subcategories, self.subcategory_weights, n_services):
+                    services.append(UserService(user=user, category_id=sub.category_id, subcategory=sub))
+
+                # the profile's area plus, sometimes, neighbours in the same metro
+                home = self.home_areas[user.pk]
+                nearby = [a for a in self.areas_by_metro[home.metro_city] if a.pk != home.pk]
+                for area in [home] + rng.sample(nearby, min(len(nearby), rng.choice([0, 0, 1, 2]))):
+                    links.append(UserServiceArea(user=user, service_area=area))
+
+                n_photos = min(int(rng.expovariate(1 / 3)), 12)
+                photos += [
+                    TradeWorkPhoto(
+                        user=user,
+                        image=f"work_gallery/user_{user.pk}/synthetic_{i}.jpg",
+                        description="Recent job",
+                    )
+                    for i in range(n_photos)
+                ]
+
+                for i in range(rng.choices([0, 1, 2], weights=[50, 35, 15])[0]):
+                    licenses.append(License(
+                        profile_id=profiles[user.pk],
+                        license_name=f"Trade certificate {i + 1}",
+                        license_number=str(rng.randint(100000, 999999)),
+                        province=self.provinces.get(home.province[:2].upper()),
+                        expiry_date=today + timedelta(days=rng.randint(-200, 900)),
+                        is_verified=rng.random() < 0.4,
+                    ))
+
+            with transaction.atomic():
+                UserService.objects.bulk_create(services, ignore_conflicts=True)
+                UserServiceArea.objects.bulk_create(links, ignore_conflicts=True)
+                TradeWorkPhoto.objects.bulk_create(photos)
+                License.objects.bulk_create(licenses)
+
+            totals["services"] += len(services)
+            totals["areas"] += len(links)
+            totals["photos"] += len(photos)
+            totals["licenses"] += len(licenses)
+
+        self.stdout.write(
+            "Trade data: " + ", ".join(f"{count} {name}" for name, count in totals.items())
+        )
+
+    # ---------- messaging ----------
+
+    def create_conversations(self, tradespeople, visitors, count, avg_messages):
+        if not tradespeople or not visitors or count <= 0:
+            return
+
+        rng = self.rng
+        # popular tradespeople get most of the enquiries
+        trade_weights = zipf_weights(len(tradespeople), s=0.8)
+        pairs = set()
+        for _ in range(count * 3):
+            if len(pairs) >= count:
+                break
+            visitor = rng.choice(visitors)
+            tradesman = rng.choices(tradespeople, weights=trade_weights)[0]
+            pairs.add((visitor.pk, tradesman.pk))
+        pairs = list(pairs)
+
+        n_messages = 0
+        for offset in range(0, len(pairs), self.batch_size):
+            batch = pairs[offset:offset + self.batch_size]
+            conversations = [Conversation(visitor_id=v, tradesman_id=t) for v, t in batch]
+
+            with transaction.atomic():
+                Conversation.objects.bulk_create(conversations)
+
+                messages = []
+                for convo in conversations:
+                    length = max(1, int(rng.expovariate(1 / avg_messages)))
+                    unread_tail = rng.choice([0, 0, 1, 2])
+                    for i in range(length):
+                        sender = convo.visitor_id if i % 2 == 0 else convo.tradesman_id
+                        messages.append(Message(
+                            conversation=convo,
+                            sender_id=sender,
+                            content=rng.choice(MESSAGE_LINES),
+                            is_read=i < length - unread_tail,
+                        ))
+                Message.objects.bulk_create(messages, batch_size=self.batch_size)
+                # bulk_create skips the send view's inbox snapshot and unread counters
+                refresh_last_messages([c.pk for c in conversations], batch_size=self.batch_size)
+                refresh_unread_counts([c.pk for c in conversations])
+
+            n_messages += len(messages)
+
+        self.stdout.write(f"Messaging: {len(pairs)} conversations, {n_messages} messages")
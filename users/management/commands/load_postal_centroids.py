@@ -0,0 +1,92 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Avg
+
+from users.models import PostalCodeCentroid, ServiceArea, UserProfile
+from users.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Load FSA centroids from a CSV (columns: fsa, latitude, longitude, "
+        "optional place_name, province), then geocode profiles and service "
+        "areas and rebuild the search index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="Path to the FSA centroid CSV file.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_path"], newline="", encoding="utf-8-sig") as fh:
+                rows = list(csv.DictReader(fh))
+        except OSError as exc:
+            raise CommandError(f"Could not read CSV: {exc}")
+
+        centroids = []
+        for line_no, row in enumerate(rows, start=2):
+            fsa = PostalCodeCentroid.normalize_fsa(row.get("fsa"))
+            try:
+                latitude = float(row["latitude"])
+                longitude = float(row["longitude"])
+            except (KeyError, TypeError, ValueError):
+                raise CommandError(f"Line {line_no}: latitude/longitude missing or invalid.")
+            if len(fsa) != 3:
+                raise CommandError(f"Line {line_no}: invalid FSA {row.get('fsa')!r}.")
+
+            centroids.append(PostalCodeCentroid(
+                fsa=fsa,
+                latitude=latitude,
+                longitude=longitude,
+                place_name=(row.get("place_name") or "").strip(),
+                province=(row.get("province") or "").strip().upper()[:2],
+            ))
+
+        with transaction.atomic():
+            PostalCodeCentroid.objects.bulk_create(
+                centroids,
+                update_conflicts=True,
+                unique_fields=["fsa"],
+                update_fields=["latitude", "longitude", "place_name", "province"],
+            )
+            profiles = self.geocode_profiles()
+            areas = self.geocode_service_areas()
+            written = rebuild_search_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Loaded {len(centroids)} centroids, located {profiles} profiles "
+            f"and {areas} service areas, rebuilt {written} index rows"
+        ))
+
+    def geocode_profiles(self):
+        lookup = {
+            c.fsa: (c.latitude, c.longitude)
+            for c in PostalCodeCentroid.objects.only("fsa", "latitude", "longitude")
+        }
+
+        batch = []
+        for profile in UserProfile.objects.only("id", "user_postal_code").iterator(chunk_size=2000):
+            point = lookup.get(PostalCodeCentroid.normalize_fsa(profile.user_postal_code))
+            if point:
+                profile.latitude, profile.longitude = point
+                batch.append(profile)
+
+        UserProfile.objects.bulk_update(batch, ["latitude", "longitude"], batch_size=2000)
+        return len(batch)
+
+    def geocode_service_areas(self):
+        # average of the FSAs whose place name matches the area's city
+        located = 0
+        for area in ServiceArea.objects.all():
+            point = (
+                PostalCodeCentroid.objects
+                .filter(place_name__iexact=area.city, province__iexact=area.province)
+                .aggregate(latitude=Avg("latitude"), longitude=Avg("longitude"))
+            )
+            if point["latitude"] is None:
+                continue
+            ServiceArea.objects.filter(pk=area.pk).update(**point)
+            located += 1
+        return located
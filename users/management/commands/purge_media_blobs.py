@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from users.blobs import collect, grace_period, recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored media blobs that no row references any more (and that "
+        "weren't stored within the grace period). With --recount, reference "
+        "counts are recomputed from the model fields first. Safe to schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Recompute reference counts before purging.",
+        )
+        parser.add_argument(
+            "--minutes",
+            type=int,
+            default=None,
+            help="Grace period in minutes (default: BLOB_GRACE_PERIOD, 10 minutes).",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            fixed = recount()
+            self.stdout.write(self.style.SUCCESS(f"✅ Blob reference counts recomputed ({fixed} fixed)"))
+
+        minutes = options["minutes"]
+        older_than = timedelta(minutes=minutes) if minutes is not None else grace_period()
+        deleted = collect(older_than=older_than)
+        self.stdout.write(self.style.SUCCESS(f"✅ Unreferenced media blobs purged ({deleted} deleted)"))
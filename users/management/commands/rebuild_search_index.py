@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the tradesperson search index (SearchIndexEntry) from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Profiles processed per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_search_index(batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Search index rebuilt ({written} rows)"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from users.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount services, service areas, gallery photos and licenses per user "
+        "and repair UserCounters rows that drifted (or are missing). Safe to "
+        "schedule, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Users checked per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        repaired = reconcile(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ User counters reconciled ({repaired} repaired)"))
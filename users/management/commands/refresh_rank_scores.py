@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from users.ranking import refresh_all_rank_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute UserProfile.rank_score for every profile (applies the "
+        "last-seen recency decay). Schedule it, e.g. hourly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Profiles written per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        updated = refresh_all_rank_scores(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ Rank scores refreshed ({updated} changed)"))
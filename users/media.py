@@ -0,0 +1,86 @@
+"""
+Cached public URLs for uploaded media.
+
+With S3Boto3Storage every `.url` goes through boto's URL builder (and signs
+the URL when querystring auth is on). Profile cards, galleries and chat
+bubbles render the same files over and over, so URLs are memoized per
+(storage, name) in-process. Entries expire well before a signed URL would.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+MAX_ENTRIES = 5000
+
+
+def url_ttl():
+    """Seconds a URL stays cached: below the S3 signature expiry."""
+    configured = getattr(settings, "MEDIA_URL_CACHE_TIMEOUT", None)
+    if configured is not None:
+        return configured
+
+    expire = getattr(settings, "AWS_QUERYSTRING_EXPIRE", 3600)
+    return max(min(expire // 2, 1800), 1)
+
+
+def url_epoch():
+    """
+    Number of the current url_ttl() window. Responses embedding media URLs
+    put it in their cache keys and validators, so a copy from an earlier
+    window (whose signed URLs may have expired) is never reused or
+    revalidated with a 304.
+    """
+    return int(time.time() // url_ttl())
+
+
+def url_epoch_start(epoch):
+    return epoch * url_ttl()
+
+
+class MediaUrlCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def storage_key(storage):
+        # two storages of the same class can point at different buckets/roots
+        location = getattr(storage, "bucket_name", None) or getattr(storage, "location", "")
+        return f"{type(storage).__module__}.{type(storage).__qualname__}:{location}"
+
+    def url(self, storage, name):
+        key = (self.storage_key(storage), name)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        url = storage.url(name)
+
+        with self._lock:
+            self._entries[key] = (url, now + url_ttl())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return url
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+url_cache = MediaUrlCache()
+
+
+def media_url(fieldfile):
+    """URL of a FieldFile (ImageField/FileField value), or "" if empty."""
+    if not fieldfile:
+        return ""
+    return url_cache.url(fieldfile.storage, fieldfile.name)
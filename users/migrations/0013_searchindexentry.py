@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0001_initial'),
+        ('users', '0012_userprofile_last_seen_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='services.servicecategory')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='users.userprofile')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='services.subcategory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subcategory', 'city', 'profile'], name='users_searc_subcate_0107cf_idx'), models.Index(fields=['category', 'city', 'profile'], name='users_searc_categor_63c512_idx'), models.Index(fields=['city', 'profile'], name='users_searc_city_4641bf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('profile', 'subcategory', 'city'), name='unique_search_entry')],
+            },
+        ),
+    ]
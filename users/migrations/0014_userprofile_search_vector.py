@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_searchindexentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='users_userp_search__af30f0_gin'),
+        ),
+    ]
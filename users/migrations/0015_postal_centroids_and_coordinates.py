@@ -0,0 +1,62 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0001_initial'),
+        ('users', '0014_userprofile_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostalCodeCentroid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fsa', models.CharField(max_length=3, unique=True)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('place_name', models.CharField(blank=True, max_length=100)),
+                ('province', models.CharField(blank=True, max_length=2)),
+            ],
+            options={
+                'ordering': ['fsa'],
+            },
+        ),
+        migrations.AddField(
+            model_name='searchindexentry',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='searchindexentry',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicearea',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicearea',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['latitude', 'longitude'], name='users_searc_latitud_13ed87_idx'),
+        ),
+    ]
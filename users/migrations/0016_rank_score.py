@@ -0,0 +1,52 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0001_initial'),
+        ('users', '0015_postal_centroids_and_coordinates'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='searchindexentry',
+            name='users_searc_subcate_0107cf_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='searchindexentry',
+            name='users_searc_categor_63c512_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='searchindexentry',
+            name='users_searc_city_4641bf_idx',
+        ),
+        migrations.AddField(
+            model_name='searchindexentry',
+            name='rank_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='rank_score',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['subcategory', 'city', '-rank_score', 'profile'], name='users_searc_subcate_b4ffed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['category', 'city', '-rank_score', 'profile'], name='users_searc_categor_8cc1bb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['city', '-rank_score', 'profile'], name='users_searc_city_5821be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['-rank_score', 'profile'], name='users_searc_rank_sc_ad310b_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_rank_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tradeworkphoto',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
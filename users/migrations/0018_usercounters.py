@@ -0,0 +1,58 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    UserCounters = apps.get_model("users", "UserCounters")
+
+    def counts(model, fk):
+        return dict(
+            apps.get_model("users", model).objects.order_by()
+            .values_list(fk).annotate(n=models.Count("*")).values_list(fk, "n")
+        )
+
+    services = counts("UserService", "user_id")
+    areas = counts("UserServiceArea", "user_id")
+    photos = counts("TradeWorkPhoto", "user_id")
+    licenses = counts("License", "profile__user_id")
+
+    UserCounters.objects.bulk_create(
+        [
+            UserCounters(
+                user_id=user_id,
+                services=services.get(user_id, 0),
+                service_areas=areas.get(user_id, 0),
+                gallery_photos=photos.get(user_id, 0),
+                licenses=licenses.get(user_id, 0),
+            )
+            for user_id in User.objects.values_list("pk", flat=True).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0017_tradeworkphoto_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('services', models.IntegerField(default=0)),
+                ('service_areas', models.IntegerField(default=0)),
+                ('gallery_photos', models.IntegerField(default=0)),
+                ('licenses', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
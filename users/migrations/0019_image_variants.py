@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_usercounters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tradeworkphoto',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='user_profile_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
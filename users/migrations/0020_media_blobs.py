@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-17 18:10
+
+import django.utils.timezone
+import users.blobs
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='license',
+            name='document',
+            field=models.FileField(blank=True, null=True, storage=users.blobs.get_blob_storage, upload_to=users.models.license_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='tradeworkphoto',
+            name='image',
+            field=models.ImageField(storage=users.blobs.get_blob_storage, upload_to=users.models.work_photo_upload_path, validators=[users.models.validate_gallery_image_size]),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='user_profile_image',
+            field=models.ImageField(default='no_profile_picture.jpg', storage=users.blobs.get_blob_storage, upload_to=users.models.profile_image_path),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('last_stored_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_stored_at'], name='users_media_ref_cou_487b40_idx')],
+            },
+        ),
+    ]
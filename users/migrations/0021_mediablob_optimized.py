@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='optimized',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,10 +1,13 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from services.models import SubCategory, ServiceCategory
 import uuid
 import os
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from .blobs import get_blob_storage
 from .utils import get_gallery_max_upload_bytes
 from django.utils import timezone
 
@@ -68,8 +71,11 @@ class UserProfile(models.Model):
     user_business_name = models.CharField(max_length=200, blank=True, null=True)
     user_profile_image = models.ImageField(
         default="no_profile_picture.jpg",
-        upload_to=profile_image_path
+        upload_to=profile_image_path,
+        storage=get_blob_storage,
     )
+    # 🖼️ resized WebP/JPEG copies, filled in by users.derivatives
+    user_profile_image_variants = models.JSONField(default=dict, blank=True)
 
     # 📞 Contact phone numbers
     user_primary_phone = models.CharField(max_length=20, blank=True, null=True)
@@ -100,6 +106,10 @@ class UserProfile(models.Model):
     )
     user_postal_code = models.CharField(max_length=10)
 
+    # 📍 Centroid of the postal code's FSA (see PostalCodeCentroid)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
     # 🌐 Website
     user_website = models.URLField(blank=True, null=True)
 
@@ -108,8 +118,29 @@ class UserProfile(models.Model):
     user_updated_at = models.DateTimeField(auto_now=True)
     last_seen_at = models.DateTimeField(null=True, blank=True, default=timezone.now)
 
+    # 🏆 Search ranking (tier, recency, gallery, licenses, call-out fee)
+    # maintained by users.ranking; recency decays via `manage.py refresh_rank_scores`
+    rank_score = models.FloatField(default=0, db_index=True, editable=False)
+
+    # 🔎 Free-text search (business name, service names, summary)
+    # maintained by users.search.update_search_vector
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"]),
+        ]
+
     def __str__(self):
         return f"{self.user_preferred_name or self.user_firstname}"
+
+    def save(self, *args, **kwargs):
+        # 📍 the coordinates follow the postal code (signals.set_profile_coordinates),
+        # so a partial save of the postal code writes them too
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "user_postal_code" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "latitude", "longitude"}
+        super().save(*args, **kwargs)
     
 
 
@@ -152,6 +183,33 @@ class City(models.Model):
     def __str__(self):
         return f"{self.name}, {self.province.code}"
     
+# Forward sortation area (first 3 chars of a postal code) → centroid.
+# Loaded with `manage.py load_postal_centroids <csv>`.
+class PostalCodeCentroid(models.Model):
+    fsa = models.CharField(max_length=3, unique=True)  # T2P, M5V
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    place_name = models.CharField(max_length=100, blank=True)
+    province = models.CharField(max_length=2, blank=True)
+
+    class Meta:
+        ordering = ["fsa"]
+
+    def __str__(self):
+        return f"{self.fsa} ({self.place_name})"
+
+    @staticmethod
+    def normalize_fsa(postal_code):
+        # "t2p 1j9" -> "T2P"
+        return "".join(ch for ch in (postal_code or "") if ch.isalnum())[:3].upper()
+
+    @classmethod
+    def lookup(cls, postal_code):
+        fsa = cls.normalize_fsa(postal_code)
+        if len(fsa) != 3:
+            return None
+        return cls.objects.filter(fsa=fsa).first()
+
 #  user service areas
 # class ServiceArea(models.Model):
 #     COVERAGE_CHOICES = (
@@ -176,6 +234,10 @@ class ServiceArea(models.Model):
     country = models.CharField(max_length=50, default="Canada")
     is_active = models.BooleanField(default=False)
 
+    # filled by `manage.py load_postal_centroids` (or by hand in the admin)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
     class Meta:
         ordering = ["metro_city", "name"]
 
@@ -230,13 +292,19 @@ class TradeWorkPhoto(models.Model):
         on_delete=models.CASCADE,
         related_name="work_photos",
     )
-    image = models.ImageField(upload_to=work_photo_upload_path, validators=[validate_gallery_image_size])
+    image = models.ImageField(
+        upload_to=work_photo_upload_path,
+        storage=get_blob_storage,
+        validators=[validate_gallery_image_size],
+    )
+    image_variants = models.JSONField(default=dict, blank=True)  # see users.derivatives
     description = models.TextField(
         blank=True,
         validators=[validate_100_words],
         help_text="Max 100 words."
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # edits change the profile page's ETag
 
     class Meta:
         ordering = ["-created_at"]
@@ -292,6 +360,7 @@ class License(models.Model):
 
     document = models.FileField(
         upload_to=license_upload_path,
+        storage=get_blob_storage,
         null=True,
         blank=True
     )
@@ -346,3 +415,98 @@ class CallOutFeeSettings(models.Model):
         return f"Call-out fee ({self.user})"
     
 
+
+
+# Flattened read-model for the find-service search.
+# One row per (profile, subcategory, normalized city); maintained by signals in
+# users/search.py and rebuilt with `manage.py rebuild_search_index`.
+class SearchIndexEntry(models.Model):
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="search_entries"
+    )
+    category = models.ForeignKey(ServiceCategory, on_delete=models.CASCADE)
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE)
+
+    # lower-cased, whitespace-collapsed (see users.search.normalize_city)
+    city = models.CharField(max_length=100, blank=True)
+
+    # where this row's city is: the profile location for the home city,
+    # the service area centroid otherwise (used by radius search)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    # copy of UserProfile.rank_score so results can be ordered from the index
+    rank_score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["profile", "subcategory", "city"],
+                name="unique_search_entry",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["subcategory", "city", "-rank_score", "profile"]),
+            models.Index(fields=["category", "city", "-rank_score", "profile"]),
+            models.Index(fields=["city", "-rank_score", "profile"]),
+            models.Index(fields=["-rank_score", "profile"]),
+            models.Index(fields=["latitude", "longitude"]),
+        ]
+
+    def __str__(self):
+        return f"{self.profile_id} - {self.subcategory_id} - {self.city}"
+
+
+# 🔢 Per-user row counts for quota checks and badges.
+# Kept in step by signals with F() updates in the same transaction as the
+# insert/delete; `manage.py reconcile_counters` repairs any drift.
+class UserCounters(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="counters",
+    )
+    services = models.IntegerField(default=0)
+    service_areas = models.IntegerField(default=0)
+    gallery_photos = models.IntegerField(default=0)
+    licenses = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Counters ({self.user_id})"
+
+
+# 🗂️ One stored file per distinct content (see users.blobs).
+# ref_count = model rows pointing at `name`; the file is deleted when it
+# drops to zero (after BLOB_GRACE_PERIOD since it was last stored).
+class MediaBlob(models.Model):
+    digest = models.CharField(max_length=64, unique=True)  # sha256 hex
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    optimized = models.BooleanField(default=False)  # already through users.optimization
+
+    last_stored_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ref_count", "last_stored_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+# 🔁 Version of each process-local snapshot (see users.snapshots); bumped on
+# writes, compared by every worker before reusing its in-memory copy.
+class SnapshotVersion(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
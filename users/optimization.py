@@ -0,0 +1,233 @@
+"""
+Background optimization of uploaded photos.
+
+Gallery photos, profile pictures and chat images are saved as uploaded,
+and after commit a job replaces the stored file with a cleaned-up copy:
+
+* the EXIF orientation is applied to the pixels;
+* EXIF/XMP metadata (camera data, GPS position) is dropped, the ICC
+  colour profile is kept;
+* the longest edge is capped at IMAGE_MAX_EDGE (2560px);
+* the image is re-encoded in its own format (JPEG quality 82, progressive;
+  WebP quality 80; PNG optimized).
+
+The copy is kept only if something had to change or it is smaller. The
+encoding runs in a process pool (IMAGE_OPTIMIZE_WORKERS, spawned workers
+that only import Pillow) so large decodes don't hold the GIL of the web
+process; a small thread pool reads the file, waits for the worker and
+writes the result. Attachment.size_bytes is updated to the new size.
+
+Only files stored as media blobs (users.blobs) are optimized; older
+uuid-named files are left alone. A blob may be shared by several rows, so
+the original is never rewritten: the copy is stored as a blob of its own
+(named after its own digest) and only the row that was read is repointed,
+with update_fields, so the usual signals acquire the copy, release the
+original, refresh derivatives and search results. The other rows keep the
+original until their own job runs, which finds the copy already stored.
+A blob that can't be improved is marked (MediaBlob.optimized) and skipped
+from then on.
+IMAGE_OPTIMIZE_SYNC runs jobs inline, in-process (management commands,
+debugging).
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import ExifTags, Image, ImageOps
+
+from .blobs import blob_storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EDGE = 2560
+
+# Pillow format: (content type, save options)
+ENCODERS = {
+    "JPEG": ("image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+    "WEBP": ("image/webp", {"quality": 80, "method": 4}),
+    "PNG": ("image/png", {"optimize": True}),
+}
+
+Target = namedtuple("Target", "model field touched_field size_field")
+
+TARGETS = {
+    "gallery": Target("users.TradeWorkPhoto", "image", "updated_at", None),
+    "profile": Target("users.UserProfile", "user_profile_image", "user_updated_at", None),
+    "chat": Target("messaging.Attachment", "image", None, "size_bytes"),
+}
+
+Optimized = namedtuple("Optimized", "data content_type width height")
+
+
+def max_edge():
+    return getattr(settings, "IMAGE_MAX_EDGE", DEFAULT_MAX_EDGE)
+
+
+# ---------- encoding (runs in the worker processes: Pillow only) ----------
+
+def optimize_bytes(data, max_edge=DEFAULT_MAX_EDGE):
+    """
+    Re-encode one image. Returns an Optimized, or None when the original is
+    already as good (nothing to rotate, strip or shrink, and not smaller).
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        if original.format not in ENCODERS or getattr(original, "n_frames", 1) > 1:
+            return None  # unsupported or animated: keep as uploaded
+        fmt = original.format
+        icc_profile = original.info.get("icc_profile")
+        exif = original.getexif()
+        orientation = exif.get(ExifTags.Base.Orientation, 1)
+        has_metadata = bool(exif) or "xmp" in original.info or "XML:com.adobe.xmp" in original.info
+
+        image = ImageOps.exif_transpose(original)
+        resized = max(image.size) > max_edge
+        if resized:
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")  # CMYK etc.
+
+    content_type, options = ENCODERS[fmt]
+    if icc_profile:
+        options = {**options, "icc_profile": icc_profile}
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)  # no exif=...: metadata is dropped
+    out = buffer.getvalue()
+
+    if orientation == 1 and not resized and not has_metadata and len(out) >= len(data):
+        return None
+    return Optimized(out, content_type, image.width, image.height)
+
+
+# ---------- jobs ----------
+
+def _blobs():
+    return apps.get_model("users", "MediaBlob")
+
+
+def needs_optimizing(fieldfile):
+    """True for an uploaded blob that hasn't been through optimize() yet."""
+    return bool(fieldfile) and _blobs().objects.filter(name=fieldfile.name, optimized=False).exists()
+
+
+def optimize(kind, pk):
+    """
+    Replace one row's image by its optimized copy. Returns the new name, or
+    None if the file was kept (or the row changed in the meantime).
+    """
+    from .derivatives import TARGETS as DERIVATIVE_TARGETS, schedule as schedule_derivatives
+
+    target = TARGETS[kind]
+    model = apps.get_model(target.model)
+    obj = model.objects.filter(pk=pk).only("pk", target.field).first()
+    if obj is None:
+        return None
+    fieldfile = getattr(obj, target.field)
+    if not needs_optimizing(fieldfile):
+        return None
+
+    name = fieldfile.name
+    with fieldfile.storage.open(name, "rb") as fh:
+        data = fh.read()
+
+    try:
+        result, encoded = _encode(data), True
+    except Exception:
+        logger.warning("Could not optimize %s", name, exc_info=True)
+        result, encoded = None, False
+
+    if result is None:
+        if encoded:  # nothing to gain; a failed file is tried again on its next upload
+            _blobs().objects.filter(name=name).update(optimized=True)
+        if kind in DERIVATIVE_TARGETS:
+            schedule_derivatives(kind, pk)  # were waiting for this job
+        return None
+
+    # a new blob (the copy's digest), never written over the shared original
+    new_name = blob_storage.save(os.path.basename(name), ContentFile(result.data))
+    _blobs().objects.filter(name=new_name).update(optimized=True)
+
+    with transaction.atomic():
+        # only if the row still shows the file we read
+        obj = model.objects.select_for_update().filter(pk=pk, **{target.field: name}).first()
+        if obj is None:
+            return None  # the unused copy is collected by purge_media_blobs
+        setattr(obj, target.field, new_name)
+        if target.size_field:
+            setattr(obj, target.size_field, len(result.data))
+        obj.save(update_fields=[f for f in (target.field, target.touched_field, target.size_field) if f])
+    return new_name
+
+
+# ---------- pools ----------
+
+_process_pool = None
+_executor = None
+_pool_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, "IMAGE_OPTIMIZE_WORKERS", 2)
+
+
+def _get_process_pool():
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # spawn: forking a threaded web worker isn't safe
+            _process_pool = ProcessPoolExecutor(
+                max_workers=_workers(), mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _reset_process_pool(pool):
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False)
+
+
+def _get_executor():
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="image-optimize")
+        return _executor
+
+
+def _encode(data):
+    if getattr(settings, "IMAGE_OPTIMIZE_SYNC", False):
+        return optimize_bytes(data, max_edge())
+    pool = _get_process_pool()
+    try:
+        return pool.submit(optimize_bytes, data, max_edge()).result()
+    except BrokenProcessPool:
+        _reset_process_pool(pool)  # a worker died (e.g. OOM): start fresh next time
+        raise
+
+
+def _run(kind, pk):
+    try:
+        optimize(kind, pk)
+    except Exception:
+        logger.exception("Image optimization of %s %s failed", kind, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(kind, pk):
+    if getattr(settings, "IMAGE_OPTIMIZE_SYNC", False):
+        _run(kind, pk)
+    else:
+        _get_executor().submit(_run, kind, pk)
@@ -0,0 +1,44 @@
+"""
+Random category chips for the home page.
+
+Replaces ORDER BY random() with random.sample over the in-memory category
+list: O(k) per request and no query. Each chip is rendered once per taxonomy
+version, so anonymous home page hits just join k pre-rendered strings.
+"""
+import random
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from services.models import ServiceCategory
+
+from .snapshots import Snapshot
+from .taxonomy import taxonomy_snapshot
+
+QUICK_CATEGORY_COUNT = 6
+CHIP_TEMPLATE = "users/partials/quick_category_chip.html"
+
+
+class QuickCategories:
+    def __init__(self, categories):
+        self.categories = list(categories)
+        self.chips = [render_to_string(CHIP_TEMPLATE, {"cat": cat}) for cat in self.categories]
+
+    def sample_indexes(self, k=QUICK_CATEGORY_COUNT):
+        return random.sample(range(len(self.categories)), min(k, len(self.categories)))
+
+    def sample(self, k=QUICK_CATEGORY_COUNT):
+        return [self.categories[i] for i in self.sample_indexes(k)]
+
+    def sample_html(self, k=QUICK_CATEGORY_COUNT):
+        return mark_safe("".join(self.chips[i] for i in self.sample_indexes(k)))
+
+
+def _build():
+    # straight from the table: the taxonomy snapshot may not have seen the
+    # new version yet, and this one would then keep its stale copy
+    return QuickCategories(ServiceCategory.objects.order_by("name").only("id", "name"))
+
+
+# shares the taxonomy version, so it rebuilds whenever the taxonomy does
+quick_categories = Snapshot(taxonomy_snapshot.name, _build)
@@ -0,0 +1,173 @@
+"""
+Search ranking score.
+
+The score is stored on UserProfile.rank_score (and copied onto the search
+index rows) so results can be ordered from an index. Signals recompute it
+when an input changes; `manage.py refresh_rank_scores` re-applies the
+recency decay for everyone.
+"""
+import math
+
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    CallOutFeeSettings,
+    License,
+    SearchIndexEntry,
+    TradeWorkPhoto,
+    UserProfile,
+)
+from .search import bump_all_search_generations, bump_search_generations
+
+TIER_POINTS = {
+    UserProfile.TIER_FREE: 0,
+    UserProfile.TIER_PRO: 20,
+    UserProfile.TIER_PREMIUM: 35,
+}
+RECENCY_POINTS = 20
+RECENCY_HALF_LIFE_DAYS = 14
+PHOTO_POINTS, MAX_PHOTOS = 1.5, 10
+LICENSE_POINTS, MAX_LICENSES = 5, 3
+CALLOUT_POINTS = 5
+
+
+def compute_rank_score(tier, last_seen_at, photo_count, license_count, has_callout_fee, now=None):
+    now = now or timezone.now()
+
+    score = TIER_POINTS.get(tier, 0)
+
+    if last_seen_at:
+        days = max((now - last_seen_at).total_seconds(), 0) / 86400
+        score += RECENCY_POINTS * math.pow(0.5, days / RECENCY_HALF_LIFE_DAYS)
+
+    score += PHOTO_POINTS * min(photo_count, MAX_PHOTOS)
+    score += LICENSE_POINTS * min(license_count, MAX_LICENSES)
+
+    if has_callout_fee:
+        score += CALLOUT_POINTS
+
+    return round(score, 2)
+
+
+def _verified_licenses():
+    today = timezone.localdate()
+    return License.objects.filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gte=today),
+        is_verified=True,
+        status=License.STATUS_ACTIVE,
+    )
+
+
+def profiles_with_rank_inputs():
+    """UserProfile queryset annotated with everything the score needs."""
+    return UserProfile.objects.annotate(
+        photo_count=Coalesce(
+            Subquery(
+                TradeWorkPhoto.objects
+                .filter(user_id=OuterRef("user_id"))
+                .order_by()
+                .values("user_id")
+                .annotate(n=Count("*"))
+                .values("n")[:1],
+                output_field=IntegerField(),
+            ),
+            0,
+        ),
+        license_count=Coalesce(
+            Subquery(
+                _verified_licenses()
+                .filter(profile_id=OuterRef("pk"))
+                .order_by()
+                .values("profile_id")
+                .annotate(n=Count("*"))
+                .values("n")[:1],
+                output_field=IntegerField(),
+            ),
+            0,
+        ),
+        has_callout_fee=Exists(
+            CallOutFeeSettings.objects.filter(
+                user_id=OuterRef("user_id"),
+                enabled=True,
+                amount__isnull=False,
+            )
+        ),
+    ).only("id", "user_id", "tier", "last_seen_at", "rank_score")
+
+
+def _score(profile, now=None):
+    return compute_rank_score(
+        profile.tier,
+        profile.last_seen_at,
+        profile.photo_count,
+        profile.license_count,
+        profile.has_callout_fee,
+        now=now,
+    )
+
+
+def refresh_rank_score(user_id=None, profile_id=None):
+    """
+    Recompute one profile's score and copy it onto its index rows.
+    Returns True if the score changed.
+    """
+    lookup = {"user_id": user_id} if user_id is not None else {"pk": profile_id}
+    profile = profiles_with_rank_inputs().filter(**lookup).first()
+    if profile is None:
+        return False
+
+    score = _score(profile)
+    if score == profile.rank_score:
+        return False
+
+    UserProfile.objects.filter(pk=profile.pk).update(rank_score=score)
+    _copy_to_index(profile.pk, score)
+    return True
+
+
+def _copy_to_index(profile_id, score):
+    SearchIndexEntry.objects.filter(profile_id=profile_id).update(rank_score=score)
+
+    # the profile moved in every listing it appears in
+    rows = list(SearchIndexEntry.objects.filter(profile_id=profile_id).values_list("subcategory_id", "city"))
+    if rows:
+        bump_search_generations(
+            cities={city for _, city in rows},
+            subcategory_ids={sub_id for sub_id, _ in rows},
+        )
+
+
+def refresh_all_rank_scores(batch_size=1000):
+    """Batch recompute (recency decay). Returns the number of profiles changed."""
+    now = timezone.now()
+    changed = []
+    updated = 0
+
+    for profile in profiles_with_rank_inputs().order_by("id").iterator(chunk_size=batch_size):
+        score = _score(profile, now=now)
+        if score != profile.rank_score:
+            profile.rank_score = score
+            changed.append(profile)
+
+        if len(changed) >= batch_size:
+            updated += _save_batch(changed)
+            changed = []
+
+    if changed:
+        updated += _save_batch(changed)
+
+    if updated:
+        bump_all_search_generations()
+    return updated
+
+
+def _save_batch(profiles):
+    UserProfile.objects.bulk_update(profiles, ["rank_score"])
+    SearchIndexEntry.objects.filter(profile_id__in=[p.pk for p in profiles]).update(
+        rank_score=Subquery(
+            UserProfile.objects.filter(pk=OuterRef("profile_id")).values("rank_score")[:1]
+        )
+    )
+    return len(profiles)
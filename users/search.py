@@ -0,0 +1,586 @@
+"""
+Tradesperson search read-model.
+
+`SearchIndexEntry` flattens UserProfile -> UserService -> UserServiceArea ->
+ServiceArea into one row per (profile, subcategory, city) so the find-service
+API can filter with a single indexed table instead of the join chain.
+"""
+import hashlib
+import math
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, F, FloatField, Min, OuterRef, Q, TextField, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+from .cache_versions import bump_versions, get_versions
+from .media import url_epoch
+from .models import (
+    SearchIndexEntry,
+    ServiceArea,
+    UserProfile,
+    UserService,
+    UserServiceArea,
+)
+
+
+PAGE_SIZE = 60
+COUNT_CAP = 1000  # above this the API reports "1000+" unless exact=1
+CURSOR_SALT = "users.search.cursor"
+RESULTS_CACHE_TIMEOUT = 60 * 10
+ANY = "*"
+SEARCH_CONFIG = "english"
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 200
+EXPORT_CHUNK_SIZE = 500  # rows per server-side cursor fetch
+
+
+def normalize_city(city):
+    # "  calgary   NW " -> "calgary nw" (matches the old iexact behaviour)
+    return " ".join((city or "").split()).lower()
+
+
+def is_searchable(profile):
+    return (profile.account_type or "").lower() == UserProfile.TYPE_TRADESPERSON
+
+
+def normalize_query(text):
+    return " ".join((text or "").split()).lower()
+
+
+def _wanted_rows(profile, services, areas):
+    """
+    Set of (category_id, subcategory_id, city, latitude, longitude) rows a
+    profile should have; `areas` are (city, latitude, longitude) tuples.
+    The home city is always included so profiles without service areas are
+    still listed (and match their own city).
+    """
+    if not is_searchable(profile):
+        return set()
+
+    locations = {}
+    for city, latitude, longitude in areas:
+        locations.setdefault(normalize_city(city), (latitude, longitude))
+
+    home = normalize_city(profile.user_city)
+    if profile.latitude is not None and profile.longitude is not None:
+        locations[home] = (profile.latitude, profile.longitude)
+    else:
+        locations.setdefault(home, (None, None))
+
+    return {
+        (category_id, subcategory_id, city, latitude, longitude)
+        for category_id, subcategory_id in services
+        for city, (latitude, longitude) in locations.items()
+    }
+
+
+def sync_search_index(user_id, touch=False):
+    """
+    Bring the index rows of one user in line with their profile, services and
+    service areas. Only the difference is written.
+
+    Cached result pages for the cities/subcategories whose rows changed are
+    invalidated; with `touch=True` (profile details changed) every city and
+    subcategory the user is listed under is invalidated too.
+    """
+    profile = (
+        UserProfile.objects
+        .filter(user_id=user_id)
+        .only("id", "account_type", "user_city", "latitude", "longitude", "rank_score")
+        .first()
+    )
+    if profile is None:
+        return
+
+    services = UserService.objects.filter(user_id=user_id).values_list("category_id", "subcategory_id")
+    areas = (
+        ServiceArea.objects
+        .filter(userservicearea__user_id=user_id)
+        .values_list("city", "latitude", "longitude")
+    )
+    wanted = _wanted_rows(profile, services, areas)
+
+    current = {
+        row[1:]: row[0]
+        for row in (
+            SearchIndexEntry.objects
+            .filter(profile=profile)
+            .values_list("id", "category_id", "subcategory_id", "city", "latitude", "longitude")
+        )
+    }
+
+    stale = {key: pk for key, pk in current.items() if key not in wanted}
+    if stale:
+        SearchIndexEntry.objects.filter(id__in=stale.values()).delete()
+
+    missing = wanted.difference(current)
+    if missing:
+        SearchIndexEntry.objects.bulk_create(
+            [
+                SearchIndexEntry(
+                    profile=profile,
+                    category_id=category_id,
+                    subcategory_id=subcategory_id,
+                    city=city,
+                    latitude=latitude,
+                    longitude=longitude,
+                    rank_score=profile.rank_score,
+                )
+                for category_id, subcategory_id, city, latitude, longitude in missing
+            ],
+            ignore_conflicts=True,
+        )
+
+    changed = set(stale).union(missing)
+    if touch or {key[1] for key in current} != {key[1] for key in wanted}:
+        update_search_vector(profile.pk)
+    if touch:
+        changed.update(wanted)
+    if changed:
+        bump_search_generations(
+            cities={key[2] for key in changed},
+            subcategory_ids={key[1] for key in changed},
+        )
+
+
+def _search_vector(service_names):
+    """Business name ranks above service names, which rank above the summary."""
+    return (
+        SearchVector("user_business_name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(Value(service_names, output_field=TextField()), weight="B", config=SEARCH_CONFIG)
+        + SearchVector("profile_summary", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def _service_names(pairs):
+    # [("Plumbing", "Leak Repair"), ...] -> "Plumbing Leak Repair ..."
+    return " ".join(sorted({name for pair in pairs for name in pair}))
+
+
+def update_search_vector(profile_id):
+    """Recompute the stored tsvector of one profile in a single UPDATE."""
+    pairs = (
+        UserService.objects
+        .filter(user__profile__id=profile_id)
+        .values_list("category__name", "subcategory__name")
+    )
+    UserProfile.objects.filter(pk=profile_id).update(
+        search_vector=_search_vector(_service_names(pairs))
+    )
+
+
+def rebuild_search_index(batch_size=1000):
+    """
+    Drop and regenerate the whole index. Returns the number of rows written.
+    """
+    SearchIndexEntry.objects.all().delete()
+
+    written = 0
+    profiles = (
+        UserProfile.objects
+        .filter(account_type__iexact=UserProfile.TYPE_TRADESPERSON)
+        .only("id", "user_id", "account_type", "user_city", "latitude", "longitude", "rank_score")
+        .order_by("id")
+    )
+
+    batch = []
+    for profile in profiles.iterator(chunk_size=batch_size):
+        batch.append(profile)
+        if len(batch) >= batch_size:
+            written += _index_batch(batch)
+            batch = []
+    if batch:
+        written += _index_batch(batch)
+
+    bump_all_search_generations()
+    return written
+
+
+def _index_batch(profiles):
+    user_ids = [p.user_id for p in profiles]
+
+    services = defaultdict(list)
+    names = defaultdict(list)
+    for user_id, category_id, subcategory_id, category_name, subcategory_name in (
+        UserService.objects
+        .filter(user_id__in=user_ids)
+        .values_list("user_id", "category_id", "subcategory_id", "category__name", "subcategory__name")
+    ):
+        services[user_id].append((category_id, subcategory_id))
+        names[user_id].append((category_name, subcategory_name))
+
+    areas = defaultdict(list)
+    for user_id, *area in (
+        UserServiceArea.objects
+        .filter(user_id__in=user_ids)
+        .values_list("user_id", "service_area__city", "service_area__latitude", "service_area__longitude")
+    ):
+        areas[user_id].append(area)
+
+    rows = [
+        SearchIndexEntry(
+            profile=profile,
+            category_id=category_id,
+            subcategory_id=subcategory_id,
+            city=city,
+            latitude=latitude,
+            longitude=longitude,
+            rank_score=profile.rank_score,
+        )
+        for profile in profiles
+        for category_id, subcategory_id, city, latitude, longitude in _wanted_rows(
+            profile, services[profile.user_id], areas[profile.user_id]
+        )
+    ]
+    SearchIndexEntry.objects.bulk_create(rows, ignore_conflicts=True)
+
+    for profile in profiles:
+        UserProfile.objects.filter(pk=profile.pk).update(
+            search_vector=_search_vector(_service_names(names[profile.user_id]))
+        )
+
+    return len(rows)
+
+
+def search_entries(category_id=None, subcategory_id=None, city="", q="", near=None):
+    """
+    Index rows matching the find-service filters. `near` is a
+    (latitude, longitude, radius_km) tuple and replaces the city filter with
+    an indexed bounding-box prefilter (see page_profile_ids for the exact cut).
+    """
+    entries = SearchIndexEntry.objects.all()
+
+    if near is not None:
+        entries = entries.filter(**bounding_box(*near))
+        city = ""
+
+    if q:
+        entries = entries.filter(profile__search_vector=text_query(q))
+
+    if category_id:
+        entries = entries.filter(category_id=category_id)
+
+    if subcategory_id:
+        entries = entries.filter(subcategory_id=subcategory_id)
+
+    if city:
+        entries = entries.filter(city=normalize_city(city))
+
+    return entries
+
+
+def export_profiles(category_id, province, subcategory_id=None):
+    """
+    Tradesperson profiles in a category (optionally a subcategory) and
+    province, best ranked first. Meant to be walked with .iterator().
+    """
+    entries = SearchIndexEntry.objects.filter(profile_id=OuterRef("pk"), category_id=category_id)
+    if subcategory_id:
+        entries = entries.filter(subcategory_id=subcategory_id)
+
+    return (
+        UserProfile.objects
+        .filter(Exists(entries), user_province=province)
+        .only(
+            "id", "user_id", "user_firstname", "user_last_name", "user_business_name",
+            "user_city", "user_province", "profile_summary", "user_profile_image",
+            "user_profile_image_variants",
+        )
+        .order_by("-rank_score", "id")
+    )
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Lat/lon range lookups covering a circle (slightly larger, never smaller)."""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    # longitude degrees shrink towards the poles
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lon_delta = min(lat_delta / cos_lat, 180.0)
+    return {
+        "latitude__range": (latitude - lat_delta, latitude + lat_delta),
+        "longitude__range": (longitude - lon_delta, longitude + lon_delta),
+    }
+
+
+def distance_km(latitude, longitude):
+    """
+    Haversine distance from a point to each row's latitude/longitude, as a
+    SQL expression so the database computes it for the whole candidate set.
+    """
+    lat1 = Radians(Value(latitude, output_field=FloatField()))
+    lat2 = Radians(F("latitude"))
+    half_dlat = (lat2 - lat1) / 2
+    half_dlon = (Radians(F("longitude")) - Radians(Value(longitude, output_field=FloatField()))) / 2
+
+    a = Power(Sin(half_dlat), 2) + Cos(lat1) * Cos(lat2) * Power(Sin(half_dlon), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+
+def text_query(q):
+    # websearch syntax: "water heater" -plumbing, etc.
+    return SearchQuery(q, search_type="websearch", config=SEARCH_CONFIG)
+
+
+def encode_cursor(sort_key):
+    """Opaque, tamper-proof token for the sort key of the last row of a page."""
+    return signing.dumps(sort_key, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    """
+    Returns the sort key to continue after ({"id": ...} plus "score", "rank"
+    for text searches or "distance" for radius searches), or None for the
+    first page.
+    Raises ValueError for malformed / tampered cursors.
+    """
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        key = {"id": int(data["id"])}
+        for field in ("rank", "distance", "score"):
+            if field in data:
+                key[field] = float(data[field])
+        return key
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor.")
+
+
+def count_matches(entries, exact=False, near=None):
+    """
+    (count, capped) for the distinct profiles behind `entries`. Unless `exact`,
+    counting stops at COUNT_CAP so the cost stays flat as data grows.
+    """
+    if near is not None:
+        latitude, longitude, radius_km = near
+        profile_ids = (
+            entries
+            .values("profile_id")
+            .annotate(distance=Min(distance_km(latitude, longitude)))
+            .filter(distance__lte=radius_km)
+            .order_by()
+        )
+    else:
+        profile_ids = entries.values("profile_id").distinct().order_by()
+    if exact:
+        return profile_ids.count(), False
+
+    total = profile_ids[:COUNT_CAP + 1].count()
+    return min(total, COUNT_CAP), total > COUNT_CAP
+
+
+def page_profile_ids(entries, after=None, limit=PAGE_SIZE, q="", near=None):
+    """
+    One keyset page of sort keys ({"id": profile_id, ...}) plus the next cursor
+    (None on the last page). Plain filters page by (rank_score desc, id), text
+    searches by (text rank desc, id) and radius searches by (distance, id),
+    where distance is a profile's nearest indexed location.
+    Fetches limit + 1 rows to know whether a next page exists.
+    """
+    if near is not None:
+        latitude, longitude, radius_km = near
+        rows = (
+            entries
+            .values("profile_id")
+            .annotate(distance=Min(distance_km(latitude, longitude)))
+            .filter(distance__lte=radius_km)
+        )
+        if after is not None and "distance" in after:
+            rows = rows.filter(
+                Q(distance__gt=after["distance"]) | Q(distance=after["distance"], profile_id__gt=after["id"])
+            )
+        rows = list(rows.order_by("distance", "profile_id").values_list("profile_id", "distance")[:limit + 1])
+        sort_key = lambda row: {"id": row[0], "distance": row[1]}
+    elif q:
+        rows = (
+            entries
+            # cast: ts_rank is a float4, which would not round-trip through the cursor
+            .annotate(rank=Cast(SearchRank(F("profile__search_vector"), text_query(q)), FloatField()))
+            .values_list("profile_id", "rank")
+            .distinct()
+        )
+        if after is not None and "rank" in after:
+            rows = rows.filter(
+                Q(rank__lt=after["rank"]) | Q(rank=after["rank"], profile_id__gt=after["id"])
+            )
+        rows = list(rows.order_by("-rank", "profile_id")[:limit + 1])
+        sort_key = lambda row: {"id": row[0], "rank": row[1]}
+    else:
+        if after is not None and "score" in after:
+            entries = entries.filter(
+                Q(rank_score__lt=after["score"]) | Q(rank_score=after["score"], profile_id__gt=after["id"])
+            )
+        rows = list(
+            entries
+            .values_list("profile_id", "rank_score")
+            .distinct()
+            .order_by("-rank_score", "profile_id")[:limit + 1]
+        )
+        sort_key = lambda row: {"id": row[0], "score": row[1]}
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_key(rows[-1]))
+
+    return [sort_key(row) for row in rows], next_cursor
+
+
+# ---------- facets ----------
+
+def facet_counts(category_id=None, subcategory_id=None, city="", q="", near=None):
+    """
+    Distinct tradespeople per category, subcategory and city for the current
+    filters, in one GROUPING SETS query. Each facet leaves out its own filter
+    so the other options still show what picking them would return:
+    categories are counted within the city, subcategories within the category
+    and city, cities within the category and subcategory.
+    """
+    if near is not None:
+        city = ""
+
+    # q and the radius apply to every facet, so they go in the WHERE clause
+    rows = search_entries(q=q, near=near)
+    if near is not None:
+        latitude, longitude, radius_km = near
+        rows = rows.annotate(distance=distance_km(latitude, longitude)).filter(distance__lte=radius_km)
+    rows_sql, rows_params = rows.order_by().values(
+        "profile_id", "category_id", "subcategory_id", "city"
+    ).query.sql_with_params()
+
+    def where(**filters):
+        clauses, params = ["TRUE"], []
+        for column, value in filters.items():
+            if value:
+                clauses.append(f"{column} = %s")
+                params.append(value)
+        return " AND ".join(clauses), params
+
+    city = normalize_city(city)
+    by_category = where(city=city)
+    by_subcategory = where(category_id=category_id, city=city)
+    by_city = where(category_id=category_id, subcategory_id=subcategory_id)
+
+    sql = f"""
+        SELECT GROUPING(category_id) = 0, GROUPING(subcategory_id) = 0,
+               category_id, subcategory_id, city,
+               CASE
+                   WHEN GROUPING(category_id) = 0
+                       THEN COUNT(DISTINCT profile_id) FILTER (WHERE {by_category[0]})
+                   WHEN GROUPING(subcategory_id) = 0
+                       THEN COUNT(DISTINCT profile_id) FILTER (WHERE {by_subcategory[0]})
+                   ELSE COUNT(DISTINCT profile_id) FILTER (WHERE {by_city[0]})
+               END
+        FROM ({rows_sql}) AS rows
+        GROUP BY GROUPING SETS ((category_id), (subcategory_id), (city))
+    """
+    params = [*by_category[1], *by_subcategory[1], *by_city[1], *rows_params]
+
+    facets = {"categories": [], "subcategories": [], "cities": []}
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        for is_category, is_subcategory, cat_id, sub_id, row_city, count in cur.fetchall():
+            if not count:
+                continue
+            if is_category:
+                facets["categories"].append({"id": cat_id, "count": count})
+            elif is_subcategory:
+                facets["subcategories"].append({"id": sub_id, "count": count})
+            else:
+                facets["cities"].append({"city": row_city, "count": count})
+
+    for options in facets.values():
+        options.sort(key=lambda option: -option["count"])
+    return facets
+
+
+# ---------- result cache ----------
+# Each city and subcategory has a generation counter (see cache_versions).
+# A cached page embeds the generations of the filters it was built from, so
+# a change only orphans the keys for the cities/subcategories it touched.
+# The ANY counters cover requests without that filter and move on every change;
+# the epoch counter orphans everything after bulk jobs.
+
+def _city_generation(city):
+    return f"search:city:{city}"
+
+
+def _subcategory_generation(subcategory_id):
+    return f"search:sub:{subcategory_id}"
+
+
+EPOCH_GENERATION = "search:epoch"
+
+
+def bump_all_search_generations():
+    bump_versions([EPOCH_GENERATION])
+
+
+def bump_search_generations(cities=(), subcategory_ids=()):
+    names = [_city_generation(ANY), _subcategory_generation(ANY)]
+    names += [_city_generation(city) for city in cities]
+    names += [_subcategory_generation(sub_id) for sub_id in subcategory_ids]
+    bump_versions(names)
+
+
+def _filter_generations(subcategory_id=None, city="", near=None):
+    """
+    Generations a result for these filters depends on. Facets use the same
+    set: with a city filter every facet count stays inside that city, and the
+    city facet stays inside the subcategory (or ANY without one).
+    """
+    # radius searches span many cities, so they hang off the ANY generation
+    city = "" if near is not None else normalize_city(city)
+    names = [
+        _city_generation(city or ANY),
+        _subcategory_generation(subcategory_id or ANY),
+        EPOCH_GENERATION,
+    ]
+    generations = get_versions(names)
+    return [generations[name] for name in names]
+
+
+def _signature(prefix, parts, generations):
+    raw = "|".join(str(part) for part in (*parts, *generations))
+    return prefix + hashlib.md5(raw.encode()).hexdigest()
+
+
+def results_cache_key(category_id=None, subcategory_id=None, city="", q="", near=None,
+                      cursor="", exact=False):
+    city = "" if near is not None else normalize_city(city)
+    return _signature(
+        "find-service:",
+        (
+            category_id or "",
+            subcategory_id or "",
+            city,
+            normalize_query(q),
+            near or "",
+            cursor or "",
+            int(bool(exact)),
+            url_epoch(),  # thumbnails may be signed URLs
+        ),
+        _filter_generations(subcategory_id, city, near),
+    )
+
+
+def facets_cache_key(category_id=None, subcategory_id=None, city="", q="", near=None):
+    city = "" if near is not None else normalize_city(city)
+    return _signature(
+        "find-service-facets:",
+        (category_id or "", subcategory_id or "", city, normalize_query(q), near or ""),
+        _filter_generations(subcategory_id, city, near),
+    )
+
+
+def get_cached_results(key):
+    return cache.get(key)
+
+
+def set_cached_results(key, payload):
+    cache.set(key, payload, RESULTS_CACHE_TIMEOUT)
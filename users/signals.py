@@ -1,7 +1,30 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import CallOutFeeSettings, UserProfile
+from .autocomplete import autocomplete_index
+from .blobs import track_blob_field
+from .counters import adjust as adjust_counters
+from .derivatives import needs_variants, schedule as schedule_derivatives, schedule_cleanup
+from .fragments import bump_profile_version
+from .models import (
+    CallOutFeeSettings,
+    City,
+    License,
+    PostalCodeCentroid,
+    SearchIndexEntry,
+    ServiceArea,
+    TradeWorkPhoto,
+    UserCounters,
+    UserProfile,
+    UserService,
+    UserServiceArea,
+)
+from .optimization import needs_optimizing, schedule as schedule_optimization
+from .ranking import refresh_rank_score
+from .search import bump_search_generations, sync_search_index
+from .taxonomy import taxonomy_snapshot
+from services.models import ServiceCategory, SubCategory
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_migrate
 
@@ -32,6 +55,270 @@ def create_callout_settings(sender, instance, created, **kwargs):
     if created:
         CallOutFeeSettings.objects.get_or_create(user=instance)
 
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+# ############# search index
+# Syncs run on commit so cascaded deletes (e.g. deleting a user) never
+# re-insert rows for a profile that is about to disappear.
+
+# profile fields that end up in the index or in the serialized search results
+SEARCH_PROFILE_FIELDS = {
+    "account_type",
+    "user_city",
+    "user_firstname",
+    "user_last_name",
+    "user_business_name",
+    "user_province",
+    "profile_summary",
+    "user_profile_image",
+    "user_postal_code",
+    "latitude",
+    "longitude",
+}
+
+
+@receiver(pre_save, sender=UserProfile)
+def set_profile_coordinates(sender, instance, **kwargs):
+    # 📍 locate the profile at its FSA centroid (used by radius search)
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "user_postal_code" not in update_fields:
+        return
+
+    centroid = PostalCodeCentroid.lookup(instance.user_postal_code)
+    # an unknown FSA clears the old position, so radius search stops matching it
+    instance.latitude = centroid.latitude if centroid is not None else None
+    instance.longitude = centroid.longitude if centroid is not None else None
+
+
+def _sync_search_on_commit(user_id, touch=False):
+    transaction.on_commit(lambda: sync_search_index(user_id, touch=touch))
+
+
+@receiver(post_save, sender=UserService)
+@receiver(post_delete, sender=UserService)
+@receiver(post_save, sender=UserServiceArea)
+@receiver(post_delete, sender=UserServiceArea)
+def update_search_index_for_user(sender, instance, **kwargs):
+    _sync_search_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def update_search_index_for_profile(sender, instance, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not SEARCH_PROFILE_FIELDS.intersection(update_fields):
+        return  # e.g. last_seen_at pings from the middleware
+    _sync_search_on_commit(instance.user_id, touch=True)
+
+
+@receiver(pre_delete, sender=UserProfile)
+def invalidate_search_for_deleted_profile(sender, instance, **kwargs):
+    # the index rows cascade away with the profile; stale cached pages don't
+    rows = list(
+        SearchIndexEntry.objects
+        .filter(profile_id=instance.pk)
+        .values_list("subcategory_id", "city")
+    )
+    transaction.on_commit(lambda: bump_search_generations(
+        cities={city for _, city in rows},
+        subcategory_ids={sub_id for sub_id, _ in rows},
+    ))
+
+
+@receiver(post_save, sender=ServiceArea)
+@receiver(post_delete, sender=ServiceArea)
+def update_search_index_for_area(sender, instance, **kwargs):
+    # On delete the links are already gone; their own post_delete resyncs them.
+    user_ids = (
+        UserServiceArea.objects
+        .filter(service_area_id=instance.pk)
+        .values_list("user_id", flat=True)
+    )
+    for user_id in user_ids:
+        _sync_search_on_commit(user_id)
+
+
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=ServiceCategory)
+def update_search_vectors_for_taxonomy(sender, instance, created, **kwargs):
+    # service names are part of the text search vector
+    if created:
+        return
+    field = "subcategory" if sender is SubCategory else "category"
+    user_ids = (
+        UserService.objects
+        .filter(**{field: instance})
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    for user_id in user_ids:
+        _sync_search_on_commit(user_id, touch=True)
+
+
+# ############# in-process snapshots (autocomplete index, taxonomy)
+# any change to these tables just bumps the snapshot's generation; each
+# worker rebuilds its copy on its next read
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=ServiceArea)
+@receiver(post_delete, sender=ServiceArea)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+def invalidate_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(autocomplete_index.invalidate)
+
+
+@receiver(post_save, sender=ServiceArea)
+@receiver(post_delete, sender=ServiceArea)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+def invalidate_taxonomy(sender, instance, **kwargs):
+    # staff forms (services.views) and the admin both end up here
+    transaction.on_commit(taxonomy_snapshot.invalidate)
+
+
+# ############# profile page fragments (see users.fragments)
+
+@receiver(post_save, sender=UserService)
+@receiver(post_delete, sender=UserService)
+@receiver(post_save, sender=UserServiceArea)
+@receiver(post_delete, sender=UserServiceArea)
+@receiver(post_save, sender=TradeWorkPhoto)
+@receiver(post_delete, sender=TradeWorkPhoto)
+def bump_profile_fragments(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_profile_version(user_id))
+
+
+@receiver(post_save, sender=License)
+@receiver(post_delete, sender=License)
+def bump_profile_fragments_for_license(sender, instance, **kwargs):
+    user_id = (
+        UserProfile.objects.filter(pk=instance.profile_id).values_list("user_id", flat=True).first()
+    )
+    if user_id is not None:
+        transaction.on_commit(lambda: bump_profile_version(user_id))
+
+
+# ############# per-user counters (see users.counters)
+# Not on_commit: the F() update belongs to the same transaction as the row.
+
+COUNTED_MODELS = {
+    UserService: "services",
+    UserServiceArea: "service_areas",
+    TradeWorkPhoto: "gallery_photos",
+}
+
+
+@receiver(post_save, sender=UserService)
+@receiver(post_save, sender=UserServiceArea)
+@receiver(post_save, sender=TradeWorkPhoto)
+def count_created_rows(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters(instance.user_id, **{COUNTED_MODELS[sender]: 1})
+
+
+@receiver(post_delete, sender=UserService)
+@receiver(post_delete, sender=UserServiceArea)
+@receiver(post_delete, sender=TradeWorkPhoto)
+def count_deleted_rows(sender, instance, **kwargs):
+    adjust_counters(instance.user_id, **{COUNTED_MODELS[sender]: -1})
+
+
+def _license_user_id(license):
+    return UserProfile.objects.filter(pk=license.profile_id).values_list("user_id", flat=True).first()
+
+
+@receiver(post_save, sender=License)
+def count_created_license(sender, instance, created, **kwargs):
+    user_id = _license_user_id(instance) if created else None
+    if user_id is not None:
+        adjust_counters(user_id, licenses=1)
+
+
+@receiver(post_delete, sender=License)
+def count_deleted_license(sender, instance, **kwargs):
+    user_id = _license_user_id(instance)
+    if user_id is not None:
+        adjust_counters(user_id, licenses=-1)
+
+
+# ############# shared media blobs (see users.blobs)
+# Connected before the image jobs below: in autocommit their on_commit hooks
+# run right away, and the reference has to be taken first.
+
+track_blob_field(UserProfile, "user_profile_image")
+track_blob_field(TradeWorkPhoto, "image")
+track_blob_field(License, "document")
+
+
+# ############# image optimization + derivatives (see users.optimization, users.derivatives)
+# A new upload is optimized first; saving the optimized copy (or deciding to
+# keep the original) then schedules the derivatives.
+
+def _schedule_image_jobs(kind, fieldfile, pk):
+    if needs_optimizing(fieldfile):
+        transaction.on_commit(lambda: schedule_optimization(kind, pk))
+    else:
+        transaction.on_commit(lambda: schedule_derivatives(kind, pk))
+
+
+@receiver(post_save, sender=TradeWorkPhoto)
+def schedule_gallery_derivatives(sender, instance, **kwargs):
+    if needs_variants("gallery", instance.image, instance.image_variants):
+        _schedule_image_jobs("gallery", instance.image, instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def schedule_profile_picture_derivatives(sender, instance, **kwargs):
+    if needs_variants("profile", instance.user_profile_image, instance.user_profile_image_variants):
+        _schedule_image_jobs("profile", instance.user_profile_image, instance.pk)
+
+
+@receiver(post_delete, sender=TradeWorkPhoto)
+def delete_gallery_derivatives(sender, instance, **kwargs):
+    storage, variants = instance.image.storage, instance.image_variants
+    if variants:
+        transaction.on_commit(lambda: schedule_cleanup(storage, variants))
+
+
+# ############# ranking score
+# last_seen_at pings are left to `manage.py refresh_rank_scores` (recency decay)
+# so an active user doesn't invalidate cached search pages every minute.
+
+@receiver(post_save, sender=UserProfile)
+def update_rank_for_profile(sender, instance, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "tier" not in update_fields:
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: refresh_rank_score(user_id=user_id))
+
+
+@receiver(post_save, sender=TradeWorkPhoto)
+@receiver(post_delete, sender=TradeWorkPhoto)
+@receiver(post_save, sender=CallOutFeeSettings)
+@receiver(post_delete, sender=CallOutFeeSettings)
+def update_rank_for_user(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: refresh_rank_score(user_id=user_id))
+
+
+@receiver(post_save, sender=License)
+@receiver(post_delete, sender=License)
+def update_rank_for_license(sender, instance, **kwargs):
+    profile_id = instance.profile_id
+    transaction.on_commit(lambda: refresh_rank_score(profile_id=profile_id))
+
+
 # #############user service area
 
 
@@ -0,0 +1,71 @@
+"""
+Process-local snapshots of rarely-changing tables.
+
+A snapshot is built lazily once per worker and kept in memory. Writers bump
+its version through signals; readers compare their copy's version with the
+stored one at most every CHECK_INTERVAL seconds and rebuild when it moved,
+so reads between checks never leave the process.
+
+Versions are rows of SnapshotVersion, not cache entries: every worker sees a
+bump whatever CACHES is (a per-process LocMemCache would hide it from the
+others).
+"""
+import threading
+import time
+
+from django.apps import apps
+from django.db.models import F
+
+CHECK_INTERVAL = 2  # seconds a worker may serve a snapshot without re-checking
+
+
+def _versions():
+    return apps.get_model("users", "SnapshotVersion")
+
+
+def get_snapshot_version(name):
+    return _versions().objects.filter(name=name).values_list("version", flat=True).first() or 0
+
+
+def bump_snapshot_version(name):
+    _versions().objects.get_or_create(name=name)
+    _versions().objects.filter(name=name).update(version=F("version") + 1)
+
+
+class Snapshot:
+    def __init__(self, name, build, check_interval=CHECK_INTERVAL):
+        self.name = name
+        self._build = build
+        self.check_interval = check_interval
+
+        self._state = None  # (value, version)
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        return self._current()[0]
+
+    @property
+    def version(self):
+        """Version of the copy this worker serves (for cache keys and ETags)."""
+        return self._current()[1]
+
+    def _current(self):
+        now = time.monotonic()
+        state = self._state
+        if state is not None and now - self._checked_at < self.check_interval:
+            return state
+
+        with self._lock:
+            version = get_snapshot_version(self.name)
+            if self._state is None or version != self._state[1]:
+                # version is read before building, so a bump that lands
+                # mid-build is still seen as new on the next check
+                self._state = (self._build(), version)
+            self._checked_at = now
+            return self._state
+
+    def invalidate(self):
+        """Make every worker (this one included) rebuild on its next read."""
+        bump_snapshot_version(self.name)
+        self._checked_at = 0.0
@@ -0,0 +1,99 @@
+// users/static/users/js/direct_upload.js
+//
+// Signed direct uploads (see users/uploads.py): ask the server for an upload
+// target, send the file straight to storage, and hand back a token that the
+// form submits instead of the file.
+//
+// Forms opt in with data attributes; without JS (or if the direct upload
+// fails) they still post the file the usual way:
+//
+//   <form method="post" enctype="multipart/form-data"
+//         data-direct-upload="gallery" data-sign-url="{% url 'users:api_upload_sign' %}">
+
+(function () {
+  function csrfToken() {
+    const input = document.querySelector("input[name='csrfmiddlewaretoken']");
+    if (input) return input.value;
+    const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : "";
+  }
+
+  function firstError(data) {
+    const errors = (data && data.errors) || {};
+    for (const msgs of Object.values(errors)) {
+      if (Array.isArray(msgs) && msgs.length) return msgs[0];
+    }
+    return "Upload failed.";
+  }
+
+  // Resolves to the upload token; rejects with an Error whose message can be shown.
+  async function directUpload(file, kind, signUrl, extra = {}) {
+    const signBody = new FormData();
+    signBody.append("kind", kind);
+    signBody.append("content_type", file.type || "");
+    signBody.append("filename", file.name || "upload");
+    signBody.append("size", String(file.size));
+    Object.entries(extra).forEach(([key, value]) => signBody.append(key, value));
+
+    const signRes = await fetch(signUrl, {
+      method: "POST",
+      credentials: "same-origin",
+      headers: { "X-CSRFToken": csrfToken(), "X-Requested-With": "XMLHttpRequest" },
+      body: signBody,
+    });
+    const signed = await signRes.json().catch(() => null);
+    if (!signRes.ok || !signed || !signed.ok) throw new Error(firstError(signed));
+
+    const target = signed.upload;
+    const uploadBody = new FormData();
+    Object.entries(target.fields || {}).forEach(([key, value]) => uploadBody.append(key, value));
+    uploadBody.append(target.file_field || "file", file); // S3 wants the file last
+
+    const sameOrigin = new URL(target.url, window.location.href).origin === window.location.origin;
+    const uploadRes = await fetch(target.url, {
+      method: target.method || "POST",
+      credentials: sameOrigin ? "same-origin" : "omit",
+      headers: sameOrigin ? { "X-CSRFToken": csrfToken() } : {},
+      body: uploadBody,
+    });
+    if (!uploadRes.ok) {
+      const data = await uploadRes.json().catch(() => null);
+      throw new Error(firstError(data));
+    }
+    return signed.token;
+  }
+
+  function enhanceForm(form) {
+    const input = form.querySelector("input[type='file']");
+    if (!input) return;
+
+    form.addEventListener("submit", async (e) => {
+      if (form.dataset.directUploadDone || !input.files || !input.files.length) return;
+      e.preventDefault();
+
+      try {
+        const token = await directUpload(input.files[0], form.dataset.directUpload, form.dataset.signUrl);
+        let hidden = form.querySelector("input[name='upload_token']");
+        if (!hidden) {
+          hidden = document.createElement("input");
+          hidden.type = "hidden";
+          hidden.name = "upload_token";
+          form.appendChild(hidden);
+        }
+        hidden.value = token;
+        input.value = ""; // the bytes are already in storage
+      } catch (_) {
+        // fall back to posting the file through the server
+      }
+
+      form.dataset.directUploadDone = "1";
+      form.submit();
+    });
+  }
+
+  window.directUpload = directUpload;
+
+  document.addEventListener("DOMContentLoaded", () => {
+    document.querySelectorAll("form[data-direct-upload]").forEach(enhanceForm);
+  });
+})();
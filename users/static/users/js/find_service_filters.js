@@ -1,14 +1,20 @@
 class TradesSearch {
-  constructor({ apiUrl, profileBaseUrl }) {
+  constructor({ apiUrl, facetsUrl, profileBaseUrl }) {
     this.apiUrl = apiUrl;
+    this.facetsUrl = facetsUrl;
     this.profileBaseUrl = profileBaseUrl;
 
     this.category = document.getElementById("categorySelect");
     this.subcategory = document.getElementById("subcategorySelect");
     this.city = document.getElementById("citySelect");
+    this.search = document.getElementById("searchInput");
+    this.postal = document.getElementById("postalInput");
+    this.radius = document.getElementById("radiusSelect");
 
     this.meta = document.getElementById("resultsMeta");
     this.grid = document.getElementById("resultsGrid");
+    this.loadMoreBtn = document.getElementById("loadMoreBtn");
+    this.nextCursor = null;
 
     if (!this.category || !this.subcategory || !this.city || !this.meta || !this.grid) {
       console.warn("TradesSearch: missing required DOM elements.");
@@ -37,6 +43,27 @@ class TradesSearch {
 
     this.subcategory.addEventListener("change", () => this.fetchAndRender());
     this.city.addEventListener("change", () => this.fetchAndRender());
+
+    if (this.search) {
+      // debounce typing so we don't hit the API on every keystroke
+      this.search.addEventListener("input", () => {
+        clearTimeout(this._searchTimer);
+        this._searchTimer = setTimeout(() => this.fetchAndRender(), 300);
+      });
+    }
+
+    if (this.postal) {
+      this.postal.addEventListener("change", () => this.fetchAndRender());
+    }
+    if (this.radius) {
+      this.radius.addEventListener("change", () => {
+        if (this.postal && this.postal.value.trim()) this.fetchAndRender();
+      });
+    }
+
+    if (this.loadMoreBtn) {
+      this.loadMoreBtn.addEventListener("click", () => this.fetchAndRender({ append: true }));
+    }
   }
 
   filterSubcategories({ preserveSelection = true } = {}) {
@@ -82,25 +109,45 @@ class TradesSearch {
     if (this.category.value) params.set("category", this.category.value);
     if (this.subcategory.value) params.set("subcategory", this.subcategory.value);
     if (this.city.value) params.set("city", this.city.value);
+    if (this.search && this.search.value.trim()) params.set("q", this.search.value.trim());
+    if (this.postal && this.postal.value.trim()) {
+      params.set("postal_code", this.postal.value.trim());
+      if (this.radius) params.set("radius_km", this.radius.value);
+    }
     return params.toString();
   }
 
-  async fetchAndRender() {
-    const qs = this.buildQuery();
+  async fetchAndRender({ append = false } = {}) {
+    const params = new URLSearchParams(this.buildQuery());
+    if (append && this.nextCursor) params.set("cursor", this.nextCursor);
+    const qs = params.toString();
     const url = qs ? `${this.apiUrl}?${qs}` : this.apiUrl;
 
-    this.meta.textContent = "Searching…";
-    this.grid.innerHTML = "";
+    if (!append) {
+      this.meta.textContent = "Searching…";
+      this.grid.innerHTML = "";
+      this.fetchFacets(this.buildQuery());
+    }
+    this.setNextCursor(null);
 
     try {
       const res = await fetch(url, { method: "GET" });
       if (!res.ok) {
-        this.meta.textContent = "Could not load results.";
+        const err = res.status === 400 ? await res.json().catch(() => null) : null;
+        this.meta.textContent = err && err.errors && err.errors.postal_code
+          ? err.errors.postal_code[0]
+          : "Could not load results.";
         return;
       }
 
       const data = await res.json();
-      this.meta.textContent = `${data.count} tradesperson(s) found`;
+      this.meta.textContent = `${data.count}${data.count_capped ? "+" : ""} tradesperson(s) found`;
+      this.setNextCursor(data.next_cursor);
+
+      if (append) {
+        this.grid.insertAdjacentHTML("beforeend", (data.results || []).map(p => this.cardHtml(p)).join(""));
+        return;
+      }
 
       if (!data.results || !data.results.length) {
         this.grid.innerHTML = `
@@ -118,9 +165,43 @@ class TradesSearch {
     }
   }
 
+  // ✅ "(12)" next to each option; options with no matches are shown as "(0)"
+  async fetchFacets(qs) {
+    if (!this.facetsUrl) return;
+    try {
+      const res = await fetch(qs ? `${this.facetsUrl}?${qs}` : this.facetsUrl, { method: "GET" });
+      if (!res.ok) return;
+      const data = await res.json();
+
+      const byId = list => new Map((list || []).map(f => [String(f.id), f.count]));
+      this.labelOptions(Array.from(this.category.options), byId(data.categories), opt => opt.value);
+      this.labelOptions(this.allSubOptions, byId(data.subcategories), opt => opt.value);
+      this.labelOptions(
+        Array.from(this.city.options),
+        new Map((data.cities || []).map(f => [f.city, f.count])),
+        opt => opt.value.trim().split(/\s+/).join(" ").toLowerCase()
+      );
+    } catch (e) {
+      console.error(e);
+    }
+  }
+
+  labelOptions(options, counts, keyOf) {
+    options.filter(opt => opt.value).forEach(opt => {
+      if (opt.dataset.label === undefined) opt.dataset.label = opt.textContent.trim();
+      opt.textContent = `${opt.dataset.label} (${counts.get(keyOf(opt)) || 0})`;
+    });
+  }
+
+  setNextCursor(cursor) {
+    this.nextCursor = cursor || null;
+    if (this.loadMoreBtn) this.loadMoreBtn.classList.toggle("hidden", !this.nextCursor);
+  }
+
   cardHtml(p) {
-    const img = p.image
-      ? `<img src="${p.image}" class="w-12 h-12 rounded-full object-cover border border-emerald-200" />`
+    const src = p.thumbnail || p.image;
+    const img = src
+      ? `<img src="${src}" loading="lazy" decoding="async" class="w-12 h-12 rounded-full object-cover border border-emerald-200" />`
       : `<div class="w-12 h-12 rounded-full bg-slate-200 flex items-center justify-center text-slate-600 text-xs">No Img</div>`;
 
     const summary = (p.summary || "").trim();
@@ -138,7 +219,7 @@ class TradesSearch {
           <div class="min-w-0">
             <div class="font-extrabold text-slate-800 truncate">${this.escape(p.name || "Tradesperson")}</div>
             <div class="text-sm text-slate-500 truncate">${this.escape(p.business_name || "")}</div>
-            <div class="text-xs text-slate-500 mt-1">${this.escape(p.city || "")}${p.province ? ", " + this.escape(p.province) : ""}</div>
+            <div class="text-xs text-slate-500 mt-1">${this.escape(p.city || "")}${p.province ? ", " + this.escape(p.province) : ""}${p.distance_km != null ? " · " + p.distance_km + " km" : ""}</div>
           </div>
         </div>
         ${summaryLine}
@@ -165,6 +246,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
   new TradesSearch({
     apiUrl: window.TRADES_SEARCH_API_URL,
+    facetsUrl: window.TRADES_FACETS_API_URL,
     profileBaseUrl: window.TRADES_PROFILE_BASE_URL,
   });
 });
@@ -0,0 +1,61 @@
+"""
+Process-local taxonomy snapshot.
+
+Categories, subcategories and active service areas change a few times a year
+but are rendered on most pages. They are loaded once per worker into plain
+read-only records and reloaded when signals bump the snapshot's version
+(staff forms and the admin both go through model saves).
+"""
+from collections import namedtuple
+
+from services.models import ServiceCategory, SubCategory
+
+from .models import ServiceArea
+from .snapshots import Snapshot
+
+Category = namedtuple("Category", "id name subcategories")
+Subcategory = namedtuple("Subcategory", "id name category_id category_name")
+Area = namedtuple("Area", "id name city metro_city province")
+
+
+class Taxonomy:
+    def __init__(self, categories, subcategories, service_areas):
+        subs_by_category = {}
+        for sub in subcategories:
+            subs_by_category.setdefault(sub.category_id, []).append(sub)
+
+        self.categories = [
+            Category(cat_id, name, tuple(subs_by_category.get(cat_id, ())))
+            for cat_id, name in categories
+        ]
+        self.subcategories = list(subcategories)
+        self.service_areas = list(service_areas)
+        self.cities = sorted({area.city for area in self.service_areas})
+
+        self.category_by_id = {cat.id: cat for cat in self.categories}
+        self.subcategory_by_id = {sub.id: sub for sub in self.subcategories}
+        self.area_by_id = {area.id: area for area in self.service_areas}
+
+
+def load_taxonomy():
+    categories = ServiceCategory.objects.order_by("name").values_list("id", "name")
+    subcategories = [
+        Subcategory(*row)
+        for row in SubCategory.objects.order_by("name").values_list(
+            "id", "name", "category_id", "category__name"
+        )
+    ]
+    service_areas = [
+        Area(*row)
+        for row in ServiceArea.objects.filter(is_active=True)
+        .order_by("metro_city", "city", "name")
+        .values_list("id", "name", "city", "metro_city", "province")
+    ]
+    return Taxonomy(list(categories), subcategories, service_areas)
+
+
+taxonomy_snapshot = Snapshot("taxonomy", load_taxonomy)
+
+
+def get_taxonomy():
+    return taxonomy_snapshot.get()
@@ -0,0 +1,45 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from users.derivatives import current_variants, srcset
+from users.media import media_url as _media_url, url_cache
+
+register = template.Library()
+
+
+@register.filter
+def media_url(fieldfile):
+    """{{ profile.user_profile_image|media_url }} — cached URL, "" if empty."""
+    return _media_url(fieldfile)
+
+
+@register.simple_tag
+def responsive_image(fieldfile, variants=None, sizes="100vw", alt="", loading="lazy", **attrs):
+    """
+    {% responsive_image photo.image photo.image_variants sizes="33vw" alt="Work photo" class="..." %}
+
+    A <picture> with WebP and JPEG srcsets once the derivatives exist
+    (users.derivatives), else a plain <img> of the original. Lazy by default;
+    pass loading="eager" for images above the fold.
+    """
+    attrs = {"alt": alt, "loading": loading, "decoding": "async", **attrs}
+    variants = current_variants(fieldfile, variants)
+    if variants is None:
+        return format_html("<img{}>", flatatt({"src": _media_url(fieldfile), **attrs}))
+
+    largest_jpeg = variants["jpeg"][-1][1]
+    img_attrs = {
+        "src": url_cache.url(fieldfile.storage, largest_jpeg),
+        "srcset": srcset(fieldfile, variants, "jpeg"),
+        "sizes": sizes,
+        "width": variants["width"],
+        "height": variants["height"],
+        **attrs,
+    }
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img{}></picture>',
+        srcset(fieldfile, variants, "webp"),
+        sizes,
+        flatatt(img_attrs),
+    )
@@ -1,3 +1,589 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import ExifTags, Image
+
+from services.models import ServiceCategory, SubCategory
+
+from .blobs import acquire, blob_storage, collect, release
+from .counters import get_counters, reconcile
+from .models import (
+    License,
+    MediaBlob,
+    SearchIndexEntry,
+    ServiceArea,
+    TradeWorkPhoto,
+    UserCounters,
+    UserProfile,
+    UserService,
+    UserServiceArea,
+)
+from .optimization import optimize
+from .search import (
+    CURSOR_SALT,
+    bump_all_search_generations,
+    bump_search_generations,
+    decode_cursor,
+    encode_cursor,
+    facet_counts,
+    page_profile_ids,
+    results_cache_key,
+)
+from .snapshots import Snapshot
+from .uploads import (
+    UploadError,
+    adopt_upload,
+    confirm_upload,
+    kind_storage,
+    load_token,
+    sign_upload,
+    verify_upload,
+)
+
+User = get_user_model()
+
+# a cache no two workers share: nothing written to it is seen again
+UNSHARED_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "users-tests"}}
+
+
+def image_bytes(fmt="JPEG", color="blue", exif=None):
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buffer, fmt, **({"exif": exif} if exif else {}))
+    return buffer.getvalue()
+
+
+class TempMediaMixin:
+    """Files go to a throwaway FileSystemStorage; image jobs run inline."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+            IMAGE_OPTIMIZE_SYNC=True,
+            IMAGE_DERIVATIVES_SYNC=True,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+@override_settings(CACHES=UNSHARED_CACHE)
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.rows = ["plumbing"]
+        self.builds = {"a": 0, "b": 0}
+
+    def make_worker(self, label):
+        # one Snapshot instance per simulated worker process
+        def build():
+            self.builds[label] += 1
+            return list(self.rows)
+
+        return Snapshot("test-taxonomy", build, check_interval=0)
+
+    def test_copy_reused_until_invalidated(self):
+        worker = self.make_worker("a")
+        worker.get()
+        worker.get()
+        self.assertEqual(self.builds["a"], 1)
+
+    def test_invalidate_reaches_other_workers(self):
+        worker_a, worker_b = self.make_worker("a"), self.make_worker("b")
+        self.assertEqual(worker_b.get(), ["plumbing"])
+
+        self.rows.append("roofing")
+        worker_a.invalidate()  # staff edit handled by worker A
+
+        self.assertEqual(worker_b.get(), ["plumbing", "roofing"])
+        self.assertEqual(self.builds["b"], 2)
+        self.assertEqual(worker_a.version, worker_b.version)
+
+
+class SearchIndexSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = ServiceCategory.objects.create(name="Test trades")
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name="Test plumbing")
+        cls.user = User.objects.create_user("indexed", "indexed@example.com", "pw12345!")
+        UserProfile.objects.filter(user=cls.user).update(user_city="Calgary")
+        cls.area = ServiceArea.objects.create(name="Airdrie", city="Airdrie", metro_city="Calgary", province="AB")
+
+    def rows(self):
+        return set(
+            SearchIndexEntry.objects
+            .filter(profile__user=self.user)
+            .values_list("subcategory_id", "city")
+        )
+
+    def add_service(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserService.objects.create(user=self.user, category=self.category, subcategory=self.subcategory)
+
+    def test_service_lists_the_profile_in_its_home_city(self):
+        self.add_service()
+        self.assertEqual(self.rows(), {(self.subcategory.id, "calgary")})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserService.objects.filter(user=self.user).delete()
+        self.assertEqual(self.rows(), set())
+
+    def test_service_areas_add_and_remove_cities(self):
+        self.add_service()
+        with self.captureOnCommitCallbacks(execute=True):
+            link = UserServiceArea.objects.create(user=self.user, service_area=self.area)
+        self.assertEqual(self.rows(), {(self.subcategory.id, "calgary"), (self.subcategory.id, "airdrie")})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            link.delete()
+        self.assertEqual(self.rows(), {(self.subcategory.id, "calgary")})
+
+    def test_area_edit_moves_the_rows(self):
+        self.add_service()
+        with self.captureOnCommitCallbacks(execute=True):
+            UserServiceArea.objects.create(user=self.user, service_area=self.area)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.area.city = "Cochrane"
+            self.area.save()
+        self.assertEqual(self.rows(), {(self.subcategory.id, "calgary"), (self.subcategory.id, "cochrane")})
+
+    def test_profile_edits_follow_through(self):
+        self.add_service()
+        profile = UserProfile.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.user_city = "  Red   Deer "
+            profile.save()
+        self.assertEqual(self.rows(), {(self.subcategory.id, "red deer")})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.account_type = UserProfile.TYPE_VISITOR
+            profile.save()
+        self.assertEqual(self.rows(), set())  # visitors are not listed
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        key = {"id": 42, "score": 3.5}
+        self.assertEqual(decode_cursor(encode_cursor(key)), key)
+
+    def test_empty_cursor_is_first_page(self):
+        self.assertIsNone(decode_cursor(""))
+        self.assertIsNone(decode_cursor(None))
+
+    def test_tampered_cursor_rejected(self):
+        token = encode_cursor({"id": 42, "score": 3.5})
+        payload, signature = token.rsplit(":", 1)
+        forged = f"{payload}:{'A' if signature[0] != 'A' else 'B'}{signature[1:]}"
+        with self.assertRaises(ValueError):
+            decode_cursor(forged)
+
+    def test_cursor_signed_for_something_else_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_cursor(signing.dumps({"id": 1}, salt="another.salt"))
+
+    def test_malformed_payload_rejected(self):
+        for payload in ({"score": 1.0}, {"id": "x"}, {"id": 1, "score": "high"}):
+            with self.assertRaises(ValueError):
+                decode_cursor(signing.dumps(payload, salt=CURSOR_SALT))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ServiceCategory.objects.create(name="Test trades")
+        cls.subcategory = SubCategory.objects.create(category=category, name="Test plumbing")
+        # ties on purpose: the id decides their order
+        for i, score in enumerate([5.0, 3.0, 5.0, 1.0, 3.0, 3.0, 0.5]):
+            user = User.objects.create_user(f"keyset_{i}", f"keyset_{i}@example.com", "pw12345!")
+            SearchIndexEntry.objects.create(
+                profile=user.profile, category=category, subcategory=cls.subcategory,
+                city="calgary", rank_score=score,
+            )
+
+    def entries(self):
+        return SearchIndexEntry.objects.filter(subcategory=self.subcategory)
+
+    def walk(self, limit):
+        ids, cursor = [], ""
+        while True:
+            keys, cursor = page_profile_ids(self.entries(), after=decode_cursor(cursor), limit=limit)
+            ids.extend(key["id"] for key in keys)
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_score_then_id(self):
+        expected = list(
+            self.entries().order_by("-rank_score", "profile_id").values_list("profile_id", flat=True)
+        )
+        self.assertEqual(self.walk(limit=3), expected)
+
+    def test_page_size_does_not_change_the_order(self):
+        self.assertEqual(self.walk(limit=2), self.walk(limit=7))
+
+    def test_new_row_above_the_cursor_does_not_shift_later_pages(self):
+        _, cursor = page_profile_ids(self.entries(), limit=3)
+        rest_before = self.walk_from(cursor)
+
+        user = User.objects.create_user("keyset_new", "keyset_new@example.com", "pw12345!")
+        SearchIndexEntry.objects.create(
+            profile=user.profile, category=self.subcategory.category, subcategory=self.subcategory,
+            city="calgary", rank_score=9.0,
+        )
+        self.assertEqual(self.walk_from(cursor), rest_before)
+
+    def walk_from(self, cursor):
+        ids = []
+        while cursor:
+            keys, cursor = page_profile_ids(self.entries(), after=decode_cursor(cursor), limit=3)
+            ids.extend(key["id"] for key in keys)
+        return ids
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ResultsCacheKeyTests(TestCase):
+    def tearDown(self):
+        cache.clear()
+
+    def key(self, city="Calgary", subcategory_id=7):
+        return results_cache_key(category_id=1, subcategory_id=subcategory_id, city=city)
+
+    def test_key_is_stable_between_changes(self):
+        self.assertEqual(self.key(), self.key())
+        self.assertEqual(self.key(city="  calgary "), self.key())
+
+    def test_bump_orphans_only_the_touched_city(self):
+        calgary, edmonton = self.key(), self.key(city="Edmonton")
+        bump_search_generations(cities={"calgary"})
+        self.assertNotEqual(self.key(), calgary)
+        self.assertEqual(self.key(city="Edmonton"), edmonton)
+
+    def test_bump_orphans_only_the_touched_subcategory(self):
+        plumbing, roofing = self.key(), self.key(subcategory_id=8)
+        bump_search_generations(subcategory_ids={8})
+        self.assertEqual(self.key(), plumbing)
+        self.assertNotEqual(self.key(subcategory_id=8), roofing)
+
+    def test_any_filter_moves_on_every_change(self):
+        unfiltered = results_cache_key()
+        bump_search_generations(cities={"calgary"})
+        self.assertNotEqual(results_cache_key(), unfiltered)
+
+    def test_epoch_orphans_everything(self):
+        before = [self.key(), self.key(city="Edmonton"), results_cache_key()]
+        bump_all_search_generations()
+        after = [self.key(), self.key(city="Edmonton"), results_cache_key()]
+        self.assertTrue(all(old != new for old, new in zip(before, after)))
+
+
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trades = ServiceCategory.objects.create(name="Test trades")
+        cls.cleaning = ServiceCategory.objects.create(name="Test cleaning")
+        cls.plumbing = SubCategory.objects.create(category=cls.trades, name="Test plumbing")
+        cls.roofing = SubCategory.objects.create(category=cls.trades, name="Test roofing")
+        cls.windows = SubCategory.objects.create(category=cls.cleaning, name="Test windows")
+        listings = [
+            [(cls.plumbing, "calgary"), (cls.plumbing, "airdrie")],
+            [(cls.plumbing, "calgary"), (cls.roofing, "calgary")],
+            [(cls.roofing, "edmonton")],
+            [(cls.windows, "calgary")],
+        ]
+        for i, rows in enumerate(listings):
+            user = User.objects.create_user(f"facet_{i}", f"facet_{i}@example.com", "pw12345!")
+            for subcategory, city in rows:
+                SearchIndexEntry.objects.create(
+                    profile=user.profile, category=subcategory.category, subcategory=subcategory, city=city,
+                )
+
+    def counts(self, **filters):
+        facets = facet_counts(**filters)
+        return (
+            {option["id"]: option["count"] for option in facets["categories"]},
+            {option["id"]: option["count"] for option in facets["subcategories"]},
+            {option["city"]: option["count"] for option in facets["cities"]},
+        )
+
+    def test_people_are_counted_once_per_option(self):
+        categories, subcategories, cities = self.counts()
+        self.assertEqual(categories, {self.trades.id: 3, self.cleaning.id: 1})
+        self.assertEqual(subcategories, {self.plumbing.id: 2, self.roofing.id: 2, self.windows.id: 1})
+        self.assertEqual(cities, {"calgary": 3, "airdrie": 1, "edmonton": 1})
+
+    def test_each_facet_leaves_out_its_own_filter(self):
+        categories, subcategories, cities = self.counts(category_id=self.trades.id, city="Calgary")
+        self.assertEqual(categories, {self.trades.id: 2, self.cleaning.id: 1})
+        self.assertEqual(subcategories, {self.plumbing.id: 2, self.roofing.id: 1})
+        self.assertEqual(cities, {"calgary": 2, "airdrie": 1, "edmonton": 1})
+
+    def test_cities_follow_the_subcategory(self):
+        _, _, cities = self.counts(subcategory_id=self.roofing.id)
+        self.assertEqual(cities, {"calgary": 1, "edmonton": 1})
+
+    def test_options_sorted_by_count(self):
+        cities = facet_counts()["cities"]
+        self.assertEqual(cities[0], {"city": "calgary", "count": 3})
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = ServiceCategory.objects.create(name="Test trades")
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name="Test plumbing")
+        cls.user = User.objects.create_user("conditional", "conditional@example.com", "pw12345!")
+        UserProfile.objects.filter(user=cls.user).update(user_city="Calgary")
+
+    def tearDown(self):
+        cache.clear()
+
+    def add_service(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserService.objects.create(user=self.user, category=self.category, subcategory=self.subcategory)
+
+    def assert_revalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+
+        change()
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh["ETag"], etag)
+
+    def test_profile_page(self):
+        url = reverse("users:profile_detail", args=[self.user.pk])
+        self.assert_revalidates(url, self.add_service)
+
+    def test_profile_page_sees_deletes(self):
+        self.add_service()
+        url = reverse("users:profile_detail", args=[self.user.pk])
+        self.assert_revalidates(url, lambda: UserService.objects.filter(user=self.user).delete())
+
+    def test_search_results(self):
+        url = reverse("users:api_find_service") + f"?subcategory={self.subcategory.pk}&city=Calgary"
+        self.assert_revalidates(url, self.add_service)
+
+
+class UserCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = ServiceCategory.objects.create(name="Test trades")
+        cls.subcategories = [
+            SubCategory.objects.create(category=cls.category, name=f"Test sub {i}") for i in range(3)
+        ]
+        cls.area = ServiceArea.objects.create(name="Airdrie", city="Airdrie", metro_city="Calgary", province="AB")
+        cls.user = User.objects.create_user("counted", "counted@example.com", "pw12345!")
+
+    def counts(self):
+        counters = get_counters(self.user)
+        return counters.services, counters.service_areas, counters.licenses
+
+    def test_adds_and_deletes_move_the_counters(self):
+        for subcategory in self.subcategories:
+            UserService.objects.create(user=self.user, category=self.category, subcategory=subcategory)
+        link = UserServiceArea.objects.create(user=self.user, service_area=self.area)
+        license = License.objects.create(profile=self.user.profile, license_name="Journeyman")
+        self.assertEqual(self.counts(), (3, 1, 1))
+
+        UserService.objects.filter(user=self.user, subcategory__in=self.subcategories[:2]).delete()
+        link.delete()
+        license.delete()
+        self.assertEqual(self.counts(), (1, 0, 0))
+
+    def test_deleting_the_area_itself_counts_the_cascade(self):
+        UserServiceArea.objects.create(user=self.user, service_area=self.area)
+        self.area.delete()
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+    def test_reconcile_repairs_drift_and_missing_rows(self):
+        UserService.objects.create(user=self.user, category=self.category, subcategory=self.subcategories[0])
+        UserCounters.objects.filter(user=self.user).update(services=9, licenses=4)
+        self.assertEqual(reconcile(user_ids=[self.user.pk]), 1)
+        self.assertEqual(self.counts(), (1, 0, 0))
+
+        UserCounters.objects.filter(user=self.user).delete()
+        self.assertEqual(self.counts(), (1, 0, 0))  # recreated from real counts
+
+
+class BlobReferenceTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("blob_owner", "blob@example.com", "pw12345!")
+
+    def store(self, data, name="photo.png"):
+        return blob_storage.save(name, ContentFile(data))
+
+    def test_same_content_stored_once(self):
+        data = image_bytes("PNG")
+        first, second = self.store(data, "a.png"), self.store(data, "b.png")
+        self.assertEqual(first, second)
+        self.assertEqual(MediaBlob.objects.filter(name=first).count(), 1)
+
+    def test_acquire_and_release_count_references(self):
+        name = self.store(image_bytes("PNG"))
+        acquire(name)
+        acquire(name)
+        release(name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        release(name)
+        release(name)  # never below zero
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+
+    def test_collect_respects_references_and_grace_period(self):
+        name = self.store(image_bytes("PNG"))
+        acquire(name)
+        self.assertEqual(collect(older_than=timedelta(0)), 0)  # still referenced
+
+        release(name)
+        self.assertEqual(collect(name), 0)  # stored within the grace period
+        self.assertTrue(default_storage.exists(name))
+
+        self.assertEqual(collect(name, older_than=timedelta(0)), 1)
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_model_rows_hold_references(self):
+        data = image_bytes("PNG")
+        photos = [
+            TradeWorkPhoto.objects.create(user=self.user, image=ContentFile(data, name=f"p{i}.png"))
+            for i in range(2)
+        ]
+        name = photos[0].image.name
+        self.assertEqual(photos[1].image.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+
+        photos[0].delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+        other = self.store(image_bytes("PNG", color="red"), "other.png")
+        photos[1].image = other
+        photos[1].save()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+        self.assertEqual(MediaBlob.objects.get(name=other).ref_count, 1)
+
+
+class OptimizeTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("optimized", "optimized@example.com", "pw12345!")
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6  # stored sideways
+        data = image_bytes(exif=exif)
+        # jobs are scheduled on commit, which a TestCase never reaches; optimize() runs them here
+        self.photos = [
+            TradeWorkPhoto.objects.create(user=self.user, image=ContentFile(data, name=f"p{i}.jpg"))
+            for i in range(2)
+        ]
+        self.original = self.photos[0].image.name
+
+    def refs(self, name):
+        return MediaBlob.objects.get(name=name).ref_count
+
+    def test_copy_is_rotated_and_stripped(self):
+        name = optimize("gallery", self.photos[0].pk)
+        with default_storage.open(name, "rb") as fh, Image.open(fh) as image:
+            self.assertEqual(image.size, (30, 40))
+            self.assertFalse(image.getexif())
+
+    def test_only_the_optimized_row_is_repointed(self):
+        copy = optimize("gallery", self.photos[0].pk)
+        self.assertNotEqual(copy, self.original)
+        self.assertEqual(TradeWorkPhoto.objects.get(pk=self.photos[0].pk).image.name, copy)
+        self.assertEqual(TradeWorkPhoto.objects.get(pk=self.photos[1].pk).image.name, self.original)
+        self.assertEqual((self.refs(self.original), self.refs(copy)), (1, 1))
+        self.assertTrue(default_storage.exists(self.original))  # the shared original is never rewritten
+
+    def test_second_row_reuses_the_stored_copy(self):
+        copy = optimize("gallery", self.photos[0].pk)
+        self.assertEqual(optimize("gallery", self.photos[1].pk), copy)
+        self.assertEqual((self.refs(self.original), self.refs(copy)), (0, 2))
+
+    def test_optimized_blob_is_not_done_again(self):
+        copy = optimize("gallery", self.photos[0].pk)
+        self.assertIsNone(optimize("gallery", self.photos[0].pk))
+        self.assertEqual(TradeWorkPhoto.objects.get(pk=self.photos[0].pk).image.name, copy)
+
+
+class ConfirmUploadTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("uploader", "uploader@example.com", "pw12345!")
+
+    def upload(self, data, content_type="image/jpeg", user=None):
+        """Sign an upload and put `data` where the browser would."""
+        token, _ = sign_upload(user or self.user, "gallery", content_type, "photo.jpg", size=len(data))
+        name = load_token(token, user or self.user)["n"]
+        kind_storage("gallery").save(name, ContentFile(data))
+        return token, name
+
+    def test_confirm_registers_the_blob(self):
+        token, name = self.upload(image_bytes())
+        confirmed = confirm_upload(self.user, token, "gallery")
+        self.assertEqual(confirmed.name, name)
+        self.assertEqual(confirmed.content_type, "image/jpeg")
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+
+    def test_verify_leaves_the_token_usable(self):
+        # a form that fails validation verifies without adopting; the retry still works
+        token, name = self.upload(image_bytes())
+        verified = verify_upload(self.user, token, "gallery")
+        self.assertEqual(verify_upload(self.user, token, "gallery"), verified)
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+        self.assertEqual(adopt_upload("gallery", verified).name, name)
+        with self.assertRaisesMessage(UploadError, "already used"):
+            verify_upload(self.user, token, "gallery")
+
+    def test_token_cannot_be_used_twice(self):
+        token, _ = self.upload(image_bytes())
+        confirm_upload(self.user, token, "gallery")
+        with self.assertRaisesMessage(UploadError, "already used"):
+            confirm_upload(self.user, token, "gallery")
+
+    def test_same_content_reuses_the_stored_blob(self):
+        data = image_bytes()
+        first = confirm_upload(self.user, self.upload(data)[0], "gallery").name
+        token, name = self.upload(data)
+        self.assertEqual(confirm_upload(self.user, token, "gallery").name, first)
+        self.assertFalse(default_storage.exists(name))  # the duplicate copy is dropped
+
+    def test_content_type_mismatch_rejected_and_deleted(self):
+        token, name = self.upload(image_bytes("PNG"), content_type="image/jpeg")
+        with self.assertRaises(UploadError):
+            confirm_upload(self.user, token, "gallery")
+        self.assertFalse(default_storage.exists(name))
+
+    def test_other_users_token_rejected(self):
+        token, _ = self.upload(image_bytes())
+        stranger = User.objects.create_user("stranger", "stranger@example.com", "pw12345!")
+        with self.assertRaises(UploadError):
+            confirm_upload(stranger, token, "gallery")
+
+    def test_wrong_kind_rejected(self):
+        token, _ = self.upload(image_bytes())
+        with self.assertRaises(UploadError):
+            confirm_upload(self.user, token, "profile_picture")
+
+    def test_missing_object_rejected(self):
+        token, _ = sign_upload(self.user, "gallery", "image/jpeg", "photo.jpg")
+        with self.assertRaisesMessage(UploadError, "not uploaded"):
+            confirm_upload(self.user, token, "gallery")
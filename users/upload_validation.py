@@ -0,0 +1,154 @@
+"""
+Bounded-memory validation of uploaded images and documents.
+
+Django's forms.ImageField copies an in-memory upload into a new buffer and
+runs Pillow over it. Here the file object itself is inspected in place:
+
+1. the byte size is checked (from .size, or by seeking to the end);
+2. the magic bytes decide the real type, whatever the client claimed;
+3. for images, Pillow reads only the header (Image.open is lazy) to get the
+   format and dimensions, and the pixel count is checked before anything is
+   decoded (decompression bombs); verify() then walks the structure without
+   decoding pixels;
+4. the stream is rewound to where it started, so the same object can be
+   saved without being copied.
+
+Used by the chat, gallery, profile-picture and license forms (through
+ImageUploadField / DocumentUploadField) and by users.uploads when a direct
+upload is confirmed.
+"""
+import warnings
+from collections import namedtuple
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from PIL import Image
+
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 50_000_000  # ~8700 x 5800; phone cameras stay below this
+
+IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
+DOCUMENT_TYPES = IMAGE_TYPES | {"application/pdf"}
+
+# content type: Pillow format (None = not an image)
+PIL_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP", "application/pdf": None}
+
+FileInfo = namedtuple("FileInfo", "content_type size width height")
+
+
+def max_image_pixels():
+    return getattr(settings, "UPLOAD_MAX_IMAGE_PIXELS", DEFAULT_MAX_PIXELS)
+
+
+def sniff_content_type(head):
+    """Content type from the first bytes of a file, or None if unsupported."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    return None
+
+
+def _size(fileobj, start):
+    size = getattr(fileobj, "size", None)
+    if size is None:
+        fileobj.seek(0, 2)
+        size = fileobj.tell() - start
+        fileobj.seek(start)
+    return size
+
+
+def _format_bytes(n):
+    return f"{n // (1024 * 1024)}MB" if n % (1024 * 1024) == 0 else f"{n // 1024}KB"
+
+
+def inspect_upload(fileobj, content_types=IMAGE_TYPES, max_bytes=MAX_UPLOAD_BYTES, max_pixels=None):
+    """
+    Validate an open file object and return its FileInfo; raises
+    ValidationError. The stream is left where it was found.
+    """
+    max_pixels = max_pixels or max_image_pixels()
+    start = fileobj.tell()
+    try:
+        size = _size(fileobj, start)
+        if size == 0:
+            raise ValidationError("The file is empty.", code="empty")
+        if max_bytes and size > max_bytes:
+            raise ValidationError(f"The file must be {_format_bytes(max_bytes)} or less.", code="too_large")
+
+        content_type = sniff_content_type(fileobj.read(16))
+        fileobj.seek(start)
+        if content_type not in content_types:
+            raise ValidationError("This file type is not allowed.", code="invalid_type")
+
+        width = height = None
+        if PIL_FORMATS[content_type]:
+            width, height = _inspect_image(fileobj, PIL_FORMATS[content_type], max_pixels)
+
+        return FileInfo(content_type, size, width, height)
+    finally:
+        fileobj.seek(start)
+
+
+def _inspect_image(fileobj, expected_format, max_pixels):
+    try:
+        with warnings.catch_warnings():
+            # Pillow warns between its limit and 2x it, and raises above; both reject
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(fileobj, formats=[expected_format]) as image:  # header only
+                width, height = image.size
+                if width * height > max_pixels:
+                    raise ValidationError("The image has too many pixels.", code="too_many_pixels")
+                image.verify()  # structure/checksums, no pixel decode
+    except ValidationError:
+        raise
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ValidationError("The image has too many pixels.", code="too_many_pixels")
+    except Exception:
+        raise ValidationError("Invalid image file.", code="invalid_image")
+    return width, height
+
+
+class ValidatedFileField(forms.FileField):
+    """
+    FileField running inspect_upload() on new uploads (an existing file,
+    e.g. one attached from a direct upload, is passed through). Sets the
+    upload's content_type to the sniffed one.
+    """
+    content_types = IMAGE_TYPES
+    max_bytes = MAX_UPLOAD_BYTES
+
+    def __init__(self, *, content_types=None, max_bytes=None, max_pixels=None, **kwargs):
+        if content_types is not None:
+            self.content_types = content_types
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        super().__init__(**kwargs)
+
+    def to_python(self, data):
+        f = super().to_python(data)
+        if f is None:
+            return None
+        info = inspect_upload(f, self.content_types, self.max_bytes, self.max_pixels)
+        f.content_type = info.content_type
+        return f
+
+    def widget_attrs(self, widget):
+        attrs = super().widget_attrs(widget)
+        if isinstance(widget, forms.FileInput) and "accept" not in widget.attrs:
+            attrs.setdefault("accept", ",".join(sorted(self.content_types)))
+        return attrs
+
+
+class ImageUploadField(ValidatedFileField):
+    content_types = IMAGE_TYPES
+
+
+class DocumentUploadField(ValidatedFileField):
+    content_types = DOCUMENT_TYPES
@@ -0,0 +1,242 @@
+"""
+Signed direct uploads.
+
+Instead of streaming a file through a web worker, the browser asks for a
+short-lived signed upload target (api_upload_sign), sends the file straight
+to storage, and then submits the usual form with the returned token instead
+of the file. The view verifies the token (verify_upload: signature, owner,
+object present, size and content), validates the rest of the form, and only
+then adopts the object (adopt_upload) and attaches its name to the model.
+Plain multipart posts keep working as a fallback.
+
+Targets come from a backend:
+
+* S3UploadBackend: a presigned S3 POST whose policy pins the key, the
+  content type and the size range (the bucket needs a CORS rule for POST);
+* LocalUploadBackend: our own api_upload_local endpoint, for development
+  and tests with FileSystemStorage.
+
+DIRECT_UPLOAD_BACKEND (dotted path) overrides the choice, which otherwise
+follows the storage. Object names are produced by each model field's own
+upload_to. Once confirmed, the object is registered as a content-addressed
+blob (users.blobs.adopt): if the same bytes are already stored, the new copy
+is dropped and the existing blob is used.
+"""
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .blobs import adopt, base_storage
+from .models import License, MediaBlob, TradeWorkPhoto, UserProfile
+from .upload_validation import DOCUMENT_TYPES, IMAGE_TYPES, MAX_UPLOAD_BYTES, inspect_upload
+from .utils import get_gallery_max_upload_bytes
+
+SALT = "users.uploads"
+DEFAULT_EXPIRE = 60 * 10
+
+
+class UploadError(Exception):
+    """A signing or confirm failure; the message is safe to show to users."""
+
+
+ConfirmedUpload = namedtuple("ConfirmedUpload", "name content_type size")
+
+
+# ---------- upload kinds ----------
+
+def _gallery_instance(user, context):
+    from .counters import get_counters
+    from .utils import get_gallery_photo_limit
+
+    if get_counters(user).gallery_photos >= get_gallery_photo_limit(user):
+        raise UploadError("You’ve reached your gallery limit.")
+    return TradeWorkPhoto(user=user)
+
+
+def _profile_picture_instance(user, context):
+    return user.profile
+
+
+def _license_instance(user, context):
+    return License(profile=user.profile)
+
+
+def _chat_instance(user, context):
+    from messaging.models import Attachment, Conversation, Message
+
+    convo = Conversation.objects.filter(pk=context).first() if context else None
+    if convo is None or not convo.is_participant(user):
+        raise UploadError("Unknown conversation.")
+    return Attachment(message=Message(conversation=convo))
+
+
+UploadKind = namedtuple("UploadKind", "model field max_bytes content_types instance")
+
+KINDS = {
+    "gallery": UploadKind(
+        TradeWorkPhoto, "image", get_gallery_max_upload_bytes, IMAGE_TYPES, _gallery_instance,
+    ),
+    "profile_picture": UploadKind(
+        UserProfile, "user_profile_image", lambda: MAX_UPLOAD_BYTES, IMAGE_TYPES, _profile_picture_instance,
+    ),
+    "license": UploadKind(
+        License, "document", lambda: MAX_UPLOAD_BYTES, DOCUMENT_TYPES, _license_instance,
+    ),
+    "chat": UploadKind(
+        "messaging.Attachment", "image", lambda: MAX_UPLOAD_BYTES, IMAGE_TYPES, _chat_instance,
+    ),
+}
+
+
+def _field(kind):
+    from django.apps import apps
+
+    model = kind.model
+    if isinstance(model, str):
+        model = apps.get_model(model)
+    return model._meta.get_field(kind.field)
+
+
+def kind_storage(kind_name):
+    """Where direct uploads of this kind are written (under the signed name, not a digest)."""
+    return base_storage(_field(KINDS[kind_name]).storage)
+
+
+def upload_expire():
+    return getattr(settings, "DIRECT_UPLOAD_EXPIRE", DEFAULT_EXPIRE)
+
+
+# ---------- backends ----------
+
+class LocalUploadBackend:
+    """The file is POSTed to api_upload_local, which saves it under the signed name."""
+
+    def target(self, storage, name, content_type, max_bytes, token):
+        return {
+            "url": reverse("users:api_upload_local"),
+            "method": "POST",
+            "fields": {"token": token},
+            "file_field": "file",
+        }
+
+
+class S3UploadBackend:
+    """A presigned POST straight to the bucket (django-storages S3Boto3Storage)."""
+
+    def target(self, storage, name, content_type, max_bytes, token):
+        from storages.utils import clean_name
+
+        post = storage.bucket.meta.client.generate_presigned_post(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(name)),
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, max_bytes],
+            ],
+            ExpiresIn=upload_expire(),
+        )
+        return {"url": post["url"], "method": "POST", "fields": post["fields"], "file_field": "file"}
+
+
+def get_backend(storage):
+    path = getattr(settings, "DIRECT_UPLOAD_BACKEND", None)
+    if path:
+        return import_string(path)()
+    if hasattr(storage, "bucket_name"):
+        return S3UploadBackend()
+    return LocalUploadBackend()
+
+
+# ---------- sign / confirm ----------
+
+def sign_upload(user, kind_name, content_type, filename, size=None, context=None):
+    """Returns (token, target) for one upload, or raises UploadError."""
+    kind = KINDS.get(kind_name)
+    if kind is None:
+        raise UploadError("Unknown upload type.")
+    content_type = (content_type or "").lower()
+    if content_type not in kind.content_types:
+        raise UploadError("This file type is not allowed.")
+    max_bytes = kind.max_bytes()
+    if size is not None and size > max_bytes:
+        raise UploadError(f"The file is too large (max {max_bytes // 1024}KB).")
+
+    field = _field(kind)
+    instance = kind.instance(user, context)
+    name = field.generate_filename(instance, os.path.basename(filename or "upload"))
+
+    token = signing.dumps(
+        {"k": kind_name, "u": user.pk, "n": name, "t": content_type, "c": str(context or "")},
+        salt=SALT,
+    )
+    storage = base_storage(field.storage)  # the object goes straight to the real storage
+    return token, get_backend(storage).target(storage, name, content_type, max_bytes, token)
+
+
+def load_token(token, user):
+    try:
+        data = signing.loads(token, salt=SALT, max_age=upload_expire())
+    except signing.SignatureExpired:
+        raise UploadError("The upload expired, please try again.")
+    except signing.BadSignature:
+        raise UploadError("Invalid upload.")
+    if data["u"] != user.pk:
+        raise UploadError("Invalid upload.")
+    return data
+
+
+def verify_upload(user, token, kind_name, context=None):
+    """
+    Check that the signed upload landed in storage and is what was promised,
+    without using the token up. Returns a ConfirmedUpload naming the uploaded
+    object or raises UploadError; a rejected object is deleted. Forms call
+    this first and adopt_upload() once the rest of the form is valid, so a
+    form error doesn't cost the user their upload.
+    """
+    data = load_token(token, user)
+    if data["k"] != kind_name or data["c"] != str(context or ""):
+        raise UploadError("Invalid upload.")
+
+    kind = KINDS[kind_name]
+    field = _field(kind)
+    storage, name = field.storage, data["n"]
+
+    if not storage.exists(name):
+        raise UploadError("The file was not uploaded.")
+    # a token attaches one row; a second confirm would share (and later lose) the file.
+    # Once confirmed, the name is a blob (or was dropped as a duplicate).
+    if MediaBlob.objects.filter(name=name).exists() or field.model._default_manager.filter(**{kind.field: name}).exists():
+        raise UploadError("This upload was already used.")
+
+    try:
+        with storage.open(name, "rb") as fh:
+            info = inspect_upload(fh, kind.content_types, kind.max_bytes())
+        if info.content_type != data["t"]:
+            raise ValidationError("The file doesn't match its file type.")
+    except ValidationError as exc:
+        storage.delete(name)
+        raise UploadError(exc.messages[0])
+
+    return ConfirmedUpload(name, info.content_type, info.size)
+
+
+def adopt_upload(kind_name, upload):
+    """
+    Register a verified upload as a blob (this uses the token up). The
+    returned name is the shared blob's when the same content was stored
+    before.
+    """
+    storage = _field(KINDS[kind_name]).storage
+    return upload._replace(name=adopt(storage, upload.name))
+
+
+def confirm_upload(user, token, kind_name, context=None):
+    """verify_upload() + adopt_upload(): assign .name to the model's file field."""
+    return adopt_upload(kind_name, verify_upload(user, token, kind_name, context))
+
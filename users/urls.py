@@ -35,6 +35,11 @@ urlpatterns = [
 
     path("find-service/", views.find_service, name="find_service"),      # HTML page
     path("api/find-service/", views.api_find_service, name="api_find_service"),  # JSON endpoint
+    path("api/find-service/facets/", views.api_find_service_facets, name="api_find_service_facets"),
+    path("api/find-service/export/", views.api_find_service_export, name="api_find_service_export"),
+    path("api/autocomplete/", views.api_autocomplete, name="api_autocomplete"),
+    path("api/uploads/sign/", views.api_upload_sign, name="api_upload_sign"),
+    path("api/uploads/local/", views.api_upload_local, name="api_upload_local"),
     path("profile/<int:user_id>/", views.profile_detail, name="profile_detail"),
 
     # Gallery urls
@@ -1,17 +1,45 @@
+import json
+
 from django.shortcuts import render, redirect
-from django.http import HttpResponse as hp, JsonResponse
+from django.http import Http404, HttpResponse as hp, JsonResponse, StreamingHttpResponse
 from .forms import *
 from django.contrib import messages
 from django.contrib.auth import logout, get_user_model,authenticate, login
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
-from services.models import SubCategory, ServiceCategory
 from .models import *
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.forms import AuthenticationForm
 from .utils import get_service_area_limit, get_gallery_photo_limit
+from .search import (
+    DEFAULT_RADIUS_KM,
+    EXPORT_CHUNK_SIZE,
+    MAX_RADIUS_KM,
+    PAGE_SIZE,
+    count_matches,
+    decode_cursor,
+    export_profiles,
+    facet_counts,
+    facets_cache_key,
+    get_cached_results,
+    page_profile_ids,
+    results_cache_key,
+    search_entries,
+    set_cached_results,
+    sync_search_index,
+)
+from .autocomplete import autocomplete
+from .counters import adjust as adjust_counters, counters_for_update, get_counters
+from .conditional import not_modified, profile_validators, search_etag, set_validators, with_profile_state
+from .derivatives import thumbnail_url
+from .uploads import KINDS, UploadError, adopt_upload, kind_storage, load_token, sign_upload, verify_upload
+from .fragments import bump_profile_version, profile_fragment_timeout, profile_fragment_version
+from .media import media_url
+from .quick_categories import quick_categories
+from .taxonomy import get_taxonomy
 from django.db import transaction
-from django.db.models import Count, Prefetch, Q
+from django.views.decorators.http import require_POST
+from django.db.models import Count, Prefetch
 from django.templatetags.static import static
 from django.contrib import messages
 from .utils import send_verification_email
@@ -28,14 +56,13 @@ User = get_user_model()
 
 # home page
 def index(request):
-    quick_categories = (
-        ServiceCategory.objects
-        .order_by("?")[:6]   # 👈 random 6 every load
-    )
+    quick = quick_categories.get()
 
-    context = {
-        "quick_categories": quick_categories,
-    }
+    # 👈 random 6 every load, drawn in memory (no ORDER BY random())
+    if request.user.is_authenticated:
+        context = {"quick_categories": quick.sample()}
+    else:
+        context = {"quick_categories_html": quick.sample_html()}
     return render(request, "users/index.html", context)
 
 # about us
@@ -85,13 +112,15 @@ def profile(request):
     )
 
     user_service_areas = ServiceArea.objects.filter(userservicearea__user=user)
+    counters = get_counters(user)
 
     context = {
         "user_obj": user,
         "profile": profile,
         "user_services": user_services,
-        "user_has_services": user_services.exists(),
+        "user_has_services": counters.services > 0,
         "user_service_areas": user_service_areas,
+        "counters": counters,
     }
     return render(request, "users/profile.html", context)
 
@@ -117,7 +146,8 @@ def add_user_services(request):
         .filter(user=user)
     )
 
-    categories = ServiceCategory.objects.prefetch_related("subcategories")
+    taxonomy = get_taxonomy()
+    categories = taxonomy.categories
 
     if request.method == "POST":
         category_id = request.POST.get("category")
@@ -127,27 +157,34 @@ def add_user_services(request):
             messages.error(request, "Please select a category and at least one service.")
             return redirect("users:profile", user.id)
 
-        category = get_object_or_404(ServiceCategory, id=category_id)
-
-        existing_count = user.services.count()
-        remaining_slots = 5 - existing_count
-
-        if remaining_slots <= 0:
-            messages.error(
-                request,
-                "You have already added the maximum of 5 services."
-            )
-            return redirect("users:profile")
+        category = taxonomy.category_by_id.get(int(category_id)) if category_id.isdigit() else None
+        if category is None:
+            raise Http404("No such category.")
 
-        # Only allow adding up to remaining slots
-        services_to_add = selected_services[:remaining_slots]
+        # only subcategories of the chosen category
+        allowed_ids = {sub.id for sub in category.subcategories}
+        selected_services = [x for x in selected_services if x.isdigit() and int(x) in allowed_ids]
 
-        for sub_id in services_to_add:
-            UserService.objects.get_or_create(
-                user=user,
-                category=category,
-                subcategory_id=sub_id
-            )
+        with transaction.atomic():
+            # ✅ locked counters row: concurrent submits can't both pass the quota
+            remaining_slots = 5 - counters_for_update(user).services
+
+            if remaining_slots <= 0:
+                messages.error(
+                    request,
+                    "You have already added the maximum of 5 services."
+                )
+                return redirect("users:profile")
+
+            # Only allow adding up to remaining slots
+            services_to_add = selected_services[:remaining_slots]
+
+            for sub_id in services_to_add:
+                UserService.objects.get_or_create(
+                    user=user,
+                    category_id=category.id,
+                    subcategory_id=sub_id
+                )
 
         if len(selected_services) > remaining_slots:
             messages.warning(
@@ -163,7 +200,7 @@ def add_user_services(request):
         "user_services": user_services,
         "categories": categories,
         "max_services": 5,
-        "current_count": user.services.count(),
+        "current_count": get_counters(user).services,
     }
 
     return render(request, "users/userservices.html", context)
@@ -211,12 +248,26 @@ def edit_profile_picture(request):
     profile = request.user.profile
 
     if request.method == "POST":
+        # ✅ direct upload: the file is already in storage, attach it by name
+        upload = None
+        upload_token = request.POST.get("upload_token")
+        if upload_token:
+            try:
+                upload = verify_upload(request.user, upload_token, "profile_picture")
+            except UploadError as exc:
+                messages.error(request, str(exc))
+                return redirect("users:edit_profile_picture")
+            profile.user_profile_image = upload.name
+
         form = ProfilePictureForm(
             request.POST,
             request.FILES,
             instance=profile
         )
         if form.is_valid():
+            if upload is not None:
+                # ✅ the token is used up only once the form is valid
+                profile.user_profile_image = adopt_upload("profile_picture", upload).name
             form.save()
             return redirect("users:profile" )
         else:
@@ -291,7 +342,7 @@ def edit_service_areas(request):
     service_area_limit = get_service_area_limit(user)
 
     # All possible areas (for checkbox selection)
-    all_areas = ServiceArea.objects.filter(is_active=True).order_by("metro_city", "city", "name")
+    all_areas = get_taxonomy().service_areas
 
     # User's currently selected areas (via reverse relation name in error choices: userservicearea)
     selected_area_objects = ServiceArea.objects.filter(userservicearea__user=user).order_by("metro_city", "city", "name")
@@ -329,6 +380,12 @@ def edit_service_areas(request):
             ]
             UserServiceArea.objects.bulk_create(links)
 
+            # bulk_create skips post_save, so refresh the search index, counter
+            # and cached profile fragments here
+            sync_search_index(user.id)
+            adjust_counters(user.id, service_areas=len(links))
+            transaction.on_commit(lambda: bump_profile_version(user.id))
+
         messages.success(request, "Your service areas have been updated.")
         return redirect("users:edit_service_areas")
 
@@ -358,19 +415,17 @@ def delete_service_area_confirm(request, area_id):
 
 #  serach and find a service
 def find_service(request):
-    categories = ServiceCategory.objects.order_by("name")
-    subcategories = SubCategory.objects.select_related("category").order_by("name")
-
-    cities = (
-        ServiceArea.objects.filter(is_active=True)
-        .values_list("city", flat=True)
-        .distinct()
-        .order_by("city")
-    )
+    taxonomy = get_taxonomy()
+    categories = taxonomy.categories
+    subcategories = taxonomy.subcategories
+    cities = taxonomy.cities
 
     selected_category = request.GET.get("category")
     selected_subcategory = request.GET.get("subcategory")
     selected_city = request.GET.get("city")
+    selected_q = request.GET.get("q")
+    selected_postal_code = request.GET.get("postal_code")
+    selected_radius = request.GET.get("radius_km") or str(DEFAULT_RADIUS_KM)
 
     context = {
         "categories": categories,
@@ -379,54 +434,218 @@ def find_service(request):
         "selected_category": selected_category,
         "selected_subcategory": selected_subcategory,
         "selected_city": selected_city,
+        "selected_q": selected_q,
+        "selected_postal_code": selected_postal_code,
+        "selected_radius": selected_radius,
+        "radius_choices": [10, 25, 50, 100, MAX_RADIUS_KM],
     }
     return render(request, "users/find_service.html", context)
 
 
+def _find_service_filters(request):
+    """
+    (filters, errors) from the find-service query string. `filters` are
+    search_entries() kwargs; `errors` is set instead for an unknown postal code.
+    """
+    category_id = (request.GET.get("category") or "").strip()
+    subcategory_id = (request.GET.get("subcategory") or "").strip()
+    postal_code = (request.GET.get("postal_code") or "").strip()
+
+    # 📍 radius mode: "within N km of postal code X" replaces the city filter
+    near = None
+    if postal_code:
+        centroid = PostalCodeCentroid.lookup(postal_code)
+        if centroid is None:
+            return None, {"postal_code": ["Unknown postal code."]}
+
+        radius = (request.GET.get("radius_km") or "").strip()
+        radius_km = int(radius) if radius.isdigit() else DEFAULT_RADIUS_KM
+        radius_km = min(max(radius_km, 1), MAX_RADIUS_KM)
+        near = (centroid.latitude, centroid.longitude, radius_km)
+
+    filters = {
+        "category_id": int(category_id) if category_id.isdigit() else None,
+        "subcategory_id": int(subcategory_id) if subcategory_id.isdigit() else None,
+        "city": (request.GET.get("city") or "").strip(),
+        "q": (request.GET.get("q") or "").strip(),
+        "near": near,
+    }
+    return filters, None
+
+
+def _search_result(p):
+    """One tradesperson as serialized by the find-service API and the export."""
+    return {
+        "profile_id": p.user_id,
+        "name": f"{p.user_firstname} {p.user_last_name}".strip(),
+        "business_name": p.user_business_name or "",
+        "city": p.user_city or "",
+        "province": str(getattr(p, "user_province", "") or ""),
+        "summary": getattr(p, "profile_summary", "") or "",
+        "image": media_url(p.user_profile_image),
+        # ✅ small WebP for the result cards (the original until it exists)
+        "thumbnail": thumbnail_url(p.user_profile_image, p.user_profile_image_variants, min_width=96),
+    }
+
+
 #  API view
 def api_find_service(request):
+    exact_count = request.GET.get("exact") == "1"
+    cursor = request.GET.get("cursor") or ""
+
+    try:
+        after = decode_cursor(cursor)
+    except ValueError as exc:
+        return JsonResponse({"ok": False, "errors": {"cursor": [str(exc)]}}, status=400)
+
+    filters, errors = _find_service_filters(request)
+    if errors:
+        return JsonResponse({"ok": False, "errors": errors}, status=400)
+    q, near = filters["q"], filters["near"]
+
+    # ✅ cached per filter tuple; signals bump the city/subcategory generations
+    cache_key = results_cache_key(cursor=cursor, exact=exact_count, **filters)
+
+    # ✅ the cache key changes with the filters and the index generations,
+    # so it doubles as the ETag: unchanged results answer 304
+    etag = search_etag(cache_key)
+    response = not_modified(request, etag)
+    if response is not None:
+        return set_validators(response, etag)
+
+    payload = get_cached_results(cache_key)
+    if payload is not None:
+        return set_validators(JsonResponse(payload), etag)
+
+    entries = search_entries(**filters)
+
+    # ✅ keyset page: cost is the same for page 1 and page 100
+    page_keys, next_cursor = page_profile_ids(entries, after=after, limit=PAGE_SIZE, q=q, near=near)
+    total, count_capped = count_matches(entries, exact=exact_count, near=near)
+
+    profiles = UserProfile.objects.in_bulk([key["id"] for key in page_keys])
+
+    results = []
+    for key in page_keys:
+        profile = profiles.get(key["id"])
+        if profile is None:
+            continue  # deleted between the two queries
+        item = _search_result(profile)
+        item["distance_km"] = round(key["distance"], 1) if "distance" in key else None
+        results.append(item)
+
+    payload = {
+        "count": total,
+        "count_capped": count_capped,  # True => "more than {count}"
+        "next_cursor": next_cursor,
+        "results": results,
+    }
+    # ✅ a page short of a deleted profile is served once, not cached
+    if len(results) == len(page_keys):
+        set_cached_results(cache_key, payload)
+
+    return set_validators(JsonResponse(payload), etag)
+
+
+def api_find_service_facets(request):
+    """Option counts for the find-service dropdowns under the current filters."""
+    filters, errors = _find_service_filters(request)
+    if errors:
+        return JsonResponse({"ok": False, "errors": errors}, status=400)
+
+    # ✅ same generations as the result pages, so service/area edits invalidate it
+    cache_key = facets_cache_key(**filters)
+    payload = get_cached_results(cache_key)
+    if payload is None:
+        payload = facet_counts(**filters)
+        set_cached_results(cache_key, payload)
+
+    return JsonResponse(payload)
+
+def api_find_service_export(request):
+    """
+    Every tradesperson in a category and province as newline-delimited JSON.
+    Rows are streamed from a server-side cursor, so memory stays flat however
+    many match.
+    """
     category_id = (request.GET.get("category") or "").strip()
     subcategory_id = (request.GET.get("subcategory") or "").strip()
-    city = (request.GET.get("city") or "").strip()
-
-    qs = (
-        UserProfile.objects
-        .select_related("user")
-        .filter(account_type__iexact="tradesperson")
-        .filter(user__services__isnull=False)  # ✅ must have at least one service
+    province = (request.GET.get("province") or "").strip().upper()
+
+    errors = {}
+    if not category_id.isdigit():
+        errors["category"] = ["This field is required."]
+    if province not in dict(UserProfile._meta.get_field("user_province").choices):
+        errors["province"] = ["Unknown province code."]
+    if errors:
+        return JsonResponse({"ok": False, "errors": errors}, status=400)
+
+    profiles = export_profiles(
+        int(category_id),
+        province,
+        subcategory_id=int(subcategory_id) if subcategory_id.isdigit() else None,
     )
 
-    if category_id.isdigit():
-        qs = qs.filter(user__services__category_id=int(category_id))
+    def rows():
+        for p in profiles.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield json.dumps(_search_result(p)) + "\n"
 
-    if subcategory_id.isdigit():
-        qs = qs.filter(user__services__subcategory_id=int(subcategory_id))
+    response = StreamingHttpResponse(rows(), content_type="application/x-ndjson")
+    response["Content-Disposition"] = f'attachment; filename="tradespeople-{category_id}-{province}.ndjson"'
+    return response
 
-    # ✅ CITY FILTER — FIXED
-    if city:
-        qs = qs.filter(
-            Q(user_city__iexact=city) |
-            Q(user__user_service_areas__service_area__city__iexact=city)
-        )
 
-    qs = qs.distinct()
-    total = qs.count()
+def api_autocomplete(request):
+    """City and service suggestions for a typed prefix (?q=cal&type=city)."""
+    limit = (request.GET.get("limit") or "").strip()
+
+    # ✅ answered from the in-process prefix index, no queries
+    results = autocomplete(
+        request.GET.get("q") or "",
+        limit=int(limit) if limit.isdigit() else None,
+        type=(request.GET.get("type") or "").strip() or None,
+    )
+    return JsonResponse({"results": results})
 
-    results = []
-    for p in qs[:60]:
-        img_url = p.user_profile_image.url if p.user_profile_image else ""
 
-        results.append({
-            "profile_id": p.user_id,
-            "name": f"{p.user_firstname} {p.user_last_name}".strip(),
-            "business_name": p.user_business_name or "",
-            "city": p.user_city or "",
-            "province": str(getattr(p, "user_province", "") or ""),
-            "summary": getattr(p, "profile_summary", "") or "",
-            "image": img_url,
-        })
+@login_required
+@require_POST
+def api_upload_sign(request):
+    """Signed direct-upload target for one file (see users.uploads)."""
+    size = (request.POST.get("size") or "").strip()
+    try:
+        token, target = sign_upload(
+            request.user,
+            request.POST.get("kind") or "",
+            request.POST.get("content_type") or "",
+            request.POST.get("filename") or "",
+            size=int(size) if size.isdigit() else None,
+            context=request.POST.get("conversation") or None,
+        )
+    except UploadError as exc:
+        return JsonResponse({"ok": False, "errors": {"file": [str(exc)]}}, status=400)
+    return JsonResponse({"ok": True, "token": token, "upload": target})
 
-    return JsonResponse({"count": total, "results": results})
+
+@login_required
+@require_POST
+def api_upload_local(request):
+    """Upload target of LocalUploadBackend: stores the file under its signed name."""
+    upload = request.FILES.get("file")
+    try:
+        data = load_token(request.POST.get("token") or "", request.user)
+        if upload is None:
+            raise UploadError("No file.")
+        if upload.size > KINDS[data["k"]].max_bytes() or (upload.content_type or "").lower() != data["t"]:
+            raise UploadError("The file doesn't match the signed upload.")
+    except UploadError as exc:
+        return JsonResponse({"ok": False, "errors": {"file": [str(exc)]}}, status=400)
+
+    storage = kind_storage(data["k"])
+    if storage.exists(data["n"]):
+        return JsonResponse({"ok": False, "errors": {"file": ["Already uploaded."]}}, status=400)
+    storage.save(data["n"], upload)
+    return hp(status=204)  # what S3 answers to a POST upload
 
 # user profile detail shown to public
 def profile_detail(request, user_id):
@@ -435,11 +654,20 @@ def profile_detail(request, user_id):
     Read-only. Accessible by anyone.
     """
 
-    user = get_object_or_404(
-        User.objects.select_related("profile"),
-        id=user_id,
-        profile__account_type="tradesperson",
+    # ✅ one query: user + profile + call-out settings + the validator inputs
+    user = (
+        with_profile_state(User.objects.select_related("profile", "callout_settings"))
+        .filter(id=user_id, profile__account_type="tradesperson")
+        .first()
     )
+    if user is None:
+        raise Http404("No such tradesperson.")
+
+    # ✅ conditional GET: answered before any rendering
+    etag, last_modified = profile_validators(request, user)
+    response = not_modified(request, etag, last_modified, pages=True)
+    if response is not None:
+        return set_validators(response, etag, last_modified, private=True)
 
     try:
         callout_settings = user.callout_settings
@@ -448,6 +676,9 @@ def profile_detail(request, user_id):
 
     profile = user.profile
 
+    # The querysets below are lazy: when the template's cached fragments
+    # (keyed by fragment_version) are warm they never run.
+
     # Services offered by this tradesperson
     services = (
         UserService.objects
@@ -456,23 +687,16 @@ def profile_detail(request, user_id):
         .order_by("category__name", "subcategory__name")
     )
 
-    # ✅ Service areas (robust way):
-    # If you have a through table like UserServiceArea, the safest is to query via that model
-    # BUT since we don't have it here, we can still make your existing query safer by:
-    # - using distinct()
-    # - not assuming ordering fields exist (metro_city/city/name)
     service_areas = (
         ServiceArea.objects
-        .filter(userservicearea__user=user, is_active=True)  # keep, but see note below
+        .filter(userservicearea__user=user, is_active=True)
         .distinct()
-        .order_by("city")  # keep simple; change if your fields differ
+        .order_by("city")
     )
 
-    # ✅ Gallery (add this)
-    # Replace ProfileGalleryImage with your actual gallery model & field names.
     gallery = (
         TradeWorkPhoto.objects
-        .filter(user=user)               # or filter(profile=profile) depending on your model
+        .filter(user=user)
         .order_by("-created_at")[:18]    # cap to keep the page fast
     )
 
@@ -483,9 +707,12 @@ def profile_detail(request, user_id):
         "service_areas": service_areas,
         "gallery": gallery,
         "callout_settings": callout_settings,
+        "fragment_version": profile_fragment_version(user.pk),
+        "fragment_timeout": profile_fragment_timeout(),
     }
 
-    return render(request, "users/profile_detail.html", context)
+    response = render(request, "users/profile_detail.html", context)
+    return set_validators(response, etag, last_modified, private=True)
 
 # ###########Gallery views ####################
 
@@ -497,7 +724,7 @@ def gallery_list(request):
 @login_required
 def gallery_add(request):
     limit = get_gallery_photo_limit(request.user)
-    current = TradeWorkPhoto.objects.filter(user=request.user).count()
+    current = get_counters(request.user).gallery_photos
 
     # ✅ hard limit
     if current >= limit:
@@ -505,11 +732,28 @@ def gallery_add(request):
         return redirect("users:gallery_list")
 
     if request.method == "POST":
-        form = TradeWorkPhotoForm(request.POST, request.FILES)
+        photo = TradeWorkPhoto(user=request.user)
+        upload = None
+        upload_token = request.POST.get("upload_token")
+        if upload_token:
+            try:
+                upload = verify_upload(request.user, upload_token, "gallery")
+            except UploadError as exc:
+                messages.error(request, str(exc))
+                return redirect("users:gallery_add")
+            photo.image = upload.name
+
+        form = TradeWorkPhotoForm(request.POST, request.FILES, instance=photo)
         if form.is_valid():
-            photo = form.save(commit=False)
-            photo.user = request.user
-            photo.save()
+            with transaction.atomic():
+                # re-check under the row lock (another tab may have just added one)
+                if counters_for_update(request.user).gallery_photos >= limit:
+                    messages.error(request, f"You’ve reached your gallery limit ({limit} photos).")
+                    return redirect("users:gallery_list")
+                if upload is not None:
+                    # ✅ the token is used up only once the form is valid
+                    photo.image = adopt_upload("gallery", upload).name
+                form.save()
             messages.success(request, "Photo added to your gallery.")
             return redirect("users:gallery_list")
         messages.error(request, "Please fix the errors below.")
@@ -561,16 +805,32 @@ def license_list_create(request):
     profile = get_object_or_404(UserProfile, user=request.user)
     licenses = profile.licenses.all()
 
-    if request.method == "POST" and profile.licenses.count() >= 5:
+    if request.method == "POST" and get_counters(request.user).licenses >= 5:
         messages.error(request, "You can add a maximum of 5 licenses.")
         return redirect("users:licenses")
     
     elif request.method == "POST":
-        form = LicenseForm(request.POST, request.FILES)
+        license_obj = License(profile=profile)
+        upload = None
+        upload_token = request.POST.get("upload_token")
+        if upload_token:
+            try:
+                upload = verify_upload(request.user, upload_token, "license")
+            except UploadError as exc:
+                messages.error(request, str(exc))
+                return redirect("users:licenses")
+            license_obj.document = upload.name
+
+        form = LicenseForm(request.POST, request.FILES, instance=license_obj)
         if form.is_valid():
-            license_obj = form.save(commit=False)
-            license_obj.profile = profile
-            license_obj.save()
+            with transaction.atomic():
+                if counters_for_update(request.user).licenses >= 5:
+                    messages.error(request, "You can add a maximum of 5 licenses.")
+                    return redirect("users:licenses")
+                if upload is not None:
+                    # ✅ the token is used up only once the form is valid
+                    license_obj.document = adopt_upload("license", upload).name
+                form.save()
 
             messages.success(request, "License added successfully.")
             return redirect("users:licenses")